@@ -0,0 +1,47 @@
+"""NETSprinkler client: the HTTP API of a NETSprinkler controller, without Home Assistant.
+
+Only needs aiohttp (orjson when installed). Submodules are imported on
+first use, so importing the package and ``--help`` of its CLI stay fast.
+The CLI runs as ``python -m Sprinkler`` wherever the package is importable
+on its own, and as ``scripts/sprinkler`` from a checkout.
+"""
+import importlib
+
+_EXPORTS = {
+    'NETSprinkler': '.netsprinkler',
+    'Transport': '.transport',
+    'ControllerState': '.model',
+    'StateChanges': '.changes',
+    'Metrics': '.metrics',
+    'PushClient': '.push',
+    'AdaptivePollScheduler': '.scheduler',
+    'DrawEstimator': '.sequencer',
+    'Sequencer': '.sequencer',
+    'FakeController': '.fake',
+    'RecordingTransport': '.replay',
+    'ReplayTransport': '.replay',
+    'NETSprinklerError': '.errors',
+    'NETSprinklerConnectionError': '.errors',
+    'NETSprinklerTimeoutError': '.errors',
+    'NETSprinklerCircuitOpenError': '.errors',
+    'NETSprinklerApiError': '.errors',
+    'NETSprinklerNotFoundError': '.errors',
+    'NETSprinklerCommandCancelledError': '.errors',
+    'NETSprinklerUnsupportedError': '.errors',
+    'NETSprinklerBatchError': '.errors',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
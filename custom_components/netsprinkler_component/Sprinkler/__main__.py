@@ -0,0 +1,6 @@
+"""Run the command line interface, see cli."""
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,220 @@
+"""Benchmarks of the client against the in-process fake controller.
+
+Measures refresh latency (full sync and status poll), memory per valve,
+listener fan-out per cycle and command throughput for a set of controller
+sizes, and compares the results with a recorded baseline.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+import tracemalloc
+
+from .changes import schedule_context, valve_context
+from .fake import VALVE_ID_BASE, FakeController, make_settings
+from .metrics import Histogram
+from .model import ControllerState
+from .netsprinkler import NETSprinkler
+
+SIZES = (8, 64, 512)
+ROUNDS = 20
+SCHEDULES_PER_VALVE = 0.5
+
+# Listeners of the integration entities: per valve (running, status, remaining
+# time, enabled), per schedule (name) and controller wide ones.
+LISTENERS_PER_VALVE = 4
+LISTENERS_PER_SCHEDULE = 1
+CONTROLLER_LISTENERS = 3
+
+# A result this much worse than the baseline counts as a regression. Timings
+# also have to be off by more than TIMING_SLACK_MS, sub-millisecond noise is no regression.
+TOLERANCE = 0.5
+TIMING_SLACK_MS = 1.0
+
+# Whether lower or higher values of a result are better.
+DIRECTIONS = {
+    'refresh_full_p50_ms': 'lower',
+    'refresh_full_p95_ms': 'lower',
+    'refresh_status_p50_ms': 'lower',
+    'refresh_status_p95_ms': 'lower',
+    'memory_per_valve_bytes': 'lower',
+    'fanout_one_valve': 'lower',
+    'fanout_all_valves': 'lower',
+    'commands_per_s_batch': 'higher',
+    'commands_per_s_single': 'higher',
+}
+
+
+def _ms(histogram, q):
+    return round(histogram.percentile(q) * 1000, 3)
+
+
+async def _timed_refreshes(controller, fake, rounds, full):
+    histogram = Histogram()
+    for _ in range(rounds):
+        # a ticking clock defeats the ETag and digest checks, every round parses
+        fake.tick()
+        start = time.perf_counter()
+        await controller.refresh(full=full)
+        histogram.observe(time.perf_counter() - start)
+    return histogram
+
+
+def _memory_per_valve(valves, schedules):
+    """Bytes held by the parsed state and the Valve and Schedule views, per valve."""
+    document = make_settings(valves, schedules)
+    controller = NETSprinkler('http://127.0.0.1', {})
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        controller._set_state(ControllerState.parse(document))
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return round(used / valves)
+
+
+def _listeners(controller, calls):
+    """Build the (callback, context) pairs of the integration entities, each callback counts its calls."""
+    def listener():
+        calls.append(1)
+
+    listeners = [(listener, None)] * CONTROLLER_LISTENERS
+    for id in controller.valves:
+        listeners += [(listener, valve_context(id))] * LISTENERS_PER_VALVE
+    for id in controller.schedules:
+        listeners += [(listener, schedule_context(id))] * LISTENERS_PER_SCHEDULE
+    return listeners
+
+
+def _fanout(controller, ids):
+    """Count the listener callbacks a cycle runs when the valves ``ids`` open.
+
+    Wakes the listeners the way the coordinator does: controller wide ones
+    on a controller change, the others when their context changed.
+    """
+    state = controller.state
+    for id in ids:
+        state = state.with_valve(state.valves_by_id[id].replace(is_open=True))
+    before = controller.state
+    changes = controller._commit_local(state)
+    controller._commit_local(before)
+
+    calls = []
+    contexts = changes.contexts
+    for update_callback, context in _listeners(controller, calls):
+        if (context is None and changes.controller) or context in contexts:
+            update_callback()
+    return len(calls)
+
+
+async def _commands_per_s(valves, batch, rounds):
+    fake = FakeController(valves, batch=batch)
+    await fake.start()
+    controller = NETSprinkler(fake.url, {})
+    try:
+        await controller.refresh()
+        jobs = [(id, 60) for id in controller.valves]
+        # warm up the connections and learn whether the batch endpoint exists
+        await controller.run_many(jobs)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            await controller.run_many(jobs)
+        return round(len(jobs) * rounds / (time.perf_counter() - start), 1)
+    finally:
+        await controller.session_close()
+        await fake.stop()
+
+
+async def run_size(valves, rounds=ROUNDS):
+    """Results for a controller with ``valves`` valves."""
+    schedules = max(1, int(valves * SCHEDULES_PER_VALVE))
+    fake = FakeController(valves, schedules)
+    await fake.start()
+    controller = NETSprinkler(fake.url, {})
+    try:
+        await controller.refresh()
+        full = await _timed_refreshes(controller, fake, rounds, True)
+        status = await _timed_refreshes(controller, fake, rounds, False)
+        fanout_one = _fanout(controller, [VALVE_ID_BASE])
+        fanout_all = _fanout(controller, list(controller.valves))
+    finally:
+        await controller.session_close()
+        await fake.stop()
+
+    return {
+        'refresh_full_p50_ms': _ms(full, 50),
+        'refresh_full_p95_ms': _ms(full, 95),
+        'refresh_status_p50_ms': _ms(status, 50),
+        'refresh_status_p95_ms': _ms(status, 95),
+        'memory_per_valve_bytes': _memory_per_valve(valves, schedules),
+        'fanout_one_valve': fanout_one,
+        'fanout_all_valves': fanout_all,
+        'commands_per_s_batch': await _commands_per_s(valves, True, rounds),
+        # single commands are slow, fewer rounds are enough
+        'commands_per_s_single': await _commands_per_s(valves, False, max(2, rounds // 4)),
+    }
+
+
+async def run(sizes=SIZES, rounds=ROUNDS):
+    """Measure every controller size in ``sizes``."""
+    return {str(valves): await run_size(valves, rounds) for valves in sizes}
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Regressions of ``results`` against ``baseline``, as readable lines."""
+    regressions = []
+    for size, values in results.items():
+        for key, value in values.items():
+            base = baseline.get(size, {}).get(key)
+            if not base or key not in DIRECTIONS:
+                continue
+            if DIRECTIONS[key] == 'lower':
+                slack = TIMING_SLACK_MS if key.endswith('_ms') else 0
+                worse = value > base * (1 + tolerance) + slack
+            else:
+                worse = value < base / (1 + tolerance)
+            if worse:
+                regressions.append(f'{size} valves: {key} {value} (baseline {base})')
+    return regressions
+
+
+def format_results(results):
+    """Format ``results`` as a table, one column per controller size."""
+    sizes = list(results)
+    lines = ['{:<24}'.format('valves') + ''.join(f'{size:>12}' for size in sizes)]
+    for key in DIRECTIONS:
+        lines.append(f'{key:<24}' + ''.join(f'{results[size][key]:>12}' for size in sizes))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help='valve counts to measure')
+    parser.add_argument('--rounds', type=int, default=ROUNDS, help='repetitions per measurement')
+    parser.add_argument('--baseline', help='baseline JSON to compare with')
+    parser.add_argument('--write-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed slowdown before a result is a regression')
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args.sizes, args.rounds))
+    print(format_results(results))
+
+    if args.baseline and args.write_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+            file.write('\n')
+        print(f'baseline written to {args.baseline}')
+    elif args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Diff two controller states into the slices that changed."""
+
+CONTEXT_VALVE = 'valve'
+CONTEXT_SCHEDULE = 'schedule'
+
+
+def valve_context(valve_id):
+    """Return the listener context of one valve."""
+    return (CONTEXT_VALVE, valve_id)
+
+
+def schedule_context(schedule_id):
+    """Return the listener context of one schedule."""
+    return (CONTEXT_SCHEDULE, schedule_id)
+
+
+class StateChanges:
+    """Valves, schedules and controller fields that differ from the previous state."""
+
+    __slots__ = ('valves', 'schedules', 'controller')
+
+    def __init__(self, valves=None, schedules=None, controller=False) -> None:
+        """Initialize."""
+        self.valves = valves if valves is not None else set()
+        self.schedules = schedules if schedules is not None else set()
+        self.controller = controller
+
+    @property
+    def contexts(self):
+        """Listener contexts touched by this change set."""
+        contexts = {valve_context(id) for id in self.valves}
+        contexts.update(schedule_context(id) for id in self.schedules)
+        return contexts
+
+    def __bool__(self):
+        """Return True when anything changed."""
+        return bool(self.valves or self.schedules or self.controller)
+
+    def __repr__(self):
+        """Return the representation."""
+        return f'StateChanges(valves={self.valves}, schedules={self.schedules}, controller={self.controller})'
+
+
+def _diff_by_id(old_by_id, new_by_id):
+    changed = {id for id, record in new_by_id.items() if old_by_id.get(id) != record}
+    # ids that disappeared from the controller
+    changed.update(id for id in old_by_id if id not in new_by_id)
+    return changed
+
+
+def diff_state(old, new):
+    """Return the StateChanges between two ControllerState objects."""
+    return StateChanges(
+        _diff_by_id(old.valves_by_id, new.valves_by_id),
+        _diff_by_id(old.schedules_by_id, new.schedules_by_id),
+        old.device_time != new.device_time or old.current_draw != new.current_draw,
+    )
+
+
+class StructureChanges:
+    """Valve and schedule ids that appeared, disappeared or moved to another index."""
+
+    __slots__ = ('valves_added', 'valves_removed', 'valves_renumbered', 'schedules_added', 'schedules_removed', 'schedules_renumbered')
+
+    def __init__(self) -> None:
+        """Initialize with nothing changed."""
+        for slot in self.__slots__:
+            setattr(self, slot, set())
+
+    def __bool__(self):
+        """Return True when any id appeared, disappeared or moved."""
+        return any(getattr(self, slot) for slot in self.__slots__)
+
+    def __repr__(self):
+        """Return the representation."""
+        fields = ', '.join(f'{slot}={getattr(self, slot)}' for slot in self.__slots__ if getattr(self, slot))
+        return f'StructureChanges({fields})'
+
+    def update(self, old, new):
+        """Add the structural differences between two ControllerState objects."""
+        _structure_by_id(old.valves_by_id, new.valves_by_id, self.valves_added, self.valves_removed, self.valves_renumbered)
+        _structure_by_id(old.schedules_by_id, new.schedules_by_id, self.schedules_added, self.schedules_removed, self.schedules_renumbered)
+
+
+def _structure_by_id(old_by_id, new_by_id, added, removed, renumbered):
+    for id, record in new_by_id.items():
+        old = old_by_id.get(id)
+        if old is None:
+            if id in removed:
+                # came back before anybody reconciled, treat it as a move
+                removed.discard(id)
+                renumbered.add(id)
+            else:
+                added.add(id)
+        elif old.index != record.index:
+            renumbered.add(id)
+    for id in old_by_id:
+        if id not in new_by_id:
+            if id in added:
+                added.discard(id)
+            else:
+                removed.add(id)
+            renumbered.discard(id)
+
+
+VALVE_OPENED = 'opened'
+VALVE_CLOSED = 'closed'
+VALVE_ENABLED = 'enabled'
+VALVE_DISABLED = 'disabled'
+
+
+class ValveTransition:
+    """A valve that opened, closed, got enabled or disabled between two states.
+
+    Times are unix seconds: ``time`` when the client saw the transition,
+    ``start_time`` when the run began. ``duration`` is the requested length
+    of a run started from here, ``run_seconds`` how long a closed valve ran.
+    """
+
+    __slots__ = ('kind', 'valve_id', 'time', 'device_time', 'start_time', 'duration', 'run_seconds')
+
+    def __init__(self, kind, valve_id, time, device_time=None, start_time=None, duration=None, run_seconds=None) -> None:
+        """Initialize."""
+        self.kind = kind
+        self.valve_id = valve_id
+        self.time = time
+        self.device_time = device_time
+        self.start_time = start_time
+        self.duration = duration
+        self.run_seconds = run_seconds
+
+    def as_dict(self):
+        """Return every field, e.g. as event data."""
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __repr__(self):
+        """Return the representation."""
+        return f'ValveTransition({self.kind}, valve_id={self.valve_id})'
+
+
+def valve_transitions(old, new):
+    """(kind, old record, new record) of every valve whose open or enabled flag flipped.
+
+    Valves that appeared or disappeared are layout changes, not transitions.
+    """
+    for after in new.valves:
+        before = old.valves_by_id.get(after.id)
+        if before is None or before is after:
+            continue
+        if before.is_open != after.is_open:
+            yield (VALVE_OPENED if after.is_open else VALVE_CLOSED), before, after
+        if before.enabled != after.enabled:
+            yield (VALVE_ENABLED if after.enabled else VALVE_DISABLED), before, after
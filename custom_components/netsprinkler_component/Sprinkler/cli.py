@@ -0,0 +1,212 @@
+"""Command line interface: ``python -m Sprinkler <command> ...`` or ``scripts/sprinkler``.
+
+Goes through the same client code as the integration, for quick checks
+over SSH or from cron. Modules are imported by the command that needs
+them, so ``--help`` does not load aiohttp.
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import json
+import logging
+import sys
+
+# Poll interval of ``watch`` while the event stream is up.
+WATCH_PUSH_INTERVAL = 300
+
+
+def _print_state(controller):
+    state = controller.state
+    device_time = datetime.fromtimestamp(state.device_time, timezone.utc).isoformat() if state.device_time else '-'
+    print(f'controller {controller.url}  device time {device_time}  current draw {state.current_draw} mA')
+    print(f'{"#":>4} {"id":>6}  {"enabled":<8}{"open":<6}name')
+    for valve in state.valves:
+        print(f'{valve.index:>4} {valve.id:>6}  {"yes" if valve.enabled else "no":<8}{"yes" if valve.is_open else "no":<6}{valve.name}')
+    if state.schedules:
+        print(f'{len(state.schedules)} schedules: ' + ', '.join(f'{schedule.id} {schedule.name}' for schedule in state.schedules))
+
+
+def _print_changes(controller):
+    changes = controller.changes
+    now = datetime.now().strftime('%H:%M:%S')
+    if changes is None:
+        _print_state(controller)
+        return
+    for id in sorted(changes.valves):
+        valve = controller.state.valves_by_id.get(id)
+        if valve is None:
+            print(f'{now} valve {id} removed')
+        else:
+            print(f'{now} valve {id} {valve.name!r} enabled={valve.enabled} open={valve.is_open}')
+    for id in sorted(changes.schedules):
+        schedule = controller.state.schedules_by_id.get(id)
+        print(f'{now} schedule {id} ' + (repr(schedule.name) if schedule is not None else 'removed'))
+    if changes.controller and not (changes.valves or changes.schedules):
+        print(f'{now} current draw {controller.state.current_draw} mA')
+
+
+def _valve_ids(controller, args):
+    """Valve ids picked on the command line, every valve with ``--all``."""
+    if getattr(args, 'all', False):
+        return list(controller.valves)
+    if args.index:
+        return [controller.valve_by_index(index).id for index in args.valves]
+    unknown = [id for id in args.valves if id not in controller.valves]
+    if unknown:
+        raise SystemExit(f'unknown valve ids: {unknown}')
+    return list(args.valves)
+
+
+async def _status(controller, args):
+    await controller.refresh()
+    if args.json:
+        print(json.dumps(controller.state.as_dict(), indent=2))
+    else:
+        _print_state(controller)
+
+
+async def _run(controller, args):
+    await controller.refresh()
+    ids = _valve_ids(controller, args)
+    await controller.run_many([(id, args.seconds) for id in ids])
+    print(f'started {len(ids)} valves for {args.seconds}s')
+
+
+async def _stop(controller, args):
+    await controller.refresh()
+    if args.valves:
+        await controller.stop_many(_valve_ids(controller, args))
+    else:
+        await controller.stop_all()
+    print('stopped ' + (f'{len(args.valves)} valves' if args.valves else 'every open valve'))
+
+
+async def _enable(controller, args):
+    await controller.refresh()
+    ids = _valve_ids(controller, args)
+    if args.command == 'enable':
+        await controller.enable_many(ids)
+    else:
+        await controller.disable_many(ids)
+    print(f'{args.command}d {len(ids)} valves')
+
+
+async def _watch(controller, args):
+    from .errors import NETSprinklerError
+    from .push import PushClient
+    from .scheduler import AdaptivePollScheduler
+
+    scheduler = AdaptivePollScheduler(args.interval, args.max_interval)
+    push = PushClient(
+        controller,
+        lambda: _print_changes(controller),
+        lambda connected: print('event stream ' + ('connected' if connected else 'disconnected')),
+    )
+    push.start()
+    try:
+        while True:
+            try:
+                await controller.refresh()
+                changes = controller.changes
+                scheduler.observe(changes is None or bool(changes.valves or changes.schedules))
+                if changes is None or changes:
+                    _print_changes(controller)
+            except NETSprinklerError as exc:
+                print(f'refresh failed: {exc}', file=sys.stderr)
+            await asyncio.sleep(WATCH_PUSH_INTERVAL if push.connected else scheduler.interval(controller))
+    finally:
+        await push.stop()
+
+
+async def _with_controller(command, args):
+    from .errors import NETSprinklerError
+    from .netsprinkler import NETSprinkler
+
+    opts = {}
+    if getattr(args, 'record', None):
+        from .replay import RecordingTransport
+        opts['transport'] = RecordingTransport(args.url, args.record)
+    controller = NETSprinkler(args.url, opts)
+    try:
+        await command(controller, args)
+    except NETSprinklerError as exc:
+        print(f'error: {exc}', file=sys.stderr)
+        return 1
+    finally:
+        await controller.session_close()
+    return 0
+
+
+def _add_valves(parser, required=True):
+    """``--valves``, an option so it mixes with the other options in any order.
+
+    Unless ``required`` is off, the valves or ``--all`` must be given: a
+    forgotten valve list must not open or change every valve.
+    """
+    if required:
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument('--all', action='store_true', help='every valve of the controller')
+    else:
+        group = parser
+    group.add_argument('-V', '--valves', type=int, nargs='+', metavar='ID', help='valve ids')
+    parser.add_argument('-i', '--index', action='store_true', help='the valves are positions instead of ids')
+
+
+def _parser():
+    parser = argparse.ArgumentParser(description='Talk to a NETSprinkler controller.')
+    parser.add_argument('-v', '--verbose', action='store_true', help='debug logging')
+    parser.add_argument('--trace', action='store_true', help='debug logging of every request')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    status = commands.add_parser('status', help='show valves and schedules')
+    status.add_argument('url')
+    status.add_argument('--json', action='store_true', help='print the parsed state as JSON')
+    status.set_defaults(handler=_status)
+
+    run = commands.add_parser('run', help='start a manual run')
+    run.add_argument('url')
+    run.add_argument('-s', '--seconds', type=int, default=60)
+    _add_valves(run)
+    run.set_defaults(handler=_run)
+
+    stop = commands.add_parser('stop', help='close valves, every open one when none are given')
+    stop.add_argument('url')
+    _add_valves(stop, required=False)
+    stop.set_defaults(handler=_stop)
+
+    for name in ('enable', 'disable'):
+        command = commands.add_parser(name, help=f'{name} valves')
+        command.add_argument('url')
+        _add_valves(command)
+        command.set_defaults(handler=_enable)
+
+    watch = commands.add_parser('watch', help='follow the controller until interrupted')
+    watch.add_argument('url')
+    watch.add_argument('--interval', type=float, default=5, help='base poll interval in seconds')
+    watch.add_argument('--max-interval', type=float, default=300, help='ceiling of the idle backoff')
+    watch.add_argument('--record', metavar='FILE', help='record the traffic for a later replay')
+    watch.set_defaults(handler=_watch)
+
+    # listed for --help only, main hands its arguments to bench.main untouched
+    commands.add_parser('bench', help='benchmarks against the fake controller, see bench --help')
+    return parser
+
+
+def main(argv=None):
+    """Run a command line command, return the exit status."""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['bench']:
+        from .bench import main as bench_main
+        return bench_main(argv[1:])
+
+    args = _parser().parse_args(argv)
+    if args.verbose or args.trace:
+        logging.basicConfig(level=logging.DEBUG)
+    if args.trace:
+        from .log import set_trace
+        set_trace(True)
+
+    try:
+        return asyncio.run(_with_controller(args.handler, args))
+    except KeyboardInterrupt:
+        return 0
@@ -0,0 +1,24 @@
+"""JSON decoding of controller payloads, using orjson when it is installed."""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - Home Assistant ships orjson
+    orjson = None
+
+from .errors import NETSprinklerApiError
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def loads(body):
+    """Decode a JSON payload from bytes or str, None for an empty body."""
+    if not body or not body.strip():
+        return None
+    try:
+        if orjson is not None:
+            return orjson.loads(body)
+        return json.loads(body)
+    except ValueError as exc:
+        # orjson.JSONDecodeError is a json.JSONDecodeError, both are ValueErrors
+        raise NETSprinklerApiError(f"Invalid JSON from controller: {exc}") from exc
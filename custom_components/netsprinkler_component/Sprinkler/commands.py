@@ -0,0 +1,113 @@
+"""Per-controller command queue: stops first, then runs, then the other writes."""
+import asyncio
+import contextlib
+import heapq
+import itertools
+
+from .errors import NETSprinklerCommandCancelledError
+from .log import LOGGER
+
+PRIORITY_STOP = 0
+PRIORITY_RUN = 1
+PRIORITY_WRITE = 2
+
+
+class _Command:
+    __slots__ = ('call', 'priority', 'valve_ids', 'future')
+
+    def __init__(self, call, priority, valve_ids, future) -> None:
+        self.call = call
+        self.priority = priority
+        self.valve_ids = valve_ids
+        self.future = future
+
+
+class CommandQueue:
+    """Sends at most ``slots`` commands at once, the most urgent first.
+
+    Stops never wait: they go out right away, next to whatever is in flight,
+    and ``cancel_runs`` drops the queued runs they would be undone by.
+    """
+
+    def __init__(self, slots) -> None:
+        """Initialize with ``slots`` commands in flight at most."""
+        self.slots = slots
+        self._active = 0
+        self._heap = []
+        self._order = itertools.count()
+        self._tasks = set()
+
+    @property
+    def active(self):
+        """Number of commands in flight."""
+        return self._active
+
+    @property
+    def pending(self):
+        """Number of queued commands still waiting for a slot."""
+        return sum(1 for _, _, command in self._heap if not command.future.done())
+
+    async def submit(self, call, priority=PRIORITY_WRITE, valve_ids=()):
+        """Await ``call()`` once its turn came."""
+        if priority == PRIORITY_STOP:
+            return await call()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._order), _Command(call, priority, frozenset(valve_ids), future)))
+        self._dispatch()
+        return await future
+
+    def cancel_runs(self, valve_ids=None):
+        """Drop the queued runs opening any of ``valve_ids``, every queued run when None."""
+        dropped = 0
+        for _, _, command in self._heap:
+            if command.priority != PRIORITY_RUN or command.future.done():
+                continue
+            if valve_ids is None or command.valve_ids & set(valve_ids):
+                command.future.set_exception(NETSprinklerCommandCancelledError('Run cancelled by a stop'))
+                dropped += 1
+        if dropped:
+            LOGGER.debug('[CommandQueue:cancel_runs] dropped %s queued runs', dropped)
+            self._heap = [item for item in self._heap if not item[2].future.done()]
+            heapq.heapify(self._heap)
+        return dropped
+
+    def _dispatch(self):
+        while self._active < self.slots and self._heap:
+            _, _, command = heapq.heappop(self._heap)
+            if command.future.done():
+                # cancelled by a stop or given up by its caller
+                continue
+            self._active += 1
+            task = asyncio.get_running_loop().create_task(self._execute(command))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        """Cancel the queued and running commands, their callers get NETSprinklerCommandCancelledError."""
+        for _, _, command in self._heap:
+            if not command.future.done():
+                command.future.set_exception(NETSprinklerCommandCancelledError('Command queue closed'))
+        self._heap = []
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    async def _execute(self, command):
+        try:
+            result = await command.call()
+        except asyncio.CancelledError:
+            if not command.future.done():
+                command.future.set_exception(NETSprinklerCommandCancelledError('Command cancelled'))
+            raise
+        except Exception as exc:  # pylint: disable=broad-except
+            if not command.future.done():
+                command.future.set_exception(exc)
+        else:
+            if not command.future.done():
+                command.future.set_result(result)
+        finally:
+            self._active -= 1
+            self._dispatch()
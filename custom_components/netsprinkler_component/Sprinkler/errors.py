@@ -0,0 +1,51 @@
+"""Errors raised by the NETSprinkler client."""
+
+
+class NETSprinklerError(ValueError):
+    """Base error of the client.
+
+    Derives from ValueError, which is what the client raised for every
+    connection problem before.
+    """
+
+
+class NETSprinklerConnectionError(NETSprinklerError):
+    """The controller could not be reached."""
+
+
+class NETSprinklerTimeoutError(NETSprinklerConnectionError):
+    """The controller did not answer within the time budget."""
+
+
+class NETSprinklerCircuitOpenError(NETSprinklerConnectionError):
+    """The controller failed repeatedly, calls fail fast until a probe succeeds."""
+
+
+class NETSprinklerApiError(NETSprinklerError):
+    """The controller answered with an error status or an unreadable body."""
+
+    def __init__(self, message, status=None) -> None:
+        """Initialize with the HTTP status, if any."""
+        super().__init__(message)
+        self.status = status
+
+
+class NETSprinklerNotFoundError(NETSprinklerApiError):
+    """The controller does not know the endpoint, e.g. an older firmware."""
+
+
+class NETSprinklerCommandCancelledError(NETSprinklerError):
+    """A queued command was dropped before it was sent, e.g. a run overtaken by a stop."""
+
+
+class NETSprinklerUnsupportedError(NETSprinklerNotFoundError):
+    """The controller firmware lacks a command this client needs, there is no fallback."""
+
+
+class NETSprinklerBatchError(NETSprinklerError):
+    """Some of the single commands sent in place of a batch failed, the others went through."""
+
+    def __init__(self, message, errors) -> None:
+        """Initialize with the errors of the failed commands."""
+        super().__init__(message)
+        self.errors = errors
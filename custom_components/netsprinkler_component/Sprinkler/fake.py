@@ -0,0 +1,240 @@
+"""In-process stand-in for a NETSprinkler controller, for benchmarks and local runs."""
+import asyncio
+import hashlib
+import json
+import random
+
+from aiohttp import web
+
+from .push import EVENT_STREAM_CONTENT_TYPE
+from .transport import (
+    ENDPOINT_EVENTS,
+    ENDPOINT_SCHEDULE_SET_NAME,
+    ENDPOINT_SETTINGS_ALL,
+    ENDPOINT_VALVE_ENABLE,
+    ENDPOINT_VALVE_ENABLE_MANY,
+    ENDPOINT_VALVE_RUN,
+    ENDPOINT_VALVE_RUN_MANY,
+    ENDPOINT_VALVE_STATUS,
+    ENDPOINT_VALVE_STOP,
+)
+
+VALVE_ID_BASE = 100
+SCHEDULE_ID_BASE = 1000
+DEVICE_TIME = 1700000000
+
+# Seconds between the comment lines an idle event stream sends.
+HEARTBEAT_INTERVAL = 15
+
+
+def make_settings(valves, schedules):
+    """Build the settings document of a controller with the given number of valves and schedules."""
+    return {
+        'deviceTime': DEVICE_TIME,
+        'currentDraw': 0,
+        'valves': [
+            {'id': VALVE_ID_BASE + i, 'name': f'Valve {i + 1}', 'enabled': True, 'status': {'isOpen': False}}
+            for i in range(valves)
+        ],
+        'schedules': [
+            {'id': SCHEDULE_ID_BASE + i, 'name': f'Schedule {i + 1}'}
+            for i in range(schedules)
+        ],
+    }
+
+
+class FakeController:
+    """Serves the controller API from memory.
+
+    ``latency`` (seconds) delays every answer, ``failure_rate`` is the share
+    of requests answered with HTTP 500. ``batch`` toggles the RunMany and
+    EnableValves endpoints, ``status`` the cheap valve status poll and
+    ``stop`` the valve stop, missing on older firmware, and ``events`` the
+    event stream, which pushes every valve or schedule that changed and a
+    comment line after ``heartbeat`` idle seconds. ``hits`` counts the
+    requests per path.
+    """
+
+    def __init__(self, valves=8, schedules=4, latency=0.0, failure_rate=0.0, batch=True, status=True, stop=True,
+                 events=True, heartbeat=HEARTBEAT_INTERVAL, seed=None) -> None:
+        """Initialize the fake with ``valves`` valves and ``schedules`` schedules."""
+        self.settings = make_settings(valves, schedules)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.batch = batch
+        self.status = status
+        self.stop_supported = stop
+        self.events = events
+        self.heartbeat = heartbeat
+        self.hits = {}
+        self._streams = set()
+        self._random = random.Random(seed)
+        self._runner = None
+        self.url = None
+
+    def _valve(self, id):
+        for valve in self.settings['valves']:
+            if valve['id'] == id:
+                return valve
+        return None
+
+    def tick(self, seconds=1):
+        """Let the device clock run."""
+        self.settings['deviceTime'] += seconds
+
+    def set_open(self, id, is_open):
+        """Open or close a valve on the device, as a schedule or a button would."""
+        valve = self._valve(id)
+        valve['status']['isOpen'] = is_open
+        self.publish('valve', valve)
+
+    def publish(self, kind, record):
+        """Push a ``valve``, ``schedule`` or ``settings`` record to every open event stream."""
+        message = f'event: {kind}\ndata: {json.dumps(record)}\n\n'.encode()
+        for queue in self._streams:
+            queue.put_nowait(message)
+
+    def app(self):
+        """Build the aiohttp application serving the API."""
+        app = web.Application(middlewares=[self._inject])
+        app.router.add_get(ENDPOINT_SETTINGS_ALL, self._settings)
+        app.router.add_get(ENDPOINT_VALVE_STATUS, self._status)
+        app.router.add_get(ENDPOINT_EVENTS, self._events)
+        app.router.add_post(ENDPOINT_VALVE_RUN, self._run)
+        app.router.add_post(ENDPOINT_VALVE_RUN_MANY, self._run_many)
+        app.router.add_post(ENDPOINT_VALVE_STOP, self._stop)
+        app.router.add_post(ENDPOINT_VALVE_ENABLE, self._enable)
+        app.router.add_post(ENDPOINT_VALVE_ENABLE_MANY, self._enable_many)
+        app.router.add_post(ENDPOINT_SCHEDULE_SET_NAME, self._set_name)
+        return app
+
+    async def start(self, host='127.0.0.1', port=0):
+        """Start serving, returns the base url."""
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f'http://{host}:{port}'
+        return self.url
+
+    def drop_streams(self):
+        """End every open event stream, as a controller restart would."""
+        for queue in self._streams:
+            queue.put_nowait(None)
+
+    async def stop(self):
+        """Stop serving, ending the open event streams first."""
+        # the runner waits for open requests to finish
+        self.drop_streams()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @web.middleware
+    async def _inject(self, request, handler):
+        self.hits[request.path] = self.hits.get(request.path, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            return web.Response(status=500, text='injected failure')
+        return await handler(request)
+
+    async def _settings(self, request):
+        body = json.dumps(self.settings).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(body=body, content_type='application/json', headers={'ETag': etag})
+
+    async def _status(self, request):
+        if not self.status:
+            raise web.HTTPNotFound()
+        return web.json_response({
+            'deviceTime': self.settings['deviceTime'],
+            'valves': [{'id': valve['id'], 'status': valve['status']} for valve in self.settings['valves']],
+        })
+
+    async def _events(self, request):
+        if not self.events:
+            raise web.HTTPNotFound()
+        resp = web.StreamResponse(headers={'Content-Type': EVENT_STREAM_CONTENT_TYPE, 'Cache-Control': 'no-cache'})
+        await resp.prepare(request)
+        queue = asyncio.Queue()
+        self._streams.add(queue)
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    message = b': heartbeat\n\n'
+                if message is None:
+                    break
+                await resp.write(message)
+        finally:
+            self._streams.discard(queue)
+        return resp
+
+    async def _run(self, request):
+        data = await request.json()
+        valve = self._valve(data['valveId'])
+        if valve is None:
+            raise web.HTTPNotFound()
+        valve['status']['isOpen'] = True
+        self.publish('valve', valve)
+        return web.json_response(valve)
+
+    async def _run_many(self, request):
+        if not self.batch:
+            raise web.HTTPNotFound()
+        data = await request.json()
+        result = []
+        for job in data['runs']:
+            valve = self._valve(job['valveId'])
+            if valve is not None:
+                valve['status']['isOpen'] = True
+                self.publish('valve', valve)
+                result.append(valve)
+        return web.json_response(result)
+
+    async def _stop(self, request):
+        if not self.stop_supported:
+            raise web.HTTPNotFound()
+        data = await request.json()
+        valve = self._valve(data['valveId'])
+        if valve is None:
+            raise web.HTTPNotFound()
+        valve['status']['isOpen'] = False
+        self.publish('valve', valve)
+        return web.json_response(valve)
+
+    async def _enable(self, request):
+        data = await request.json()
+        valve = self._valve(data['valveId'])
+        if valve is None:
+            raise web.HTTPNotFound()
+        valve['enabled'] = data['enableValve']
+        self.publish('valve', valve)
+        return web.json_response(valve)
+
+    async def _enable_many(self, request):
+        if not self.batch:
+            raise web.HTTPNotFound()
+        data = await request.json()
+        result = []
+        for id in data['valveIds']:
+            valve = self._valve(id)
+            if valve is not None:
+                valve['enabled'] = data['enableValve']
+                self.publish('valve', valve)
+                result.append(valve)
+        return web.json_response(result)
+
+    async def _set_name(self, request):
+        data = await request.json()
+        for schedule in self.settings['schedules']:
+            if schedule['id'] == data['scheduleId']:
+                schedule['name'] = data['name']
+                self.publish('schedule', schedule)
+                return web.json_response(schedule)
+        raise web.HTTPNotFound()
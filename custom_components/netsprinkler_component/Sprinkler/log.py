@@ -0,0 +1,86 @@
+"""Lazy, rate limited logging with a trace mode that can be switched at runtime.
+
+Messages use %-style arguments so nothing is formatted when the level is
+filtered out. ``trace`` is for hot paths (every request, every state read)
+and only logs at DEBUG while trace mode is on. ``throttled`` logs a message
+at most once per interval and tells how many repeats it swallowed.
+"""
+import logging
+import time
+
+# Seconds between two messages logged under the same throttle key.
+THROTTLE_INTERVAL = 60
+
+_trace = False
+
+
+def set_trace(enabled):
+    """Switch trace mode on or off for every SprinklerLogger."""
+    global _trace
+    _trace = bool(enabled)
+
+
+def trace_enabled():
+    """Return True while trace mode is on."""
+    return _trace
+
+
+class SprinklerLogger:
+    """Wraps a logging.Logger, adding trace and throttled messages."""
+
+    def __init__(self, logger) -> None:
+        """Initialize around ``logger``."""
+        self._logger = logger
+        self._throttled = {}
+
+    @property
+    def name(self):
+        """Name of the wrapped logger."""
+        return self._logger.name
+
+    def isEnabledFor(self, level):
+        """Return True when messages of ``level`` are logged."""
+        return self._logger.isEnabledFor(level)
+
+    def debug(self, msg, *args, **kwargs):
+        """Log at DEBUG."""
+        self._logger.debug(msg, *args, stacklevel=2, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        """Log at INFO."""
+        self._logger.info(msg, *args, stacklevel=2, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        """Log at WARNING."""
+        self._logger.warning(msg, *args, stacklevel=2, **kwargs)
+
+    def error(self, msg, *args, **kwargs):
+        """Log at ERROR."""
+        self._logger.error(msg, *args, stacklevel=2, **kwargs)
+
+    def exception(self, msg, *args, **kwargs):
+        """Log at ERROR with the exception being handled."""
+        self._logger.exception(msg, *args, stacklevel=2, **kwargs)
+
+    def trace(self, msg, *args):
+        """DEBUG message that is only logged while trace mode is on."""
+        if _trace and self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(msg, *args, stacklevel=2)
+
+    def throttled(self, level, key, msg, *args, interval=THROTTLE_INTERVAL):
+        """Log at most one message per ``key`` every ``interval`` seconds."""
+        if not self._logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        last, suppressed = self._throttled.get(key, (None, 0))
+        if last is not None and now - last < interval:
+            self._throttled[key] = (last, suppressed + 1)
+            return
+        self._throttled[key] = (now, 0)
+        if suppressed:
+            msg = msg + ' (%d similar messages suppressed)'
+            args = args + (suppressed,)
+        self._logger.log(level, msg, *args, stacklevel=2)
+
+
+LOGGER = SprinklerLogger(logging.getLogger(__package__))
@@ -0,0 +1,109 @@
+"""Counters, gauges and histograms of the hot paths, cheap enough to always keep."""
+import collections
+import math
+
+# Histograms keep this many recent samples for their percentiles.
+HISTOGRAM_SAMPLES = 256
+
+REQUESTS = 'requests'
+REQUEST_ERRORS = 'request_errors'
+REQUEST_LATENCY = 'request_latency'
+PAYLOAD_SIZE = 'payload_size'
+DECODE_TIME = 'decode_time'
+REFRESHES = 'refreshes'
+REFRESHES_UNCHANGED = 'refreshes_unchanged'
+UPDATE_CYCLE = 'update_cycle'
+LISTENER_FANOUT = 'listener_fanout'
+
+
+class Histogram:
+    """Count, sum and max of every sample, percentiles over the recent ones."""
+
+    __slots__ = ('count', 'total', 'max', '_samples')
+
+    def __init__(self, samples=HISTOGRAM_SAMPLES) -> None:
+        """Initialize, keeping the last ``samples`` samples for the percentiles."""
+        self.count = 0
+        self.total = 0
+        self.max = None
+        self._samples = collections.deque(maxlen=samples)
+
+    def observe(self, value):
+        """Add a sample."""
+        self.count += 1
+        self.total += value
+        self.max = value if self.max is None else max(self.max, value)
+        self._samples.append(value)
+
+    def percentile(self, q):
+        """Nearest-rank percentile of the recent samples, None without samples."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+    @property
+    def mean(self):
+        """Mean of every sample, None without samples."""
+        return self.total / self.count if self.count else None
+
+    def as_dict(self):
+        """Return the count, mean, p50, p95 and max."""
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'max': self.max,
+        }
+
+
+class Metrics:
+    """Counters, gauges and histograms of one controller, by name."""
+
+    def __init__(self) -> None:
+        """Initialize with nothing recorded."""
+        self._counters = collections.Counter()
+        self._gauges = {}
+        self._histograms = {}
+
+    def increment(self, name, value=1):
+        """Add ``value`` to a counter."""
+        self._counters[name] += value
+
+    def set(self, name, value):
+        """Set a gauge."""
+        self._gauges[name] = value
+
+    def observe(self, name, value):
+        """Add a sample to a histogram."""
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = Histogram()
+        histogram.observe(value)
+
+    def counter(self, name):
+        """Return a counter, 0 before the first count."""
+        return self._counters[name]
+
+    def gauge(self, name):
+        """Return a gauge, None before it was set."""
+        return self._gauges.get(name)
+
+    def percentile(self, name, q):
+        """Return a percentile of a histogram, None without samples."""
+        histogram = self._histograms.get(name)
+        return histogram.percentile(q) if histogram is not None else None
+
+    def ratio(self, part, whole):
+        """``part`` counter as a fraction of the ``whole`` counter, None before the first count."""
+        total = self._counters[whole]
+        return self._counters[part] / total if total else None
+
+    def as_dict(self):
+        """Return every metric, e.g. for the diagnostics."""
+        return {
+            'counters': dict(self._counters),
+            'gauges': dict(self._gauges),
+            'histograms': {name: histogram.as_dict() for name, histogram in self._histograms.items()},
+        }
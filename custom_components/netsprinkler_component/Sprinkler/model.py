@@ -0,0 +1,167 @@
+"""Compact parsed controller state with id and index lookups."""
+
+
+class ValveState:
+    """One valve of /api/Settings/all."""
+
+    __slots__ = ('id', 'index', 'name', 'enabled', 'is_open')
+
+    def __init__(self, id, index, name, enabled, is_open) -> None:
+        """Initialize."""
+        self.id = id
+        self.index = index
+        self.name = name
+        self.enabled = enabled
+        self.is_open = is_open
+
+    @classmethod
+    def from_json(cls, index, data):
+        """Build the record of the valve at ``index`` from its JSON object."""
+        status = data.get('status') or {}
+        return cls(data['id'], index, data.get('name', ''), bool(data.get('enabled', True)), bool(status.get('isOpen', False)))
+
+    def merge_json(self, data):
+        """Copy of this record with the fields present in ``data``, e.g. a status-only event."""
+        fields = {}
+        if 'name' in data:
+            fields['name'] = data['name']
+        if 'enabled' in data:
+            fields['enabled'] = bool(data['enabled'])
+        status = data.get('status') or {}
+        if 'isOpen' in status:
+            fields['is_open'] = bool(status['isOpen'])
+        return self.replace(**fields)
+
+    def replace(self, **fields):
+        """Copy of this record with some fields changed."""
+        values = {slot: getattr(self, slot) for slot in self.__slots__}
+        values.update(fields)
+        return ValveState(**values)
+
+    def as_dict(self):
+        """Return the JSON object of the valve, as the controller sends it."""
+        return {'id': self.id, 'name': self.name, 'enabled': self.enabled, 'status': {'isOpen': self.is_open}}
+
+    def __eq__(self, other):
+        """Compare every field."""
+        if not isinstance(other, ValveState):
+            return NotImplemented
+        return (self.id, self.index, self.name, self.enabled, self.is_open) == (other.id, other.index, other.name, other.enabled, other.is_open)
+
+    def __repr__(self):
+        """Return the representation."""
+        return f'ValveState(id={self.id}, index={self.index}, name={self.name!r}, enabled={self.enabled}, is_open={self.is_open})'
+
+
+class ScheduleState:
+    """One schedule of /api/Settings/all."""
+
+    __slots__ = ('id', 'index', 'name')
+
+    def __init__(self, id, index, name) -> None:
+        """Initialize."""
+        self.id = id
+        self.index = index
+        self.name = name
+
+    @classmethod
+    def from_json(cls, index, data):
+        """Build the record of the schedule at ``index`` from its JSON object."""
+        return cls(data['id'], index, data.get('name', ''))
+
+    def merge_json(self, data):
+        """Copy of this record with the fields present in ``data``."""
+        if 'name' in data:
+            return self.replace(name=data['name'])
+        return self
+
+    def replace(self, **fields):
+        """Copy of this record with some fields changed."""
+        values = {slot: getattr(self, slot) for slot in self.__slots__}
+        values.update(fields)
+        return ScheduleState(**values)
+
+    def as_dict(self):
+        """Return the JSON object of the schedule, as the controller sends it."""
+        return {'id': self.id, 'name': self.name}
+
+    def __eq__(self, other):
+        """Compare every field."""
+        if not isinstance(other, ScheduleState):
+            return NotImplemented
+        return (self.id, self.index, self.name) == (other.id, other.index, other.name)
+
+    def __repr__(self):
+        """Return the representation."""
+        return f'ScheduleState(id={self.id}, index={self.index}, name={self.name!r})'
+
+
+class ControllerState:
+    """Parsed /api/Settings/all document.
+
+    ``valves`` and ``schedules`` keep the controller order, ``valves_by_id``
+    and ``schedules_by_id`` index the same records by id. A state is never
+    mutated once built, changes produce a new ControllerState sharing the
+    untouched records.
+    """
+
+    __slots__ = ('device_time', 'current_draw', 'valves', 'schedules', 'valves_by_id', 'schedules_by_id')
+
+    def __init__(self, device_time, current_draw, valves, schedules) -> None:
+        """Initialize, indexing the records by id."""
+        self.device_time = device_time
+        self.current_draw = current_draw
+        self.valves = valves
+        self.schedules = schedules
+        self.valves_by_id = {valve.id: valve for valve in valves}
+        self.schedules_by_id = {schedule.id: schedule for schedule in schedules}
+
+    @classmethod
+    def parse(cls, payload):
+        """Build the state from an /api/Settings/all document."""
+        return cls(
+            payload.get('deviceTime'),
+            payload.get('currentDraw', 0),
+            [ValveState.from_json(i, valve) for i, valve in enumerate(payload.get('valves', []))],
+            [ScheduleState.from_json(i, schedule) for i, schedule in enumerate(payload.get('schedules', []))],
+        )
+
+    def replace(self, **fields):
+        """Copy of this state with some fields changed."""
+        values = {
+            'device_time': self.device_time,
+            'current_draw': self.current_draw,
+            'valves': self.valves,
+            'schedules': self.schedules,
+        }
+        values.update(fields)
+        return ControllerState(**values)
+
+    def with_valve(self, valve):
+        """Copy of this state with ``valve`` added or replacing the valve with the same id."""
+        current = self.valves_by_id.get(valve.id)
+        valves = list(self.valves)
+        if current is None:
+            valves.append(valve.replace(index=len(valves)))
+        else:
+            valves[current.index] = valve.replace(index=current.index)
+        return self.replace(valves=valves)
+
+    def with_schedule(self, schedule):
+        """Copy of this state with ``schedule`` added or replacing the schedule with the same id."""
+        current = self.schedules_by_id.get(schedule.id)
+        schedules = list(self.schedules)
+        if current is None:
+            schedules.append(schedule.replace(index=len(schedules)))
+        else:
+            schedules[current.index] = schedule.replace(index=current.index)
+        return self.replace(schedules=schedules)
+
+    def as_dict(self):
+        """Return the /api/Settings/all document of this state."""
+        return {
+            'deviceTime': self.device_time,
+            'currentDraw': self.current_draw,
+            'valves': [valve.as_dict() for valve in self.valves],
+            'schedules': [schedule.as_dict() for schedule in self.schedules],
+        }
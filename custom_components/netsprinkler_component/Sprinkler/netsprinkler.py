@@ -1,37 +1,206 @@
+import asyncio
+import collections
 import datetime
-import aiohttp
-
-from ..const import LOGGER
+import hashlib
+import json
+import time
+
+from .changes import VALVE_CLOSED, VALVE_OPENED, StateChanges, StructureChanges, ValveTransition, diff_state, valve_transitions
+from .commands import PRIORITY_RUN, PRIORITY_STOP, PRIORITY_WRITE, CommandQueue
+from .errors import (
+    NETSprinklerBatchError,
+    NETSprinklerCommandCancelledError,
+    NETSprinklerNotFoundError,
+    NETSprinklerUnsupportedError,
+)
+from .log import LOGGER
+from .metrics import DECODE_TIME, PAYLOAD_SIZE
+from .model import ControllerState, ScheduleState, ValveState
 from .valve import Valve
 from .schedule import Schedule
+from .sequencer import DrawEstimator
+from .singleflight import SingleFlight
+from .transport import (
+    ENDPOINT_SCHEDULE_SET_NAME,
+    ENDPOINT_SETTINGS_ALL,
+    ENDPOINT_VALVE_ENABLE,
+    ENDPOINT_VALVE_ENABLE_MANY,
+    ENDPOINT_VALVE_RUN,
+    ENDPOINT_VALVE_RUN_MANY,
+    ENDPOINT_VALVE_STATUS,
+    ENDPOINT_VALVE_STOP,
+    Transport,
+)
+
+# With a status endpoint, names, schedules and enabled flags are only synced this often (seconds).
+FULL_SYNC_INTERVAL = 300
+
+# Transitions kept for pop_transitions, the oldest go when nobody collects them.
+MAX_PENDING_TRANSITIONS = 1024
+
+# Upper bound of commands in flight, stops excepted.
+MAX_CONCURRENT_COMMANDS = 4
+
+def _results_by_id(ids, content):
+    """Pair valve ids with the records of a batch response, when it has them."""
+    records = {}
+    if isinstance(content, list):
+        records = {item['id']: item for item in content if isinstance(item, dict) and 'id' in item}
+    return [(id, records.get(id)) for id in ids]
+
+def _raise_batch_errors(errors, count):
+    """Raise one NETSprinklerBatchError for the single commands of a batch that failed."""
+    if errors:
+        raise NETSprinklerBatchError(f'{len(errors)} of {count} commands failed, first: {errors[0]!r}', errors)
 
 class NETSprinkler():
     def __init__(self, url, opts) -> None:
-        LOGGER.info(f'[NETSprinkler] ctor.. url : {url}')
+        LOGGER.info('[NETSprinkler] ctor.. url : %s', url)
         self.url = url
         self.opts = opts
-        self._http_client = None
-        self._state = {}
+        # a transport handed in replaces the HTTP one, e.g. to record or replay traffic
+        self._transport = opts.get("transport") or Transport(url, opts.get("session"), opts.get("limiter"))
+        self._state = None
         self._valves = {}
         self._schedules= {}
-        self._current_draw = 0
         self._enabled = True
         self.last_reboot_time = ''
+        self._etag = None
+        self._last_modified = None
+        self._digest = None
+        self._changes = None
+        # bumped by every local commit, a poll sent before one answers with an older state
+        self._generation = 0
+        self._structure = StructureChanges()
+        self._transitions = collections.deque(maxlen=MAX_PENDING_TRANSITIONS)
+        self._last_command_time = None
+        self._unsupported_endpoints = set()
+        self._flights = SingleFlight()
+        self._commands = CommandQueue(MAX_CONCURRENT_COMMANDS)
+        # stops sent per valve and for every valve, a run that saw them change was overtaken
+        self._stops = {}
+        self._stops_all = 0
+        self._stale = False
+        # until a poll is adopted, the state comes from a snapshot and its diff is no transition
+        self._restored = False
+        self._last_full_sync = None
+        self._full_sync_due = True
+        self._status_digest = None
+        self._last_payload_size = None
+        self._last_decode_time = None
+        self._draw_estimator = DrawEstimator()
 
     @property
     def valves(self):
-        """return valves"""
+        """Valves by id."""
         return self._valves
 
     @property
     def schedules(self):
-        """"return schedules"""
+        """Schedules by id."""
         return self._schedules
 
     @property
     def state(self):
+        """Parsed ControllerState, None until the first refresh."""
         return self._state
 
+    @property
+    def stale(self):
+        """True while the state comes from a snapshot the controller did not confirm yet."""
+        return self._stale
+
+    def snapshot(self):
+        """JSON-serialisable copy of the last known state."""
+        return self._state.as_dict() if self._state is not None else None
+
+    def restore(self, snapshot):
+        """Start from a snapshot taken by snapshot(), until the first refresh replaces it."""
+        self._set_state(ControllerState.parse(snapshot))
+        self._structure = StructureChanges()
+        self._transitions.clear()
+        self._changes = None
+        self._stale = True
+        self._restored = True
+
+    @property
+    def last_command_time(self):
+        """Monotonic time of the last command sent to the controller."""
+        return self._last_command_time
+
+    def seconds_until_run_end(self, now=None):
+        """Seconds until the first manual run started from here should end, None when unknown."""
+        now = time.monotonic() if now is None else now
+        ends = [
+            valve.expected_end for valve in self._valves.values()
+            if valve.expected_end is not None and valve.expected_end > now and valve.is_running
+        ]
+        if not ends:
+            return None
+        return min(ends) - now
+
+    def _track_runs(self, jobs, started):
+        for id, seconds in jobs:
+            valve = self._valves.get(id)
+            if valve is not None:
+                valve._track_run(seconds, started)
+
+    def _forget_runs(self, ids):
+        for id in ids:
+            valve = self._valves.get(id)
+            if valve is not None:
+                valve._forget_run()
+
+    @property
+    def draw_estimator(self):
+        """Per-valve current draw learned from the full syncs."""
+        return self._draw_estimator
+
+    def request_full_sync(self):
+        """Make the next refresh a full sync, e.g. to sample the current draw."""
+        self._full_sync_due = True
+
+    @property
+    def transport(self):
+        """Transport talking to the controller."""
+        return self._transport
+
+    @property
+    def metrics(self):
+        """Metrics of the controller, shared with its transport."""
+        return self._transport.metrics
+
+    @property
+    def last_payload_size(self):
+        """Decoded size in bytes of the last payload that was parsed."""
+        return self._last_payload_size
+
+    @property
+    def last_decode_time(self):
+        """Seconds spent decoding the last payload that was parsed."""
+        return self._last_decode_time
+
+    @property
+    def changes(self):
+        """What the last refresh changed, None when everything has to be considered changed."""
+        return self._changes
+
+    @property
+    def has_structure_changes(self):
+        """True when valves or schedules appeared, disappeared or moved since the last pop."""
+        return bool(self._structure)
+
+    def pop_transitions(self):
+        """ValveTransitions since the last call, oldest first."""
+        transitions = list(self._transitions)
+        self._transitions.clear()
+        return transitions
+
+    def pop_structure_changes(self):
+        """Valves and schedules added, removed or renumbered since the last call."""
+        structure, self._structure = self._structure, StructureChanges()
+        return structure
+
     @property
     def hardware_version_name(self):
         return 'NETSprinkler'
@@ -47,11 +216,11 @@ class NETSprinkler():
 
     @property
     def current_draw(self):
-        return self._current_draw
+        return self._state.current_draw if self._state else 0
 
     @property
     def device_time(self):
-        return self._timestamp_to_utc(self._device_time)
+        return self._timestamp_to_utc(self._state.device_time if self._state else None)
 
     @property
     def enabled(self):
@@ -63,31 +232,222 @@ class NETSprinkler():
     async def disable(self):
         self._enabled = False
         logPrefix = '[NETSprinkler:disable]'
-        LOGGER.debug(f'{logPrefix} Start disabling ')
-        if self._http_client is None:
-            self.session_start()
+        LOGGER.debug('%s Start disabling ', logPrefix)
+
+    async def refresh(self, full=None):
+        """Refresh the state, returns False when the controller reported no change.
+
+        The refresh is tiered: a cheap valve status poll when the controller
+        has one, and a full /api/Settings/all sync every FULL_SYNC_INTERVAL,
+        after commands that change more than the open state, or when ``full``
+        is True. Concurrent callers share the refresh that is already running.
+        """
+        if full is None:
+            full = self._full_sync_needed()
+        if full:
+            return await self._flights.do('refresh', self._refresh)
+        return await self._flights.do('refresh_status', self._refresh_status)
+
+    def _full_sync_needed(self):
+        return (
+            self._full_sync_due
+            or self._state is None
+            or ENDPOINT_VALVE_STATUS in self._unsupported_endpoints
+            or time.monotonic() - self._last_full_sync >= FULL_SYNC_INTERVAL
+        )
+
+    async def _refresh_status(self):
+        """Merge the open state of the valves from the status endpoint."""
+        logPrefix = '[netsprinkler:_refresh_status]'
+        generation = self._generation
+        try:
+            resp = await self._transport.fetch(ENDPOINT_VALVE_STATUS)
+        except NETSprinklerNotFoundError:
+            LOGGER.info('%s %s not supported, using full syncs only', logPrefix, ENDPOINT_VALVE_STATUS)
+            self._unsupported_endpoints.add(ENDPOINT_VALVE_STATUS)
+            return await self._refresh()
+        self._last_refresh_time = int(round(datetime.datetime.now().timestamp()))
+        self._stale = False
+        if self._overtaken(generation, logPrefix):
+            return False
+        restored, self._restored = self._restored, False
+
+        digest = hashlib.sha1(resp.body).digest()
+        if digest == self._status_digest:
+            self._changes = StateChanges()
+            return False
+
+        content = resp.json()
+        self._record_payload(resp)
+        self._status_digest = digest
+        items = content.get('valves', []) if isinstance(content, dict) else content
+        state = self._state
+        for item in items:
+            record = state.valves_by_id.get(item['id'])
+            if record is None:
+                # a valve the last full sync did not know about
+                self._full_sync_due = True
+                continue
+            is_open = bool((item.get('status') or {}).get('isOpen', False))
+            if record.is_open != is_open:
+                state = state.with_valve(record.replace(is_open=is_open))
+        if isinstance(content, dict) and 'deviceTime' in content:
+            state = state.replace(device_time=content['deviceTime'])
+
+        self._changes = diff_state(self._state, state)
+        if not self._changes:
+            return False
+        self._set_state(state, transitions=not restored)
+        return True
 
-    async def refresh(self):
+    async def _refresh(self):
         logPrefix = '[netsprinkler:refresh]'
-        self._content = self._state =  await self._refresh_state()
+        generation = self._generation
+        content = await self._refresh_state()
         self._last_refresh_time = int(round(datetime.datetime.now().timestamp()))
-        self._device_time = self._content['deviceTime']
-
-        for i, _ in enumerate(self._content['valves']):
-            #LOGGER.info(f'{logPrefix} enumerate {i}')
-            if i not in self._valves:
-                self._valves[i] = Valve(self, i)
-
-        for i, _ in enumerate(self._content['schedules']):
-            #LOGGER.info(f'{logPrefix} enumerate schedule {i}')
-            if i not in self._schedules:
-                self._schedules[i] = Schedule(self, i)
+        self._stale = False
+        if self._overtaken(generation, logPrefix):
+            # the full sync is still owed, the next poll makes it
+            return False
+        restored, self._restored = self._restored, False
+        self._last_full_sync = time.monotonic()
+        self._full_sync_due = False
+        if content is None:
+            LOGGER.trace('%s state unchanged, keep current state', logPrefix)
+            self._changes = StateChanges()
+            return False
+
+        state = ControllerState.parse(content)
+        # only the full document carries the current draw together with the open valves
+        self._draw_estimator.observe(state.current_draw, [valve.id for valve in state.valves if valve.is_open])
+        self._changes = diff_state(self._state, state) if self._state is not None else None
+        self._set_state(state, transitions=not restored)
+        return True
 
+    def apply_event(self, kind, payload):
+        """Merge a pushed valve, schedule or settings record, returns True when it changed the state."""
+        if self._state is None:
+            # nothing to patch yet, the first poll brings the full document
+            return False
+
+        if kind == 'settings':
+            state = ControllerState.parse(payload)
+        elif kind == 'valve':
+            # an event may only carry the fields that changed, e.g. the status
+            current = self._state.valves_by_id.get(payload['id'])
+            valve = ValveState.from_json(None, payload) if current is None else current.merge_json(payload)
+            state = self._state.with_valve(valve)
+        elif kind == 'schedule':
+            current = self._state.schedules_by_id.get(payload['id'])
+            schedule = ScheduleState.from_json(None, payload) if current is None else current.merge_json(payload)
+            state = self._state.with_schedule(schedule)
+        else:
+            LOGGER.debug('[NETSprinkler:apply_event] ignoring unknown event "%s"', kind)
+            return False
+
+        return bool(self._commit_local(state))
+
+    def _overtaken(self, generation, logPrefix):
+        """Tell whether a local commit landed while the poll of ``generation`` was in flight.
+
+        The answer predates the command or event behind that commit, adopting
+        it would undo the optimistic state and forget the run just started.
+        """
+        if generation == self._generation:
+            return False
+        LOGGER.debug('%s discarding a poll sent before the last local change', logPrefix)
+        self._changes = StateChanges()
+        # the validators now describe the discarded answer
+        self._digest = self._etag = self._last_modified = self._status_digest = None
         return True
 
+    def _commit_local(self, state):
+        """Adopt a locally derived state, returns its StateChanges."""
+        changes = diff_state(self._state, state)
+        self._changes = changes
+        # even without a change, e.g. a run restarted on an open valve, polls in flight predate it
+        self._generation += 1
+        if changes:
+            self._set_state(state)
+            # the state moved past the last polled document, so its validators are stale
+            self._digest = self._etag = self._last_modified = self._status_digest = None
+        return changes
+
+    def _patch_valves(self, results, **fields):
+        """Optimistically apply command results until the next poll confirms them.
+
+        ``results`` holds (valve id, response) pairs. A response carrying the
+        valve record replaces it, otherwise ``fields`` are set on the record.
+        """
+        if self._state is None:
+            return
+        state = self._state
+        for id, content in results:
+            record = state.valves_by_id.get(id)
+            if record is None:
+                continue
+            if isinstance(content, dict) and content.get('id') == id and 'status' in content:
+                state = state.with_valve(ValveState.from_json(None, content))
+            else:
+                state = state.with_valve(record.replace(**fields))
+        self._commit_local(state)
+
+    def _patch_schedule(self, id, content, **fields):
+        """Optimistically apply a schedule command result, see _patch_valves."""
+        if self._state is None or id not in self._state.schedules_by_id:
+            return
+        if isinstance(content, dict) and content.get('id') == id and 'name' in content:
+            record = ScheduleState.from_json(None, content)
+        else:
+            record = self._state.schedules_by_id[id].replace(**fields)
+        self._commit_local(self._state.with_schedule(record))
+
+    def _record_transitions(self, old, new):
+        """Queue the ValveTransitions between two states, before closed valves forget their run."""
+        now = time.time()
+        for kind, _, record in valve_transitions(old, new):
+            valve = self._valves.get(record.id)
+            if valve is None:
+                continue
+            transition = ValveTransition(kind, record.id, now, new.device_time)
+            if kind == VALVE_OPENED:
+                valve._opened_time = valve.start_time or now
+                transition.start_time = valve._opened_time
+                transition.duration = valve.duration
+            elif kind == VALVE_CLOSED:
+                transition.start_time = valve._opened_time or valve.start_time
+                transition.duration = valve.duration
+                if transition.start_time is not None:
+                    transition.run_seconds = round(now - transition.start_time, 1)
+                valve._opened_time = None
+            self._transitions.append(transition)
+
+    def _set_state(self, state, transitions=True):
+        if self._state is not None:
+            self._structure.update(self._state, state)
+            if transitions:
+                self._record_transitions(self._state, state)
+        self._state = state
+
+        for id in state.valves_by_id:
+            if id not in self._valves:
+                self._valves[id] = Valve(self, id)
+        for id in [id for id in self._valves if id not in state.valves_by_id]:
+            del self._valves[id]
+        # a closed valve has no run left, whoever closed it
+        for record in state.valves:
+            if not record.is_open:
+                self._valves[record.id]._forget_run()
+
+        for id in state.schedules_by_id:
+            if id not in self._schedules:
+                self._schedules[id] = Schedule(self, id)
+        for id in [id for id in self._schedules if id not in state.schedules_by_id]:
+            del self._schedules[id]
+
     async def enable_valve(self, id):
         logPrefix = '[NETSprinkler:enable_valve]'
-        LOGGER.debug(f'{logPrefix} Start enabling valve')
+        LOGGER.debug('%s Start enabling valve', logPrefix)
         data = {
             "valveId" : id,
             "enableValve": True
@@ -95,62 +455,120 @@ class NETSprinkler():
         return await self.callEnableValveWithData(data)
 
     async def start_manual(self, id, seconds = 60):
+        return await self._start_manual(id, seconds, self._stop_count(id))
+
+    async def _start_manual(self, id, seconds, stops):
         logPrefix = '[NETSPrinkler:start_manual]'
-        LOGGER.debug(f'{logPrefix} Start Manual Run')
+        LOGGER.debug('%s Start Manual Run', logPrefix)
+        started = time.monotonic()
+        content = await self._send_run(id, seconds, stops)
+        self._track_runs([(id, seconds)], started)
+        self._patch_valves([(id, content)], is_open=True)
+        LOGGER.debug('%s result : %s', logPrefix, content)
+        await self._stop_overtaken({id: stops})
+        return content
+
+    async def _send_run(self, id, seconds, stops):
+        """POST the run of one valve, unless a stop for it went out since ``stops`` was taken."""
+        if self._stop_count(id) != stops:
+            raise NETSprinklerCommandCancelledError(f'Run of valve {id} cancelled by a stop')
         data = {
             'valveId' : id,
             'seconds': seconds
         }
-        if self._http_client is None:
-            self.session_start()
-        timeout = aiohttp.ClientTimeout(total=60)
-        headers = {"Accept": "*/*", "Connection": "keep-alive", "Content-Type":"application/json"}
-        url = f'{self.url}/api/Valve/Run'
-        LOGGER.debug(f'{logPrefix} Start making call to "{url}"')
-
+        return await self._send_command(ENDPOINT_VALVE_RUN, data, PRIORITY_RUN, [id])
+
+    def _stop_count(self, id):
+        return self._stops_all + self._stops.get(id, 0)
+
+    async def _stop_overtaken(self, stops):
+        """Close the valves whose run was under way when a stop for them went out.
+
+        ``stops`` maps valve ids to their stop count when the run started. The
+        stop and the run race each other on the wire, so the run may have
+        landed last and the valve has to be closed again.
+        """
+        overtaken = [id for id, count in stops.items() if self._stop_count(id) != count]
+        if not overtaken:
+            return
+        LOGGER.info('[NETSprinkler:_stop_overtaken] runs of %s overtaken by a stop, closing them again', overtaken)
+        await self.stop_many(overtaken)
+        raise NETSprinklerCommandCancelledError(f'Runs of valves {overtaken} cancelled by a stop')
+
+    async def stop(self, id):
+        """Close a valve, ahead of every queued command; queued runs of the valve are dropped."""
+        LOGGER.debug('[NETSprinkler:stop] Stop valve %s', id)
+        self._stops[id] = self._stops.get(id, 0) + 1
+        self._commands.cancel_runs([id])
+        content = await self._send_stop(id)
+        # closing the valve first, so its transition still carries the run
+        self._patch_valves([(id, content)], is_open=False)
+        self._forget_runs([id])
+        return content
+
+    async def stop_many(self, ids):
+        """Close valves in one concurrent burst, raises the first failure once every stop is done."""
+        ids = list(ids)
+        LOGGER.debug('[NETSprinkler:stop_many] Stop %s valves', len(ids))
+        for id in ids:
+            self._stops[id] = self._stops.get(id, 0) + 1
+        self._commands.cancel_runs(ids)
+        results = await asyncio.gather(
+            *(self._send_stop(id) for id in ids),
+            return_exceptions=True,
+        )
+        stopped = [(id, content) for id, content in zip(ids, results) if not isinstance(content, BaseException)]
+        self._patch_valves(stopped, is_open=False)
+        self._forget_runs([id for id, _ in stopped])
+        for content in results:
+            if isinstance(content, BaseException):
+                raise content
+        return results
+
+    async def _send_stop(self, id):
+        """POST the stop of one valve.
+
+        Firmware without /api/Valve/Stop has no other way to close a valve
+        early: a 404 for a known valve marks the endpoint unsupported, and
+        every stop from then on raises NETSprinklerUnsupportedError without
+        a request.
+        """
+        message = f'Controller firmware has no {ENDPOINT_VALVE_STOP}, valves cannot be stopped before their run ends'
+        if ENDPOINT_VALVE_STOP in self._unsupported_endpoints:
+            raise NETSprinklerUnsupportedError(message, 404)
         try:
-            async with self._http_client.post(
-                    url, timeout=timeout, headers=headers,json=data
-                ) as resp:
-                    LOGGER.debug(f'{logPrefix} call finished and returned data {resp}')
-                    content = await resp.json(
-                        encoding="UTF-8", content_type="application/json"
-                    )
-                    LOGGER.info(f'{logPrefix} result : {content}')
-                    return content
-        except aiohttp.ClientConnectionError as exc:
-            raise ValueError("Cannot connect to controller") from exc
-        except ConnectionError as exc:
-            raise ValueError("Cannot connect to controller") from exc
+            return await self._send_command(ENDPOINT_VALVE_STOP, {'valveId': id}, PRIORITY_STOP)
+        except NETSprinklerNotFoundError as exc:
+            if self._state is None or id not in self._state.valves_by_id:
+                raise
+            if ENDPOINT_VALVE_STOP not in self._unsupported_endpoints:
+                # the stops of a burst all come back with the same answer
+                LOGGER.warning('[NETSprinkler:_send_stop] %s not supported by the controller', ENDPOINT_VALVE_STOP)
+                self._unsupported_endpoints.add(ENDPOINT_VALVE_STOP)
+            raise NETSprinklerUnsupportedError(message, 404) from exc
+
+    async def stop_all(self):
+        """Drop every queued run and close every valve that is open or was started from here.
+
+        Runs still under way are closed again by _stop_overtaken once they land.
+        """
+        self._stops_all += 1
+        self._commands.cancel_runs()
+        open_ids = {valve.id for valve in self._state.valves if valve.is_open} if self._state else set()
+        tracked_ids = {id for id, valve in self._valves.items() if valve.expected_end is not None}
+        return await self.stop_many(open_ids | tracked_ids)
 
     async def callEnableValveWithData(self, data):
         logPrefix = '[NETSprinkler:callEnableValveWithData]'
-        if self._http_client is None:
-            self.session_start()
-
-        timeout = aiohttp.ClientTimeout(total=60)
-        headers = {"Accept": "*/*", "Connection": "keep-alive", "Content-Type":"application/json"}
-        url = f'{self.url}/api/Valve/EnableValve'
-        LOGGER.debug(f'{logPrefix} Start making call to "{url}"')
-
-        try:
-            async with self._http_client.post(
-                    url, timeout=timeout, headers=headers,json=data
-                ) as resp:
-                    LOGGER.debug(f'{logPrefix} call finished and returned data {resp}')
-                    content = await resp.json(
-                        encoding="UTF-8", content_type="application/json"
-                    )
-                    LOGGER.info(f'{logPrefix} result : {content}')
-                    return content
-        except aiohttp.ClientConnectionError as exc:
-            raise ValueError("Cannot connect to controller") from exc
-        except ConnectionError as exc:
-            raise ValueError("Cannot connect to controller") from exc
+        content = await self._send_command(ENDPOINT_VALVE_ENABLE, data, PRIORITY_WRITE, [data['valveId']])
+        self._full_sync_due = True
+        self._patch_valves([(data['valveId'], content)], enabled=data['enableValve'])
+        LOGGER.debug('%s result : %s', logPrefix, content)
+        return content
 
     async def disable_valve(self, id):
         logPrefix = '[NETSprinkler:disable_valve]'
-        LOGGER.debug(f'{logPrefix} Start disabling valve')
+        LOGGER.debug('%s Start disabling valve', logPrefix)
         data = {
             "valveId" : id,
             "enableValve": False
@@ -159,35 +577,101 @@ class NETSprinkler():
 
     async def set_schedule_name(self, name, id):
         logPrefix = '[NETSprinkler:set_schedule_name]'
-        LOGGER.debug(f'{logPrefix} Start setting schedule name of id {id}')
+        LOGGER.debug('%s Start setting schedule name of id %s', logPrefix, id)
         data = {
             "scheduleId": id,
             "name": name
         }
-        if self._http_client is None:
-            self.session_start()
-
-        timeout = aiohttp.ClientTimeout(total=60)
-        headers = {"Accept": "*/*", "Connection": "keep-alive", "Content-Type":"application/json"}
-        url = f'{self.url}/api/Scheduler/SetName'
-        LOGGER.debug(f'{logPrefix} Start making call to "{url}"')
-
-        try:
-            async with self._http_client.post(
-                    url, timeout=timeout, headers=headers,json=data
-                ) as resp:
-                    LOGGER.debug(f'{logPrefix} call finished and returned data {resp}')
-                    content = await resp.json(
-                        encoding="UTF-8", content_type="application/json"
-                    )
-                    LOGGER.info(f'{logPrefix} result : {content}')
-                    return content
-        except aiohttp.ClientConnectionError as exc:
-            raise ValueError("Cannot connect to controller") from exc
-        except ConnectionError as exc:
-            raise ValueError("Cannot connect to controller") from exc
-
-
+        content = await self._send_command(ENDPOINT_SCHEDULE_SET_NAME, data)
+        self._full_sync_due = True
+        self._patch_schedule(id, content, name=name)
+        LOGGER.debug('%s result : %s', logPrefix, content)
+        return content
+
+    def valve_by_index(self, index):
+        """Valve at a position of the controller valve list."""
+        return self._valves[self._state.valves[index].id]
+
+    async def run_many(self, jobs):
+        """Start manual runs for a list of (valve id, seconds) jobs."""
+        jobs = list(jobs)
+        LOGGER.debug('[NETSprinkler:run_many] Start Manual Run of %s valves', len(jobs))
+        data = {'runs': [{'valveId': id, 'seconds': seconds} for id, seconds in jobs]}
+        stops = {id: self._stop_count(id) for id, _ in jobs}
+        started = time.monotonic()
+        results, errors = await self._send_batch(
+            ENDPOINT_VALVE_RUN_MANY, data,
+            [lambda id=id, seconds=seconds: self._send_run(id, seconds, stops[id]) for id, seconds in jobs],
+            PRIORITY_RUN, [id for id, _ in jobs]
+        )
+        sent = {id for id, _ in results}
+        self._track_runs([(id, seconds) for id, seconds in jobs if id in sent], started)
+        self._patch_valves(results, is_open=True)
+        await self._stop_overtaken({id: stops[id] for id in sent})
+        _raise_batch_errors(errors, len(jobs))
+        return [record for _, record in results]
+
+    async def enable_many(self, ids):
+        """Enable a list of valves."""
+        return await self._set_enabled_many(list(ids), True)
+
+    async def disable_many(self, ids):
+        """Disable a list of valves."""
+        return await self._set_enabled_many(list(ids), False)
+
+    async def _set_enabled_many(self, ids, enable):
+        LOGGER.debug('[NETSprinkler:_set_enabled_many] set enabled=%s on %s valves', enable, len(ids))
+        data = {'valveIds': ids, 'enableValve': enable}
+        results, errors = await self._send_batch(
+            ENDPOINT_VALVE_ENABLE_MANY, data,
+            [
+                lambda id=id: self._send_command(ENDPOINT_VALVE_ENABLE, {'valveId': id, 'enableValve': enable}, PRIORITY_WRITE, [id])
+                for id in ids
+            ],
+            PRIORITY_WRITE, ids
+        )
+        self._full_sync_due = True
+        self._patch_valves(results, enabled=enable)
+        _raise_batch_errors(errors, len(ids))
+        return [record for _, record in results]
+
+    async def _send_batch(self, endpoint, data, calls, priority=PRIORITY_WRITE, valve_ids=()):
+        """Use the batch endpoint if the controller has it, otherwise the single commands.
+
+        ``calls`` send the single command of each of ``valve_ids``. They queue
+        up behind each other in the command queue, at most
+        MAX_CONCURRENT_COMMANDS of them are in flight, and each one runs to
+        its end even when others fail. Returns the (valve id, record) pairs of
+        the valves the command reached and the errors of the ones it did not.
+        """
+        if not calls:
+            return [], []
+        if endpoint not in self._unsupported_endpoints:
+            try:
+                content = await self._send_command(endpoint, data, priority, valve_ids)
+                return _results_by_id(valve_ids, content), []
+            except NETSprinklerNotFoundError:
+                LOGGER.info('[NETSprinkler:_send_batch] %s not supported, falling back to single commands', endpoint)
+                self._unsupported_endpoints.add(endpoint)
+
+        outcomes = await asyncio.gather(*(call() for call in calls), return_exceptions=True)
+        results = [(id, outcome) for id, outcome in zip(valve_ids, outcomes) if not isinstance(outcome, BaseException)]
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        return results, errors
+
+    async def _send_command(self, endpoint, data, priority=PRIORITY_WRITE, valve_ids=()):
+        """POST a command through the command queue.
+
+        An identical command still queued or in flight is awaited instead of
+        sent again. Stops skip the queue and go out right away.
+        """
+        self._last_command_time = time.monotonic()
+        key = (endpoint, json.dumps(data, sort_keys=True))
+        if priority == PRIORITY_STOP:
+            send = lambda: self._transport.stop(endpoint, data)
+        else:
+            send = lambda: self._transport.post(endpoint, data)
+        return await self._flights.do(key, lambda: self._commands.submit(send, priority, valve_ids))
 
     def _timestamp_to_utc(self, timestamp):
         if timestamp is None:
@@ -195,52 +679,43 @@ class NETSprinkler():
         offset = 0 #(self._get_option("tz") - 48) * 15 * 60
         return timestamp if timestamp == 0 else timestamp - offset
 
-    def session_start(self):
-        LOGGER.debug(f'[NETSprinkler:session_start] start client and http client')
-        client = aiohttp.ClientSession()
-        self._http_client = client
-
     async def session_close(self):
-        if self._http_client is not None and "session" not in self._opts:
-            await self._http_client.close()
-            self._http_client = None
+        await self._commands.close()
+        await self._transport.close()
 
     async def _refresh_state(self):
+        """Fetch /api/Settings/all, returns None when it did not change since the last poll."""
         logPrefix = '[NETSprinkler:_refresh_state]'
-        LOGGER.debug(f'{logPrefix} Start refreshing data from sprinkler')
-        if self._http_client is None:
-            self.session_start()
-
-        timeout = aiohttp.ClientTimeout(total=60)
-        headers = {"Accept": "*/*", "Connection": "keep-alive", "Content-Type":"application/json"}
+        LOGGER.trace('%s Start refreshing data from sprinkler', logPrefix)
+        headers = {}
+        if self._state is not None:
+            if self._etag:
+                headers['If-None-Match'] = self._etag
+            if self._last_modified:
+                headers['If-Modified-Since'] = self._last_modified
+
+        resp = await self._transport.fetch(ENDPOINT_SETTINGS_ALL, headers)
+        if resp.not_modified:
+            return None
 
-        auth = None
-        verify_ssl = None
+        # Controllers without validators still send identical bytes when idle.
+        digest = hashlib.sha1(resp.body).digest()
+        if self._state is not None and digest == self._digest:
+            return None
 
-        url = f'{self.url}/api/Settings/all'
-        LOGGER.debug(f'{logPrefix} Start making call to "{url}"')
-        try:
-            async with self._http_client.get(
-                    url, timeout=timeout, headers=headers, verify_ssl=verify_ssl, auth=auth
-                ) as resp:
-                    LOGGER.debug(f'{logPrefix} call finished and returned data {resp}')
-                    content = await resp.json(
-                        encoding="UTF-8", content_type="application/json"
-                    )
-                    LOGGER.info(f'{logPrefix} result : {content}')
-
-                    # if len(content) == 1:
-                    #     if "result" in content:
-                    #         if content["result"] == 2:
-                    #             raise OpenSprinklerAuthError("Invalid password")
-                    #         elif content["result"] > 2:
-                    #             raise OpenSprinklerApiError(
-                    #                 f"Error code: {content['result']}", content["result"]
-                    #             )
-                    #     elif "fwv" in content:x
-                    #         raise OpenSprinklerAuthError("Invalid password")
-                    return content
-        except aiohttp.ClientConnectionError as exc:
-            raise ValueError("Cannot connect to controller") from exc
-        except ConnectionError as exc:
-            raise ValueError("Cannot connect to controller") from exc
\ No newline at end of file
+        content = resp.json()
+        self._record_payload(resp)
+        self._digest = digest
+        self._etag = resp.etag
+        self._last_modified = resp.last_modified
+        return content
+
+    def _record_payload(self, resp):
+        self._last_payload_size = resp.size
+        self._last_decode_time = resp.decode_time
+        self.metrics.set(PAYLOAD_SIZE, resp.size)
+        self.metrics.observe(DECODE_TIME, resp.decode_time)
+        LOGGER.trace(
+            '[NETSprinkler:_record_payload] %s bytes (%s on the wire) decoded in %.1fms',
+            resp.size, resp.wire_size, resp.decode_time * 1000,
+        )
@@ -0,0 +1,67 @@
+"""cProfile and tracemalloc over a number of update cycles."""
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+
+# Rows of the text report, sorted by cumulative time.
+REPORT_ROWS = 60
+
+
+class CycleProfiler:
+    """Profiles only while a cycle runs, across ``cycles`` cycles.
+
+    ``resume`` and ``pause`` bracket one cycle; once the last one paused,
+    ``done`` is True and ``dump`` writes the cProfile stats, a text report
+    and the tracemalloc snapshot taken at the end of the last cycle.
+    """
+
+    def __init__(self, cycles) -> None:
+        """Initialize for ``cycles`` cycles."""
+        self.cycles_left = cycles
+        self._profile = cProfile.Profile()
+        self._snapshot = None
+        self._started_tracemalloc = False
+
+    @property
+    def done(self):
+        """True once the last cycle paused."""
+        return self.cycles_left <= 0
+
+    def resume(self):
+        """Start profiling a cycle."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._profile.enable()
+
+    def pause(self):
+        """Stop profiling a cycle, snapshot the memory after the last one."""
+        self._profile.disable()
+        self.cycles_left -= 1
+        if self.done:
+            self._snapshot = tracemalloc.take_snapshot()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+
+    def dump(self, directory, name):
+        """Write ``<name>.prof``, ``<name>.txt`` and ``<name>.tracemalloc``, returns their paths."""
+        base = os.path.join(directory, f'{name}_{time.strftime("%Y%m%d_%H%M%S")}')
+        paths = [f'{base}.prof', f'{base}.txt']
+        self._profile.dump_stats(paths[0])
+
+        report = io.StringIO()
+        pstats.Stats(self._profile, stream=report).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(REPORT_ROWS)
+        if self._snapshot is not None:
+            report.write('\nTop allocations by line\n')
+            for stat in self._snapshot.statistics('lineno')[:REPORT_ROWS]:
+                report.write(f'{stat}\n')
+        with open(paths[1], 'w', encoding='utf-8') as file:
+            file.write(report.getvalue())
+
+        if self._snapshot is not None:
+            paths.append(f'{base}.tracemalloc')
+            self._snapshot.dump(paths[2])
+        return paths
@@ -0,0 +1,124 @@
+"""Server-Sent Events client that pushes controller changes into the state."""
+import asyncio
+import contextlib
+import logging
+
+from . import codec
+from .errors import NETSprinklerApiError, NETSprinklerError
+from .log import LOGGER
+from .transport import ENDPOINT_EVENTS
+
+RECONNECT_MIN = 1
+RECONNECT_MAX = 60
+
+EVENT_STREAM_CONTENT_TYPE = 'text/event-stream'
+
+
+class PushClient:
+    """Keeps the event stream of a controller open and applies its events.
+
+    The stream sends one SSE message per change: the event name is the kind
+    ("valve", "schedule" or "settings") and the data is the JSON record of
+    that kind, a valve or schedule record possibly with only the fields that
+    changed. ``on_update`` is called after every applied event and
+    ``on_connection`` whenever the stream goes up or down.
+    """
+
+    def __init__(self, controller, on_update, on_connection=None) -> None:
+        """Initialize."""
+        self._controller = controller
+        self._on_update = on_update
+        self._on_connection = on_connection
+        self._task = None
+        self._connected = False
+        self._supported = True
+
+    @property
+    def connected(self):
+        """True while the event stream is open."""
+        return self._connected
+
+    @property
+    def supported(self):
+        """False once the controller answered that it has no event stream."""
+        return self._supported
+
+    def start(self):
+        """Open the event stream in the background, unless it already runs."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Close the event stream and wait for its task to end."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        self._set_connected(False)
+
+    def _set_connected(self, connected):
+        if connected == self._connected:
+            return
+        self._connected = connected
+        if self._on_connection is not None:
+            self._on_connection(connected)
+
+    async def _run(self):
+        logPrefix = '[PushClient:_run]'
+        delay = RECONNECT_MIN
+        while self._supported:
+            try:
+                async with self._controller.transport.stream(ENDPOINT_EVENTS) as resp:
+                    if resp.status == 404:
+                        LOGGER.info('%s controller has no event stream, staying on polling', logPrefix)
+                        self._supported = False
+                        return
+                    if resp.status >= 400:
+                        raise NETSprinklerApiError(f"Controller returned HTTP {resp.status}", resp.status)
+                    if resp.status != 200 or resp.content_type != EVENT_STREAM_CONTENT_TYPE:
+                        # e.g. a web UI answering every unknown path with its index page
+                        LOGGER.info('%s controller answered HTTP %s %s instead of an event stream, staying on polling', logPrefix, resp.status, resp.content_type)
+                        self._supported = False
+                        return
+                    self._set_connected(True)
+                    delay = RECONNECT_MIN
+                    await self._consume(resp)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # pylint: disable=broad-except
+                LOGGER.throttled(logging.DEBUG, 'push_failed', '%s event stream failed: %r', logPrefix, exc)
+            self._set_connected(False)
+            LOGGER.trace('%s reconnecting in %ss', logPrefix, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX)
+
+    async def _consume(self, resp):
+        event = 'message'
+        data = []
+        async for raw in resp.content:
+            line = raw.decode('utf-8').rstrip('\r\n')
+            if not line:
+                if data:
+                    self._dispatch(event, '\n'.join(data))
+                event = 'message'
+                data = []
+            elif line.startswith(':'):
+                # comment line, used by the controller as heartbeat
+                continue
+            else:
+                field, _, value = line.partition(':')
+                value = value[1:] if value.startswith(' ') else value
+                if field == 'event':
+                    event = value
+                elif field == 'data':
+                    data.append(value)
+
+    def _dispatch(self, event, data):
+        try:
+            payload = codec.loads(data)
+        except NETSprinklerError:
+            LOGGER.throttled(logging.WARNING, 'push_malformed', '[PushClient:_dispatch] ignoring malformed "%s" event', event)
+            return
+        if self._controller.apply_event(event, payload):
+            self._on_update()
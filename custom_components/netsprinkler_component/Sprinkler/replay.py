@@ -0,0 +1,300 @@
+"""Record controller traffic to a file and replay it later without the controller.
+
+A recording is gzipped JSON lines: a header, then one entry per request
+with its start offset, latency, status, validators and body, or the error
+it raised. Bodies equal to the previous body of the same endpoint are not
+stored again, so a day of idle polls stays small.
+
+Hand a RecordingTransport or a ReplayTransport to NETSprinkler through
+``opts["transport"]``.
+"""
+import argparse
+import asyncio
+import contextlib
+import gzip
+import json
+import sys
+import time
+
+from . import codec, errors
+from .log import LOGGER
+from .transport import (
+    ENDPOINT_SCHEDULE_SET_NAME,
+    ENDPOINT_SETTINGS_ALL,
+    ENDPOINT_VALVE_ENABLE,
+    ENDPOINT_VALVE_ENABLE_MANY,
+    ENDPOINT_VALVE_RUN,
+    ENDPOINT_VALVE_RUN_MANY,
+    ENDPOINT_VALVE_STATUS,
+    ENDPOINT_VALVE_STOP,
+    Response,
+    Transport,
+)
+
+RECORDING_VERSION = 1
+
+# Client call that sends a recorded command again, by endpoint. The fallbacks
+# of the client, e.g. single runs after a missing batch endpoint, then take
+# the recorded answers of the requests they made.
+REPLAY_COMMANDS = {
+    ENDPOINT_VALVE_RUN: lambda controller, data: controller.start_manual(data['valveId'], data['seconds']),
+    ENDPOINT_VALVE_RUN_MANY: lambda controller, data: controller.run_many(
+        (run['valveId'], run['seconds']) for run in data['runs']
+    ),
+    ENDPOINT_VALVE_STOP: lambda controller, data: controller.stop(data['valveId']),
+    ENDPOINT_VALVE_ENABLE: lambda controller, data: (
+        controller.enable_valve(data['valveId']) if data['enableValve'] else controller.disable_valve(data['valveId'])
+    ),
+    ENDPOINT_VALVE_ENABLE_MANY: lambda controller, data: (
+        controller.enable_many(data['valveIds']) if data['enableValve'] else controller.disable_many(data['valveIds'])
+    ),
+    ENDPOINT_SCHEDULE_SET_NAME: lambda controller, data: controller.set_schedule_name(data['name'], data['scheduleId']),
+}
+
+
+class _StreamNotRecorded:
+    """Stands in for the event stream, which is not part of a recording."""
+
+    status = 404
+
+
+class RecordingTransport(Transport):
+    """Transport that keeps every request and its outcome, see ``save``."""
+
+    def __init__(self, url, path, session=None) -> None:
+        """Initialize, recording to the file at ``path``."""
+        super().__init__(url, session)
+        self.path = path
+        self._start = time.monotonic()
+        self._entries = []
+        self._last_bodies = {}
+
+    def _record(self, started, method, endpoint, data=None, status=None, body=None, etag=None, last_modified=None, error=None):
+        entry = {
+            't': round(started - self._start, 4),
+            'l': round(time.monotonic() - started, 4),
+            'm': method,
+            'e': endpoint,
+        }
+        if data is not None:
+            entry['d'] = data
+        if error is not None:
+            entry['x'] = [type(error).__name__, str(error), getattr(error, 'status', None)]
+        else:
+            entry['s'] = status
+            if etag or last_modified:
+                entry['v'] = [etag, last_modified]
+            key = (method, endpoint)
+            if body is not None and body == self._last_bodies.get(key):
+                entry['r'] = 1
+            elif body is not None:
+                entry['b'] = body.decode('utf-8') if isinstance(body, bytes) else body
+                self._last_bodies[key] = body
+        self._entries.append(entry)
+
+    async def _request_once(self, method, endpoint, data, remaining):
+        started = time.monotonic()
+        try:
+            content = await super()._request_once(method, endpoint, data, remaining)
+        except errors.NETSprinklerError as exc:
+            self._record(started, method, endpoint, data, error=exc)
+            raise
+        self._record(started, method, endpoint, data, 200, json.dumps(content))
+        return content
+
+    async def _fetch_once(self, endpoint, headers, remaining):
+        started = time.monotonic()
+        try:
+            resp = await super()._fetch_once(endpoint, headers, remaining)
+        except errors.NETSprinklerError as exc:
+            self._record(started, 'GET', endpoint, error=exc)
+            raise
+        self._record(started, 'GET', endpoint, None, resp.status, resp.body or None, resp.etag, resp.last_modified)
+        return resp
+
+    def save(self):
+        """Write the recording, blocking."""
+        with gzip.open(self.path, 'wt', encoding='utf-8') as file:
+            file.write(json.dumps({'version': RECORDING_VERSION, 'url': self.url, 'entries': len(self._entries)}) + '\n')
+            for entry in self._entries:
+                file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        LOGGER.info('[RecordingTransport:save] %s requests written to %s', len(self._entries), self.path)
+
+    async def close(self):
+        """Close the session and write the recording."""
+        await super().close()
+        self.save()
+
+
+def load_recording(path):
+    """Header and entries of a recording, with repeated bodies filled in."""
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        header = json.loads(file.readline())
+        if header.get('version') != RECORDING_VERSION:
+            raise errors.NETSprinklerError(f"Unsupported recording version {header.get('version')}")
+        entries = []
+        last_bodies = {}
+        for line in file:
+            entry = json.loads(line)
+            key = (entry['m'], entry['e'])
+            if entry.get('r'):
+                entry['b'] = last_bodies.get(key)
+            elif 'b' in entry:
+                last_bodies[key] = entry['b']
+            entries.append(entry)
+    return header, entries
+
+
+class ReplayTransport(Transport):
+    """Answers requests from a recording instead of the network.
+
+    Every endpoint hands out its recorded answers in order. ``speed`` paces
+    the answers: 1 replays at the recorded times, 60 a minute per second,
+    None as fast as possible. Retries and the circuit breaker run as they
+    would against the controller.
+    """
+
+    def __init__(self, header, entries, speed=1.0) -> None:
+        """Initialize from a loaded recording."""
+        super().__init__(header.get('url', 'replay'))
+        self.speed = speed
+        self._queues = {}
+        for entry in entries:
+            self._queues.setdefault((entry['m'], entry['e']), []).append(entry)
+        self._positions = dict.fromkeys(self._queues, 0)
+        self._start = None
+
+    @classmethod
+    def load(cls, path, speed=1.0):
+        """Build the transport from the recording at ``path``."""
+        header, entries = load_recording(path)
+        return cls(header, entries, speed)
+
+    @property
+    def remaining(self):
+        """Recorded answers not handed out yet."""
+        return sum(len(queue) - self._positions[key] for key, queue in self._queues.items())
+
+    def peek(self):
+        """Earliest recorded request not handed out yet, None at the end."""
+        heads = [queue[self._positions[key]] for key, queue in self._queues.items() if self._positions[key] < len(queue)]
+        return min(heads, key=lambda entry: entry['t']) if heads else None
+
+    def skip(self, entry):
+        """Drop an entry the client did not ask for, e.g. while its circuit breaker is open."""
+        self._positions[(entry['m'], entry['e'])] += 1
+
+    async def _next(self, method, endpoint):
+        key = (method, endpoint)
+        position = self._positions.get(key, 0)
+        queue = self._queues.get(key, ())
+        if position >= len(queue):
+            raise errors.NETSprinklerConnectionError(f"Recording has no more answers for {method} {endpoint}")
+        self._positions[key] = position + 1
+        entry = queue[position]
+
+        if self._start is None:
+            # the first answer sets the clock, the others keep their distance to it
+            self._start = time.monotonic() - entry['t'] / self.speed if self.speed else time.monotonic()
+        if self.speed:
+            delay = self._start + (entry['t'] + entry['l']) / self.speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        if 'x' in entry:
+            name, message, status = entry['x']
+            error = getattr(errors, name, errors.NETSprinklerConnectionError)
+            if issubclass(error, errors.NETSprinklerApiError):
+                raise error(message, status)
+            raise error(message)
+        return entry
+
+    async def _request_once(self, method, endpoint, data, remaining):
+        entry = await self._next(method, endpoint)
+        return codec.loads(entry.get('b'))
+
+    async def _fetch_once(self, endpoint, headers, remaining):
+        entry = await self._next('GET', endpoint)
+        etag, last_modified = entry.get('v', (None, None))
+        body = (entry.get('b') or '').encode('utf-8')
+        return Response(entry['s'], body, etag, last_modified)
+
+    async def _probe(self):
+        pass
+
+    @contextlib.asynccontextmanager
+    async def stream(self, endpoint):
+        """Answer like a controller without an event stream."""
+        yield _StreamNotRecorded()
+
+    async def close(self):
+        """Nothing to close, no session is opened."""
+
+
+async def record(url, path, duration, interval):
+    """Poll a controller for ``duration`` seconds and record the traffic."""
+    from .netsprinkler import NETSprinkler
+
+    controller = NETSprinkler(url, {'transport': RecordingTransport(url, path)})
+    end = time.monotonic() + duration
+    try:
+        while time.monotonic() < end:
+            try:
+                await controller.refresh()
+            except errors.NETSprinklerError as exc:
+                LOGGER.warning('[replay:record] refresh failed: %s', exc)
+            await asyncio.sleep(interval)
+    finally:
+        await controller.session_close()
+
+
+async def replay(path, speed):
+    """Drive a client through a recording in the recorded order, returns its metrics."""
+    from .netsprinkler import NETSprinkler
+
+    transport = ReplayTransport.load(path, speed)
+    controller = NETSprinkler(transport.url, {'transport': transport})
+    refreshes = changed = 0
+    while (entry := transport.peek()) is not None:
+        remaining = transport.remaining
+        try:
+            if entry['m'] == 'GET' and entry['e'] in (ENDPOINT_SETTINGS_ALL, ENDPOINT_VALVE_STATUS):
+                refreshes += 1
+                changed += bool(await controller.refresh(full=entry['e'] == ENDPOINT_SETTINGS_ALL))
+            elif entry['e'] in REPLAY_COMMANDS:
+                await REPLAY_COMMANDS[entry['e']](controller, entry.get('d'))
+            else:
+                LOGGER.debug('[replay:replay] no client call for %s %s', entry['m'], entry['e'])
+        except errors.NETSprinklerError as exc:
+            LOGGER.debug('[replay:replay] recorded failure: %s', exc)
+        if transport.remaining == remaining:
+            transport.skip(entry)
+    return refreshes, changed, controller.metrics
+
+
+def main(argv=None):
+    """Record or replay from the command line."""
+    parser = argparse.ArgumentParser(description='Record or replay NETSprinkler traffic.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    rec = commands.add_parser('record', help='poll a controller and record the traffic')
+    rec.add_argument('url')
+    rec.add_argument('path')
+    rec.add_argument('--duration', type=float, default=60, help='seconds to record')
+    rec.add_argument('--interval', type=float, default=5, help='seconds between polls')
+    rep = commands.add_parser('replay', help='replay a recording through the client')
+    rep.add_argument('path')
+    rep.add_argument('--speed', type=float, default=0, help='1 for real time, 0 for as fast as possible')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        asyncio.run(record(args.url, args.path, args.duration, args.interval))
+        return 0
+
+    refreshes, changed, metrics = asyncio.run(replay(args.path, args.speed or None))
+    print(f'{refreshes} refreshes, {changed} with changes')
+    print(json.dumps(metrics.as_dict(), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
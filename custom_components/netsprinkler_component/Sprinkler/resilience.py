@@ -0,0 +1,135 @@
+"""Retry and circuit breaker policies around controller I/O."""
+import asyncio
+import random
+import time
+
+from .errors import NETSprinklerApiError, NETSprinklerCircuitOpenError, NETSprinklerConnectionError
+
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 4
+
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_RESET_TIMEOUT = 15
+BREAKER_MAX_RESET_TIMEOUT = 300
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+def is_transient(exc):
+    """Tell whether ``exc`` is worth another try: connection problems and 5xx answers are."""
+    if isinstance(exc, NETSprinklerCircuitOpenError):
+        return False
+    if isinstance(exc, NETSprinklerConnectionError):
+        return True
+    return isinstance(exc, NETSprinklerApiError) and exc.status is not None and exc.status >= 500
+
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY, maximum=RETRY_MAX_DELAY):
+    """Full jitter exponential backoff for the given (0 based) retry attempt."""
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+
+async def retry(call, deadline, attempts=RETRY_ATTEMPTS):
+    """Run ``call(remaining_seconds)`` until it succeeds, retrying transient errors.
+
+    Gives up when the attempts are used or the next try would not start
+    before the monotonic ``deadline``.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await call(deadline - time.monotonic())
+        except Exception as exc:  # pylint: disable=broad-except
+            attempt += 1
+            if not is_transient(exc) or attempt >= attempts:
+                raise
+            delay = backoff_delay(attempt - 1)
+            if time.monotonic() + delay >= deadline:
+                raise
+            await asyncio.sleep(delay)
+
+
+class ConcurrencyLimit:
+    """Caps the requests in flight across every transport sharing it."""
+
+    def __init__(self, limit) -> None:
+        """Initialize with at most ``limit`` requests in flight."""
+        self.limit = limit
+        self.in_flight = 0
+        self.peak = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def __aenter__(self):
+        """Wait for a free slot."""
+        await self._semaphore.acquire()
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        """Free the slot."""
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+class CircuitBreaker:
+    """Fail fast while a controller is down.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls are refused until ``reset_timeout`` passed. Then one probe is let
+    through: success closes the circuit, failure opens it again with a
+    doubled reset timeout.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT, max_reset_timeout=BREAKER_MAX_RESET_TIMEOUT) -> None:
+        """Initialize with the circuit closed."""
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+
+    @property
+    def state(self):
+        """Closed, open or half open."""
+        return self._state
+
+    def seconds_until_probe(self, now=None):
+        """Seconds until an open circuit lets a probe through, 0 when calls are allowed."""
+        if self._state != STATE_OPEN:
+            return 0
+        now = time.monotonic() if now is None else now
+        return max(0.0, self._opened_at + self._reset_timeout - now)
+
+    def allow(self, now=None):
+        """Return 'call', 'probe' or None when the call has to be refused."""
+        if self._state == STATE_CLOSED:
+            return 'call'
+        if self._state == STATE_OPEN and self.seconds_until_probe(now) == 0:
+            self._state = STATE_HALF_OPEN
+            return 'probe'
+        return None
+
+    def record_success(self):
+        """Close the circuit and reset the timeout after a call went through."""
+        self._failures = 0
+        self._state = STATE_CLOSED
+        self._reset_timeout = self.base_reset_timeout
+
+    def record_failure(self, now=None):
+        """Count a failed call, opening the circuit at the threshold or on a failed probe."""
+        self._failures += 1
+        if self._state == STATE_HALF_OPEN:
+            self._reset_timeout = min(self._reset_timeout * 2, self.max_reset_timeout)
+            self._open(now)
+        elif self._failures >= self.failure_threshold:
+            self._open(now)
+
+    def _open(self, now):
+        self._state = STATE_OPEN
+        self._opened_at = time.monotonic() if now is None else now
@@ -1,23 +1,26 @@
-
-from ..const import (
-    LOGGER
-)
+from .log import LOGGER
 
 class Schedule:
-    def __init__(self, controller, index: int) -> None:
+    """Live view on the schedule with a given id, reads the current ScheduleState record."""
+
+    def __init__(self, controller, id) -> None:
+        """Initialize."""
         self._controller = controller
-        self._index = index
+        self._id = id
+
+    @property
+    def _record(self):
+        return self._controller.state.schedules_by_id[self._id]
 
     @property
     def name(self):
-         return self._controller.state['schedules'][self._index]['name']
+         return self._record.name
 
     @property
     def index(self):
-        return self._controller.state['schedules'][self._index]['id']
+        return self._id
 
     async def set_name(self, name):
         #TODO: add function in c# to change name of schedule
-        id = self._controller.state['schedules'][self._index]['id']
-        LOGGER.debug(f'[Schedule:set_name] setting name of "{self._index}" - {id} to {name}')
-        await self._controller.set_schedule_name(name, id)
+        LOGGER.debug('[Schedule:set_name] setting name of "%s" - %s to %s', self._record.index, self._id, name)
+        await self._controller.set_schedule_name(name, self._id)
@@ -0,0 +1,51 @@
+"""Adaptive poll interval: tight while valves run, backing off while idle."""
+import time
+
+# Poll interval right after a command, until the controller confirmed it.
+FAST_INTERVAL = 2
+COMMAND_GRACE = 30
+
+# Seconds after the expected end of a run the confirming poll waits, for the controller to close the valve.
+RUN_END_GRACE = 1
+
+
+class AdaptivePollScheduler:
+    """Poll interval of one controller, from the recent polls, its valves and its circuit breaker."""
+
+    def __init__(self, base_interval, max_interval, fast_interval=FAST_INTERVAL) -> None:
+        """Initialize."""
+        self.base_interval = base_interval
+        self.max_interval = max(max_interval, base_interval)
+        self.fast_interval = min(fast_interval, base_interval)
+        self._idle_interval = base_interval
+
+    def observe(self, changed):
+        """Record the outcome of a poll, changes reset the idle backoff."""
+        if changed:
+            self._idle_interval = self.base_interval
+        else:
+            self._idle_interval = min(self._idle_interval * 2, self.max_interval)
+
+    def interval(self, controller, now=None):
+        """Seconds until the next poll of ``controller``."""
+        now = time.monotonic() if now is None else now
+        probe = controller.transport.breaker.seconds_until_probe(now)
+        if probe:
+            # the controller is down, there is no point in polling before the next probe
+            return max(probe, self.fast_interval)
+
+        last_command = controller.last_command_time
+        if last_command is not None and now - last_command < COMMAND_GRACE:
+            return self.fast_interval
+
+        if not controller.enabled:
+            return self.max_interval
+
+        if any(valve.is_running for valve in controller.valves.values()):
+            remaining = controller.seconds_until_run_end(now)
+            if remaining is None:
+                return self.base_interval
+            # one confirming poll right after the first active valve should close
+            return min(max(remaining + RUN_END_GRACE, self.fast_interval), self.max_interval)
+
+        return self._idle_interval
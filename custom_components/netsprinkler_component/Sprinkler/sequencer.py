@@ -0,0 +1,202 @@
+"""Run valves in parallel batches that stay under the current budget of the power supply.
+
+The DrawEstimator learns what every valve draws from the ``current_draw``
+of full syncs, the Sequencer packs (valve id, seconds) jobs into batches
+under a mA limit and starts them as a cancellable task.
+"""
+import asyncio
+import contextlib
+import heapq
+
+from .errors import NETSprinklerError
+from .log import LOGGER
+
+# mA assumed for a valve that was never measured; a typical 24 VAC solenoid holds 200-300 mA.
+DEFAULT_VALVE_DRAW = 300
+
+# Share of a measurement error a learned estimate moves by.
+LEARNING_RATE = 0.3
+
+# Seconds between a valve closing and the next one taking its share of the budget,
+# so the controller closed the first before the second opens.
+SEQUENCE_GAP = 1
+
+
+class DrawEstimator:
+    """Per-valve current draw learned from (current draw, open valves) samples.
+
+    A sample with no open valve sets the idle draw of the controller. A
+    sample with open valves spreads the difference between the measured and
+    the predicted draw over them: valves that were never measured take all
+    of it, known valves move by LEARNING_RATE, so the estimates converge
+    even when valves are only ever seen open together.
+    """
+
+    def __init__(self, default=DEFAULT_VALVE_DRAW, rate=LEARNING_RATE) -> None:
+        """Initialize with nothing learned."""
+        self.default = default
+        self.rate = rate
+        self.idle = 0
+        self.samples = 0
+        self._draws = {}
+
+    def estimate(self, id):
+        """Return the current in mA valve ``id`` draws."""
+        return self._draws.get(id, self.default)
+
+    def observe(self, current_draw, open_ids):
+        """Learn from the controller drawing ``current_draw`` mA with ``open_ids`` open."""
+        if current_draw is None:
+            return
+        open_ids = list(open_ids)
+        self.samples += 1
+        if not open_ids:
+            self.idle = current_draw if self.samples == 1 else self.idle + self.rate * (current_draw - self.idle)
+            return
+
+        error = current_draw - self.idle - sum(self.estimate(id) for id in open_ids)
+        unknown = [id for id in open_ids if id not in self._draws]
+        if unknown:
+            for id in unknown:
+                self._draws[id] = max(0, self.default + error / len(unknown))
+        else:
+            for id in open_ids:
+                self._draws[id] = max(0, self._draws[id] + self.rate * error / len(open_ids))
+        LOGGER.trace('[DrawEstimator:observe] %s mA with %s open, error %s mA', current_draw, open_ids, error)
+
+    def as_dict(self):
+        """Return the idle draw, the sample count and the draw per valve."""
+        return {
+            'idle': round(self.idle),
+            'samples': self.samples,
+            'valves': {id: round(draw) for id, draw in self._draws.items()},
+        }
+
+
+def plan_batches(jobs, draws, limit, gap=SEQUENCE_GAP):
+    """Pack (valve id, seconds) jobs into batches of concurrent runs.
+
+    Returns (start offset, jobs) pairs. The longest jobs are placed first and
+    every time a run ends the freed budget goes to the longest pending jobs
+    that fit, which keeps the total cycle close to the shortest possible. A
+    job drawing more than ``limit`` on its own runs alone. Jobs of the same
+    valve are merged, a valve cannot run twice at once.
+    """
+    seconds_by_id = {}
+    for id, seconds in jobs:
+        seconds_by_id[id] = seconds_by_id.get(id, 0) + seconds
+    pending = sorted(seconds_by_id.items(), key=lambda job: (-job[1], -draws[job[0]]))
+
+    batches = []
+    running = []  # heap of (end offset, draw)
+    now = load = 0
+    while pending:
+        batch = []
+        waiting = []
+        for job in pending:
+            draw = draws[job[0]]
+            if load + draw <= limit or not (running or batch):
+                if draw > limit:
+                    LOGGER.warning('[sequencer:plan_batches] valve %s draws %s mA on its own, over the %s mA limit', job[0], draw, limit)
+                batch.append(job)
+                load += draw
+                heapq.heappush(running, (now + job[1] + gap, draw))
+            else:
+                waiting.append(job)
+        if batch:
+            batches.append((now, batch))
+        pending = waiting
+        if pending:
+            # wait for the next run to end, and every other one ending with it
+            now, draw = heapq.heappop(running)
+            load -= draw
+            while running and running[0][0] == now:
+                load -= heapq.heappop(running)[1]
+    return batches
+
+
+class Sequencer:
+    """Runs the batches of plan_batches on a controller, one sequence at a time.
+
+    ``on_batch`` is awaited after every batch was started, e.g. to refresh
+    the views of the controller. Every batch asks for a full sync, so the
+    estimator gets a current draw sample of the valves it opened.
+    """
+
+    def __init__(self, controller, limit, estimator=None, on_batch=None) -> None:
+        """Initialize for ``controller``, keeping the draw under ``limit`` mA."""
+        self._controller = controller
+        self.limit = limit
+        self.estimator = estimator or controller.draw_estimator
+        self._on_batch = on_batch
+        self._task = None
+        self._batches = []
+        self._run_ends = {}
+
+    @property
+    def running(self):
+        """True while a sequence runs."""
+        return self._task is not None and not self._task.done()
+
+    @property
+    def batches(self):
+        """Batches of the running or the last sequence."""
+        return self._batches
+
+    def plan(self, jobs, limit=None):
+        """Batches ``jobs`` would run in, under ``limit`` mA or the default limit."""
+        jobs = list(jobs)
+        draws = {id: self.estimator.estimate(id) for id, _ in jobs}
+        return plan_batches(jobs, draws, (limit or self.limit) - self.estimator.idle)
+
+    async def start(self, jobs, limit=None):
+        """Plan ``jobs`` and run them in the background, replacing a running sequence."""
+        await self.cancel()
+        self._batches = self.plan(jobs, limit)
+        LOGGER.info('[Sequencer:start] %s jobs in %s batches, %s s in total', sum(len(batch) for _, batch in self._batches), len(self._batches), self.duration)
+        self._task = asyncio.get_running_loop().create_task(self._run(self._batches))
+        return self._task
+
+    @property
+    def duration(self):
+        """Seconds from the first batch to the end of the last run."""
+        return max((offset + seconds for offset, batch in self._batches for _, seconds in batch), default=0)
+
+    async def cancel(self, stop_valves=True):
+        """Start no further batches and, with ``stop_valves``, close the valves of the sequence still running."""
+        if not self.running:
+            return
+        LOGGER.info('[Sequencer:cancel] cancelling the running sequence')
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        now = asyncio.get_running_loop().time()
+        running = [id for id, end in self._run_ends.items() if end > now]
+        self._run_ends = {}
+        if stop_valves and running:
+            await self._controller.stop_many(running)
+
+    async def _run(self, batches):
+        logPrefix = '[Sequencer:_run]'
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        self._run_ends = {}
+        try:
+            for offset, batch in batches:
+                delay = start + offset - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                LOGGER.debug('%s %s s in: starting %s', logPrefix, offset, batch)
+                # recorded first, a cancel during the request still stops these valves
+                self._run_ends.update((id, loop.time() + seconds) for id, seconds in batch)
+                await self._controller.run_many(batch)
+                self._controller.request_full_sync()
+                if self._on_batch is not None:
+                    await self._on_batch()
+            # the task lasts as long as the sequence, so cancel() can still reach it
+            delay = start + self.duration - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            LOGGER.info('%s sequence done', logPrefix)
+        except NETSprinklerError as exc:
+            LOGGER.error('%s sequence aborted: %s', logPrefix, exc)
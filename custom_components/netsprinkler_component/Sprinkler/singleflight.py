@@ -0,0 +1,35 @@
+"""Share one in-flight call between concurrent callers asking for the same thing."""
+import asyncio
+
+
+class SingleFlight:
+    """Calls in flight by key, each awaited by every caller that asked for it."""
+
+    def __init__(self) -> None:
+        """Initialize with nothing in flight."""
+        self._calls = {}
+
+    @property
+    def in_flight(self):
+        """Number of calls running."""
+        return len(self._calls)
+
+    async def do(self, key, call):
+        """Await ``call()``, or the identical call already running under ``key``.
+
+        The shared call is shielded: a caller giving up does not cancel the
+        request the other callers are waiting for.
+        """
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(call())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(future)
+
+    def _forget(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled():
+            # mark the exception as retrieved when every caller went away
+            future.exception()
@@ -0,0 +1,315 @@
+"""HTTP transport shared by every NETSprinkler call."""
+import asyncio
+import contextlib
+import time
+
+import aiohttp
+
+from . import codec
+from .errors import (
+    NETSprinklerApiError,
+    NETSprinklerCircuitOpenError,
+    NETSprinklerConnectionError,
+    NETSprinklerNotFoundError,
+    NETSprinklerTimeoutError,
+)
+from .log import LOGGER
+from .metrics import REQUEST_ERRORS, REQUEST_LATENCY, REQUESTS, Metrics
+from .resilience import CircuitBreaker, is_transient, retry
+
+ENDPOINT_SETTINGS_ALL = '/api/Settings/all'
+ENDPOINT_VALVE_STATUS = '/api/Valve/Status'
+ENDPOINT_VALVE_RUN = '/api/Valve/Run'
+ENDPOINT_VALVE_RUN_MANY = '/api/Valve/RunMany'
+ENDPOINT_VALVE_STOP = '/api/Valve/Stop'
+ENDPOINT_VALVE_ENABLE = '/api/Valve/EnableValve'
+ENDPOINT_VALVE_ENABLE_MANY = '/api/Valve/EnableValves'
+ENDPOINT_SCHEDULE_SET_NAME = '/api/Scheduler/SetName'
+ENDPOINT_EVENTS = '/api/Events'
+
+# aiohttp inflates gzip/deflate bodies transparently, the settings document
+# compresses to a fraction of its size on controllers with many schedules.
+HEADERS = {"Accept": "*/*", "Accept-Encoding": "gzip, deflate", "Content-Type": "application/json"}
+STREAM_HEADERS = {"Accept": "text/event-stream", "Cache-Control": "no-cache"}
+
+# Connection pool used when no session is handed in by Home Assistant. Per
+# host it holds the MAX_CONCURRENT_COMMANDS commands, a poll and a stop, so a
+# stop never waits for a connection.
+POOL_LIMIT = 16
+POOL_LIMIT_PER_HOST = 6
+KEEPALIVE_TIMEOUT = 30
+
+# Time budgets of a whole operation, retries included. The coordinator
+# timeout is derived from POLL_BUDGET.
+POLL_BUDGET = 10
+COMMAND_BUDGET = 10
+STOP_BUDGET = 6
+
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=8, connect=3)
+
+# Per attempt caps of every endpoint, an attempt never outlives the budget
+# that is left: the settings poll leaves room for a retry, commands may take
+# a bit longer on a busy Pi.
+ENDPOINT_TIMEOUTS = {
+    ENDPOINT_SETTINGS_ALL: aiohttp.ClientTimeout(total=6, connect=3),
+    ENDPOINT_VALVE_STATUS: aiohttp.ClientTimeout(total=4, connect=3),
+    ENDPOINT_VALVE_RUN: aiohttp.ClientTimeout(total=8, connect=3),
+    # a stop is retried rather than waited for
+    ENDPOINT_VALVE_STOP: aiohttp.ClientTimeout(total=2, connect=1),
+    ENDPOINT_VALVE_ENABLE: aiohttp.ClientTimeout(total=8, connect=3),
+    ENDPOINT_VALVE_RUN_MANY: aiohttp.ClientTimeout(total=10, connect=3),
+    ENDPOINT_VALVE_ENABLE_MANY: aiohttp.ClientTimeout(total=10, connect=3),
+    ENDPOINT_SCHEDULE_SET_NAME: aiohttp.ClientTimeout(total=8, connect=3),
+}
+
+# A probe only has to see the controller answer at all.
+PROBE_TIMEOUT = aiohttp.ClientTimeout(total=2)
+
+# The event stream stays open; the controller sends a heartbeat comment well
+# within sock_read so a silent, dead connection is noticed.
+STREAM_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=3, sock_read=90)
+
+
+def create_session(limit=POOL_LIMIT, limit_per_host=POOL_LIMIT_PER_HOST):
+    """Session with a keep-alive connection pool."""
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+def _attempt_timeout(endpoint, remaining):
+    """Timeout of one attempt: the endpoint cap, cut down to the budget that is left."""
+    timeout = ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT)
+    if remaining <= 0:
+        raise NETSprinklerTimeoutError(f"No time left in the budget for {endpoint}")
+    if remaining >= timeout.total:
+        return timeout
+    return aiohttp.ClientTimeout(total=remaining, connect=min(timeout.connect, remaining))
+
+
+def _raise_for_status(resp, endpoint):
+    if resp.status == 404:
+        raise NETSprinklerNotFoundError(f"Controller has no endpoint {endpoint}", 404)
+    if resp.status >= 400:
+        raise NETSprinklerApiError(f"Controller returned HTTP {resp.status} for {endpoint}", resp.status)
+
+
+@contextlib.contextmanager
+def _translate_errors(url):
+    """Turn aiohttp and socket errors into the client's typed errors."""
+    try:
+        yield
+    except asyncio.TimeoutError as exc:
+        raise NETSprinklerTimeoutError(f"Timeout talking to controller at {url}") from exc
+    except aiohttp.ClientResponseError as exc:
+        raise NETSprinklerApiError(f"Invalid response from controller: {exc.message}", exc.status) from exc
+    except (aiohttp.ClientError, OSError) as exc:
+        raise NETSprinklerConnectionError("Cannot connect to controller") from exc
+
+
+class Response:
+    """Raw result of a GET: status, body bytes and cache validators.
+
+    ``wire_size`` is the Content-Length as sent, which is smaller than
+    ``len(body)`` when the controller compressed the payload.
+    """
+
+    __slots__ = ('status', 'body', 'etag', 'last_modified', 'wire_size', 'decode_time')
+
+    def __init__(self, status, body, etag=None, last_modified=None, wire_size=None) -> None:
+        """Initialize."""
+        self.status = status
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.wire_size = len(body) if wire_size is None else wire_size
+        self.decode_time = None
+
+    @property
+    def not_modified(self):
+        """True for a 304 answer."""
+        return self.status == 304
+
+    @property
+    def size(self):
+        """Length of the body after decompression."""
+        return len(self.body)
+
+    def json(self):
+        """Decode the body, recording how long that took in ``decode_time``."""
+        start = time.perf_counter()
+        content = codec.loads(self.body)
+        self.decode_time = time.perf_counter() - start
+        return content
+
+
+class Transport:
+    """HTTP access to one controller over a pooled session, with retries and a circuit breaker."""
+
+    def __init__(self, url, session=None, limiter=None) -> None:
+        """Initialize, owning the session unless one is passed."""
+        self.url = url.rstrip('/')
+        self._session = session
+        # shared ConcurrencyLimit of every controller of a hub, None for no cap
+        self._limiter = limiter
+        self._owns_session = session is None
+        self._breaker = CircuitBreaker()
+        self._metrics = Metrics()
+
+    @property
+    def session(self):
+        """Session in use, None until a request opened one."""
+        return self._session
+
+    def _ensure_session(self):
+        """Return the session in use, opening a pooled one if needed."""
+        if self._session is None or self._session.closed:
+            LOGGER.debug('[Transport:_ensure_session] open pooled session for %s', self.url)
+            self._session = create_session()
+            self._owns_session = True
+        return self._session
+
+    @property
+    def breaker(self):
+        """Circuit breaker guarding the calls to the controller."""
+        return self._breaker
+
+    @property
+    def metrics(self):
+        """Metrics of this controller, shared with the client and the coordinator."""
+        return self._metrics
+
+    async def get(self, endpoint):
+        """GET ``endpoint`` and decode its JSON answer."""
+        return await self.request('GET', endpoint)
+
+    async def post(self, endpoint, data):
+        """POST ``data`` to ``endpoint`` and decode its JSON answer."""
+        return await self.request('POST', endpoint, data)
+
+    async def request(self, method, endpoint, data=None, budget=COMMAND_BUDGET):
+        """Send one request and decode its JSON answer, commands are never retried."""
+        deadline = time.monotonic() + budget
+        return await self._guarded(lambda: self._request_once(method, endpoint, data, deadline - time.monotonic()))
+
+    async def stop(self, endpoint, data, budget=STOP_BUDGET):
+        """POST an idempotent stop as fast as possible.
+
+        A stop skips the in-flight cap shared with other controllers, is tried
+        even while the circuit is open and is retried on transient errors
+        within ``budget``.
+        """
+        deadline = time.monotonic() + budget
+        return await retry(
+            lambda remaining: self._measured(lambda: self._request_once('POST', endpoint, data, remaining)),
+            deadline,
+        )
+
+    async def fetch(self, endpoint, headers=None, budget=POLL_BUDGET):
+        """GET an endpoint without decoding it, honouring conditional headers.
+
+        Transient failures are retried with jittered backoff within ``budget``.
+        """
+        deadline = time.monotonic() + budget
+        return await retry(
+            lambda remaining: self._guarded(lambda: self._fetch_once(endpoint, headers, remaining)),
+            deadline,
+        )
+
+    async def _request_once(self, method, endpoint, data, remaining):
+        logPrefix = '[Transport:request]'
+        session = self._ensure_session()
+        url = f'{self.url}{endpoint}'
+        LOGGER.trace('%s %s "%s"', logPrefix, method, url)
+
+        with _translate_errors(url):
+            async with session.request(
+                    method, url, timeout=_attempt_timeout(endpoint, remaining), headers=HEADERS, json=data
+                ) as resp:
+                    LOGGER.trace('%s call finished with HTTP %s', logPrefix, resp.status)
+                    _raise_for_status(resp, endpoint)
+                    return codec.loads(await resp.read())
+
+    async def _fetch_once(self, endpoint, headers, remaining):
+        logPrefix = '[Transport:fetch]'
+        session = self._ensure_session()
+        url = f'{self.url}{endpoint}'
+        request_headers = HEADERS if not headers else {**HEADERS, **headers}
+        LOGGER.trace('%s GET "%s"', logPrefix, url)
+
+        with _translate_errors(url):
+            async with session.get(
+                    url, timeout=_attempt_timeout(endpoint, remaining), headers=request_headers
+                ) as resp:
+                    if resp.status == 304:
+                        return Response(304, b'', resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+                    _raise_for_status(resp, endpoint)
+                    body = await resp.read()
+                    return Response(
+                        resp.status, body, resp.headers.get('ETag'), resp.headers.get('Last-Modified'),
+                        resp.content_length,
+                    )
+
+    async def _guarded(self, call):
+        """Run a call through the circuit breaker."""
+        permit = self._breaker.allow()
+        if permit is None:
+            raise NETSprinklerCircuitOpenError(
+                f"Controller at {self.url} is unavailable, next try in {self._breaker.seconds_until_probe():.0f}s"
+            )
+        if permit == 'probe':
+            await self._probe()
+
+        if self._limiter is None:
+            return await self._measured(call)
+        async with self._limiter:
+            return await self._measured(call)
+
+    async def _measured(self, call):
+        """Run a call, recording it in the metrics and the circuit breaker."""
+        self._metrics.increment(REQUESTS)
+        start = time.perf_counter()
+        try:
+            result = await call()
+        except Exception as exc:  # pylint: disable=broad-except
+            self._metrics.increment(REQUEST_ERRORS)
+            if is_transient(exc):
+                self._breaker.record_failure()
+            else:
+                # the controller answered, it is up
+                self._breaker.record_success()
+            raise
+        finally:
+            self._metrics.observe(REQUEST_LATENCY, time.perf_counter() - start)
+        self._breaker.record_success()
+        return result
+
+    async def _probe(self):
+        """Cheap HEAD to see whether the controller is back before sending real traffic."""
+        session = self._ensure_session()
+        url = f'{self.url}{ENDPOINT_SETTINGS_ALL}'
+        try:
+            async with session.head(url, timeout=PROBE_TIMEOUT, allow_redirects=False):
+                pass
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as exc:
+            self._breaker.record_failure()
+            raise NETSprinklerCircuitOpenError(f"Controller at {self.url} is still unavailable") from exc
+        LOGGER.info('[Transport:_probe] controller at %s answers again', self.url)
+
+    @contextlib.asynccontextmanager
+    async def stream(self, endpoint):
+        """Open a long-lived GET on an event stream endpoint."""
+        session = self._ensure_session()
+        url = f'{self.url}{endpoint}'
+        LOGGER.debug('[Transport:stream] open stream "%s"', url)
+        async with session.get(url, timeout=STREAM_TIMEOUT, headers=STREAM_HEADERS) as resp:
+            yield resp
+
+    async def close(self):
+        """Close the session, unless it is owned by Home Assistant."""
+        if self._session is not None and self._owns_session:
+            await self._session.close()
+            self._session = None
@@ -1,14 +1,27 @@
+import time
 
-from ..const import (
-    LOGGER
-)
+from .log import LOGGER
 
 class Valve(object):
-    def __init__(self, controller, index: int) -> None:
-        LOGGER.info(f'[Valve:init] controller {type(controller)}')
+    """Live view on the valve with a given id, reads the current ValveState record.
+
+    A manual run started from here is tracked locally: its start, duration
+    and expected end, until the controller reports the valve closed.
+    """
+
+    def __init__(self, controller, id) -> None:
+        """Initialize."""
         self._controller = controller
-        self._index = index
+        self._id = id
+        self._run_started = None
+        self._run_start_time = None
+        self._run_seconds = None
+        # unix time the valve was seen opening, for the run length once it closes
+        self._opened_time = None
 
+    @property
+    def _record(self):
+        return self._controller.state.valves_by_id[self._id]
 
     @property
     def is_master(self):
@@ -16,18 +29,15 @@ class Valve(object):
 
     @property
     def is_running(self):
-        return self._controller.state['valves'][self._index]['status']['isOpen']
-        return False
-
+        return self._record.is_open
 
     @property
     def index(self):
-        return self._index
+        return self._record.index
 
     @property
     def name(self):
-        #LOGGER.debug(f'[Valve:name] returning name {self._controller.state["valves"][self._index]["name"]}')
-        return self._controller.state['valves'][self._index]['name']
+        return self._record.name
 
     @property
     def status(self):
@@ -35,32 +45,72 @@ class Valve(object):
 
     @property
     def id(self):
-        return self._controller.state['valves'][self._index]['id']
+        return self._id
 
     @property
     def enabled(self):
-        enabled = self._controller.state['valves'][self._index]['enabled']
-        #LOGGER.debug(f'[Valve:enabled] Is current valve enabled ? {enabled}')
-        return enabled
+        return self._record.enabled
+
+    @property
+    def start_time(self):
+        """Unix time the tracked run started, None without one."""
+        return self._run_start_time
+
+    @property
+    def duration(self):
+        """Requested seconds of the tracked run."""
+        return self._run_seconds
+
+    @property
+    def end_time(self):
+        """Unix time the tracked run should end."""
+        if self._run_start_time is None:
+            return None
+        return self._run_start_time + self._run_seconds
+
+    @property
+    def expected_end(self):
+        """Monotonic time the tracked run should end."""
+        if self._run_started is None:
+            return None
+        return self._run_started + self._run_seconds
+
+    def remaining(self, now=None):
+        """Seconds left of the tracked run, None without one."""
+        if self._run_started is None:
+            return None
+        now = time.monotonic() if now is None else now
+        return max(0.0, self._run_started + self._run_seconds - now)
+
+    def _track_run(self, seconds, started):
+        """Remember a run of ``seconds`` sent at monotonic time ``started``."""
+        self._run_started = started
+        self._run_start_time = time.time() - (time.monotonic() - started)
+        self._run_seconds = seconds
+
+    def _forget_run(self):
+        self._run_started = self._run_start_time = self._run_seconds = None
 
     async def disable(self):
-        id = self._controller.state['valves'][self._index]['id']
-        LOGGER.debug(f'[Valve:disable] disabling valve {id}')
-        await self._controller.disable_valve(id)
+        LOGGER.debug('[Valve:disable] disabling valve %s', self._id)
+        await self._controller.disable_valve(self._id)
 
     async def enable(self):
-        id = self._controller.state['valves'][self._index]['id']
-        LOGGER.debug(f'[Valve:enable] enabling valve {id}')
-        await self._controller.enable_valve(id)
+        LOGGER.debug('[Valve:enable] enabling valve %s', self._id)
+        await self._controller.enable_valve(self._id)
 
     async def _manual_run(self, seconds):
         logPrefix = '[valve:_manual_run]'
         ## send request to run valve on id ...
-        id= self._controller.state['valves'][self._index]['id']
-        LOGGER.debug(f'{logPrefix} Start manual run on valvie id {id}')
-        await self._controller.start_manual(id)
+        LOGGER.debug('%s Start manual run on valvie id %s', logPrefix, self._id)
+        await self._controller.start_manual(self._id, seconds)
 
     async def run(self, seconds = None):
         if seconds is None:
             seconds = 60
-        return await self._manual_run(seconds)
\ No newline at end of file
+        return await self._manual_run(seconds)
+
+    async def stop(self):
+        """Stop the valve right away, ahead of any queued command."""
+        LOGGER.debug('[Valve:stop] stopping valve %s', self._id)
+        return await self._controller.stop(self._id)
@@ -5,29 +5,55 @@ https://github.com/ludeeus/netsprinkler_component
 """
 from __future__ import annotations
 
+import re
+
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME, Platform, CONF_URL, CONF_SCAN_INTERVAL
-from homeassistant.core import HomeAssistant, ServiceCall
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.core import HomeAssistant, ServiceCall, callback
 from homeassistant.exceptions import ConfigEntryNotReady
 from homeassistant.helpers.restore_state import RestoreEntity
 from homeassistant.helpers.entity_platform import async_get_platforms
+from homeassistant.helpers.storage import Store
 import voluptuous as vol
 from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers import entity_registry as er
 
 from homeassistant.util.dt import utc_from_timestamp
 from homeassistant.util import slugify
 
+from custom_components.netsprinkler_component.Sprinkler.changes import schedule_context, valve_context
+from custom_components.netsprinkler_component.Sprinkler.log import set_trace
 from custom_components.netsprinkler_component.Sprinkler.netsprinkler import NETSprinkler
 
 from .const import (
     DOMAIN,
     DEFAULT_SCAN_INTERVAL,
+    CONF_MAX_SCAN_INTERVAL,
+    DEFAULT_MAX_SCAN_INTERVAL,
     LOGGER,
     SERVICE_RUN,
-    SCHEMA_SERVICE_RUN
+    SERVICE_STOP,
+    SERVICE_ENABLE_VALVES,
+    SERVICE_DISABLE_VALVES,
+    SERVICE_SET_TRACE,
+    SERVICE_PROFILE,
+    SCHEMA_SERVICE_RUN,
+    SCHEMA_SERVICE_VALVES,
+    SCHEMA_SERVICE_SET_TRACE,
+    SCHEMA_SERVICE_PROFILE,
+    CONF_TRACE,
+    CONF_CYCLES,
+    CONF_INDEX,
+    CONF_RUN_SECONDS,
+    CONF_CURRENT_LIMIT,
+    DEFAULT_CURRENT_LIMIT,
+    SERVICE_RUN_SEQUENCE,
+    SERVICE_CANCEL_SEQUENCE,
+    SCHEMA_SERVICE_RUN_SEQUENCE,
+    STORAGE_VERSION,
 )
 from .coordinator import NETSprinklerDataUpdateCoordinator
+from .hub import async_get_hub
 
 PLATFORMS: list[Platform] = [
     Platform.BINARY_SENSOR,
@@ -47,41 +73,72 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     hass.data.setdefault(DOMAIN, {})
 
     url = entry.data.get(CONF_URL)
-    opts = {"session": async_get_clientsession(hass)}
+    hub = async_get_hub(hass)
+    opts = {"session": hub.session, "limiter": hub.limiter}
     controller = NETSprinkler(url, opts)
     scan_interval = entry.options.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
+    max_scan_interval = entry.options.get(CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL)
+
 
+    store = _snapshot_store(hass, entry)
+    snapshot = await store.async_load()
 
-    hass.data[DOMAIN][entry.entry_id] = coordinator = NETSprinklerDataUpdateCoordinator(
+    coordinator = NETSprinklerDataUpdateCoordinator(
         hass=hass,
         controller=controller,
-        scan_interval=scan_interval
+        scan_interval=scan_interval,
+        max_scan_interval=max_scan_interval,
+        store=store,
+        hub=hub,
+        current_limit=entry.options.get(CONF_CURRENT_LIMIT, DEFAULT_CURRENT_LIMIT)
     )
-    # https://developers.home-assistant.io/docs/integration_fetching_data#coordinated-single-api-poll-for-data-for-all-entities
-    LOGGER.debug(f'{logPrefix} Start refreshing data from coordinator side')
-    await coordinator.async_refresh()
-    LOGGER.debug(f'{logPrefix} Finished refreshing data from coordinator side')
-    if not coordinator.last_update_success:
-        raise ConfigEntryNotReady
-    LOGGER.debug(f'{logPrefix} Finished and last update was a success')
+    # the services go over every entry in hass.data, so it only ever holds the full dict
     hass.data[DOMAIN][entry.entry_id] = {
             "coordinator": coordinator,
             "controller": controller,
         }
-
-    LOGGER.debug(f'{logPrefix} Going through PLATFORMS to process components')
-    for components in PLATFORMS:
-        #LOGGER.debug(f'{logPrefix} Start processing component {components}')
-        hass.async_create_task(
-            hass.config_entries.async_forward_entry_setup(entry, components)
+    hub.async_register(entry.entry_id, coordinator)
+    if snapshot:
+        # build the entities from the last known state, the first poll
+        # confirms and reconciles it in the background
+        LOGGER.debug('%s Starting from the stored snapshot', logPrefix)
+        controller.restore(snapshot)
+        coordinator.data = controller.state
+    else:
+        # https://developers.home-assistant.io/docs/integration_fetching_data#coordinated-single-api-poll-for-data-for-all-entities
+        LOGGER.debug('%s Start refreshing data from coordinator side', logPrefix)
+        await coordinator.async_refresh()
+        LOGGER.debug('%s Finished refreshing data from coordinator side', logPrefix)
+        if not coordinator.last_update_success:
+            hass.data[DOMAIN].pop(entry.entry_id)
+            await coordinator.async_shutdown()
+            await controller.session_close()
+            await hub.async_unregister(entry.entry_id)
+            raise ConfigEntryNotReady
+        LOGGER.debug('%s Finished and last update was a success', logPrefix)
+    await _async_migrate_valve_unique_ids(hass, entry, controller)
+
+    LOGGER.debug('%s Going through PLATFORMS to process components', logPrefix)
+    if snapshot:
+        async def _async_setup_platforms_and_refresh():
+            await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+            await coordinator.async_refresh()
+
+        entry.async_create_background_task(
+            hass, _async_setup_platforms_and_refresh(), f"{DOMAIN} first refresh"
         )
-    LOGGER.debug(f'{logPrefix} Finished processing PLATFORMS. Start return true')
+    else:
+        for components in PLATFORMS:
+            #LOGGER.debug('%s Start processing component %s', logPrefix, components)
+            hass.async_create_task(
+                hass.config_entries.async_forward_entry_setup(entry, components)
+            )
+    LOGGER.debug('%s Finished processing PLATFORMS. Start return true', logPrefix)
+    coordinator.async_start_push()
 
     #setup services
     async def _async_send_run_command(call: ServiceCall):
-        await hass.helpers.service.entity_service_call(
-            async_get_platforms(hass, DOMAIN), SERVICE_RUN, call
-        )
+        await _async_send_entity_command(hass, call)
 
     hass.services.async_register(
         domain=DOMAIN,
@@ -89,16 +146,128 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         schema=cv.make_entity_service_schema(SCHEMA_SERVICE_RUN),
         service_func=_async_send_run_command,
     )
+
+    async def _async_send_valves_command(call: ServiceCall):
+        await _async_send_entity_command(hass, call)
+
+    hass.services.async_register(
+        domain=DOMAIN,
+        service=SERVICE_STOP,
+        schema=cv.make_entity_service_schema({}),
+        service_func=_async_send_valves_command,
+    )
+
+    for service in (SERVICE_ENABLE_VALVES, SERVICE_DISABLE_VALVES):
+        hass.services.async_register(
+            domain=DOMAIN,
+            service=service,
+            schema=cv.make_entity_service_schema(SCHEMA_SERVICE_VALVES),
+            service_func=_async_send_valves_command,
+        )
+
+    hass.services.async_register(
+        domain=DOMAIN,
+        service=SERVICE_RUN_SEQUENCE,
+        schema=cv.make_entity_service_schema(SCHEMA_SERVICE_RUN_SEQUENCE),
+        service_func=_async_send_valves_command,
+    )
+    hass.services.async_register(
+        domain=DOMAIN,
+        service=SERVICE_CANCEL_SEQUENCE,
+        schema=cv.make_entity_service_schema({}),
+        service_func=_async_send_valves_command,
+    )
+
+    async def _async_set_trace(call: ServiceCall):
+        # logs every request and state read at DEBUG, off again after a restart
+        set_trace(call.data[CONF_TRACE])
+        LOGGER.info('[__init__:_async_set_trace] trace logging : %s', call.data[CONF_TRACE])
+
+    hass.services.async_register(
+        domain=DOMAIN,
+        service=SERVICE_SET_TRACE,
+        schema=vol.Schema(SCHEMA_SERVICE_SET_TRACE),
+        service_func=_async_set_trace,
+    )
+
+    async def _async_profile(call: ServiceCall):
+        for data in hass.data[DOMAIN].values():
+            data["coordinator"].async_profile(call.data[CONF_CYCLES])
+            await data["coordinator"].async_request_refresh()
+
+    hass.services.async_register(
+        domain=DOMAIN,
+        service=SERVICE_PROFILE,
+        schema=vol.Schema(SCHEMA_SERVICE_PROFILE),
+        service_func=_async_profile,
+    )
     return True
 
 
+async def _async_send_entity_command(hass: HomeAssistant, call: ServiceCall) -> None:
+    """Send the command of a service call once per controller, valve or schedule it targets.
+
+    A device or area target matches every entity of a controller, several of
+    which render the same valve or the controller as a whole. Entities that
+    do not take the command are skipped.
+    """
+    data = {key: value for key, value in call.data.items() if key not in cv.ENTITY_SERVICE_FIELDS}
+    sent = set()
+
+    async def _async_call_once(entity, call: ServiceCall) -> None:
+        method = getattr(entity, call.service, None)
+        if method is None:
+            return
+        target = (entity._coordinator, entity._command_target)
+        if target in sent:
+            return
+        sent.add(target)
+        await method(**data)
+
+    await hass.helpers.service.entity_service_call(
+        async_get_platforms(hass, DOMAIN), _async_call_once, call
+    )
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Handle removal of an entry."""
     if unloaded := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
-        hass.data[DOMAIN].pop(entry.entry_id)
+        data = hass.data[DOMAIN].pop(entry.entry_id)
+        await data["coordinator"].async_shutdown()
+        await data["controller"].session_close()
+        await async_get_hub(hass).async_unregister(entry.entry_id)
     return unloaded
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Drop the stored snapshot of a removed entry."""
+    await _snapshot_store(hass, entry).async_remove()
+
+
+def _snapshot_store(hass: HomeAssistant, entry: ConfigEntry) -> Store:
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}")
+
+
+# unique id suffix of the valve entities from when they were keyed by position
+_INDEX_UNIQUE_ID = re.compile(r"_(valve_running|station_status|station_remaining_time|valve_enabled)_(\d+)$")
+
+
+async def _async_migrate_valve_unique_ids(hass: HomeAssistant, entry: ConfigEntry, controller: NETSprinkler) -> None:
+    """Rename the registry entries of valve entities keyed by position to the valve id."""
+    valves = controller.state.valves
+
+    @callback
+    def _migrate(entity_entry: er.RegistryEntry) -> dict | None:
+        match = _INDEX_UNIQUE_ID.search(entity_entry.unique_id)
+        if match is None or int(match.group(2)) >= len(valves):
+            return None
+        new_unique_id = f"{entity_entry.unique_id[:match.start()]}_{match.group(1)}_valve_{valves[int(match.group(2))].id}"
+        LOGGER.debug('[__init__:_async_migrate_valve_unique_ids] %s -> %s', entity_entry.unique_id, new_unique_id)
+        return {"new_unique_id": new_unique_id}
+
+    await er.async_migrate_entries(hass, entry.entry_id, _migrate)
+
+
 async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Reload config entry."""
     await async_unload_entry(hass, entry)
@@ -149,10 +318,33 @@ class NETSprinklerEntity(RestoreEntity):
         """Return if entity is available."""
         return self._coordinator.last_update_success
 
+    @property
+    def assumed_state(self):
+        """State comes from the stored snapshot until the controller answered."""
+        return self._coordinator.controller.stale
+
+    @property
+    def _listener_context(self):
+        """Slice of the controller state this entity renders, None for controller wide data."""
+        return None
+
+    @property
+    def _command_target(self):
+        """What the commands of this entity act on, entities sharing it send a service call once."""
+        return self._listener_context
+
     async def async_added_to_hass(self):
+        context = self._listener_context
         self.async_on_remove(
-            self._coordinator.async_add_listener(self.async_write_ha_state)
+            self._coordinator.async_add_listener(self._handle_coordinator_update, context)
         )
+        if context is not None:
+            self.async_on_remove(self._coordinator.async_track_entity(self, context))
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Render the data the coordinator brought in."""
+        self.async_write_ha_state()
 
     async def async_update(self):
         """Update latest state."""
@@ -172,15 +364,56 @@ class NETSprinklerSensor(NETSprinklerEntity):
         return self._get_state()
 
 class NETSprinklerControllerEntity:
+    @property
+    def _command_target(self):
+        return None
+
     async def run(self, run_seconds = None, continue_running_stations = None):
-        await self._controlller.refresh()
-        await self._coordinator.async_request_refresh()
-        return
+        """Run several stations in one go, then refresh once."""
+        if isinstance(run_seconds, list):
+            await self._controller.run_many(self._jobs(run_seconds))
+        elif run_seconds is not None:
+            raise Exception("Run seconds should be a list of station durations for the controller")
+        await self._coordinator.async_command_done()
+
+    async def run_sequence(self, run_seconds, current_limit = None):
+        """Run the stations in parallel batches that stay under the current limit."""
+        await self._coordinator.sequencer.start(self._jobs(run_seconds), current_limit)
+
+    async def cancel_sequence(self):
+        """Start no further batches of the running sequence."""
+        await self._coordinator.sequencer.cancel()
+
+    def _jobs(self, run_seconds):
+        """(valve id, seconds) jobs of a list of durations by index or of index/run_seconds items."""
+        jobs = []
+        for index, item in enumerate(run_seconds):
+            if isinstance(item, dict):
+                index, item = item[CONF_INDEX], item[CONF_RUN_SECONDS]
+            if item:
+                jobs.append((self._controller.valve_by_index(index).id, item))
+        return jobs
+
+    async def enable_valves(self, index = None):
+        """Enable the stations at the given indexes, all of them when omitted."""
+        await self._controller.enable_many(self._valve_ids(index))
+        await self._coordinator.async_command_done()
+
+    async def disable_valves(self, index = None):
+        """Disable the stations at the given indexes, all of them when omitted."""
+        await self._controller.disable_many(self._valve_ids(index))
+        await self._coordinator.async_command_done()
+
+    def _valve_ids(self, indexes):
+        if indexes is None:
+            return list(self._controller.valves)
+        return [self._controller.valve_by_index(index).id for index in indexes]
 
     async def stop(self):
-        """Stops all stations."""
-    #    await self._controller.stop_all_stations()
-        await self._coordinator.async_request_refresh()
+        """Stop all stations, and the sequence that would start more."""
+        await self._coordinator.sequencer.cancel(stop_valves=False)
+        await self._controller.stop_all()
+        await self._coordinator.async_command_done()
 
     async def reboot(self):
         """Reboot controller."""
@@ -188,6 +421,10 @@ class NETSprinklerControllerEntity:
         await self._coordinator.async_request_refresh()
 
 class NETSprinklerStationEntity:
+    @property
+    def _listener_context(self):
+        return valve_context(self._valve.id)
+
     @property
     def extra_state_attributes(self):
         attributes = {"netsprinkler_type": "station"}
@@ -217,14 +454,18 @@ class NETSprinklerStationEntity:
             raise Exception("Run seconds should be an integer value for station")
 
         await self._valve.run(run_seconds)
-        await self._coordinator.async_request_refresh()
+        await self._coordinator.async_command_done()
 
     async def stop(self):
         """Stop station."""
         await self._valve.stop()
-        await self._coordinator.async_request_refresh()
+        await self._coordinator.async_command_done()
 
 class NETSprinklerProgramEntity:
+    @property
+    def _listener_context(self):
+        return schedule_context(self._schedule.index)
+
     @property
     def extra_state_attributes(self):
         attributes = {"netsprinkler_type": "program"}
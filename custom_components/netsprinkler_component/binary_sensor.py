@@ -16,14 +16,20 @@ from .const import (DOMAIN, LOGGER)
 from homeassistant.core import HomeAssistant
 from homeassistant.const import CONF_NAME
 from typing import Callable
+from functools import partial
 
 async def async_setup_entry(hass : HomeAssistant, entry: dict, async_add_devices: Callable):
     logPrefix = '[binary_sensor:async_setup_entry]'
     """Set up the binary_sensor platform."""
-    LOGGER.debug(f'{logPrefix} Start setup of binary sensors')
+    LOGGER.debug('%s Start setup of binary sensors', logPrefix)
     entities = _create_entities(hass, entry)
     async_add_devices(entities)
-    LOGGER.debug(f'{logPrefix} Finished async_setup_entry... return ')
+    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    coordinator.async_add_entity_factory(
+        async_add_devices,
+        valve_factory=partial(_create_valve_entities, entry, entry.data[CONF_NAME], coordinator),
+    )
+    LOGGER.debug('%s Finished async_setup_entry... return ', logPrefix)
 
 
 def _create_entities(hass: HomeAssistant, entry: dict):
@@ -34,10 +40,13 @@ def _create_entities(hass: HomeAssistant, entry: dict):
     name = entry.data[CONF_NAME]
 
     for _, valve in controller.valves.items():
-        entities.append(StationIsRunningBinarySensor(entry, name,  valve, coordinator))
+        entities.extend(_create_valve_entities(entry, name, coordinator, valve))
 
     return entities
 
+def _create_valve_entities(entry: dict, name: str, coordinator, valve):
+    return [StationIsRunningBinarySensor(entry, name, valve, coordinator)]
+
 class StationIsRunningBinarySensor(NETSprinklerStationEntity, NETSprinklerBinarySensor, BinarySensorEntity):
     def __init__(self, entry, name, valve, coordinator):
         self._valve = valve
@@ -53,7 +62,7 @@ class StationIsRunningBinarySensor(NETSprinklerStationEntity, NETSprinklerBinary
     def unique_id(self) -> str:
         """Return a unique, Home Assistant friendly identifier for this entity."""
         return slugify(
-            f"{self._entry.unique_id}_{self._entity_type}_valve_running_{self._valve.index}"
+            f"{self._entry.unique_id}_{self._entity_type}_valve_running_valve_{self._valve.id}"
         )
 
     @property
@@ -14,6 +14,7 @@ from .api import (
     IntegrationBlueprintApiClientError,
 )
 from .const import DOMAIN, LOGGER, DEFAULT_NAME
+from .Sprinkler.errors import NETSprinklerConnectionError, NETSprinklerError
 from .Sprinkler.netsprinkler     import NETSprinkler
 
 DEVICE_SCHEMA = vol.Schema(
@@ -28,7 +29,7 @@ class BlueprintFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
     """Config flow for Blueprint."""
 
     VERSION = 1
-    CONNECTION_CLASS = config_entries.CONN_CLASS_LOCAL_POLL
+    CONNECTION_CLASS = config_entries.CONN_CLASS_LOCAL_PUSH
 
     async def async_step_user(
         self,
@@ -41,12 +42,20 @@ class BlueprintFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
             try:
                 url = user_input[CONF_URL]
                 name = user_input[CONF_NAME]
+                # a second entry would poll the same controller in parallel
+                self._async_abort_entries_match({CONF_URL: url})
 
                 opts = {"session" : async_get_clientsession(self.hass)}
 
                 controller = NETSprinkler(url, opts)
                 await controller.refresh()
 
+            except NETSprinklerConnectionError as exception:
+                LOGGER.error(exception)
+                _errors["base"] = "connection"
+            except NETSprinklerError as exception:
+                LOGGER.exception(exception)
+                _errors["base"] = "unknown"
             except IntegrationBlueprintApiClientAuthenticationError as exception:
                 LOGGER.warning(exception)
                 _errors["base"] = "auth"
@@ -1,9 +1,12 @@
 """Constants for netsprinkler_component."""
-from logging import Logger, getLogger
+from datetime import timedelta
+from logging import getLogger
 import voluptuous as vol
 from homeassistant.helpers import config_validation as cv
 
-LOGGER: Logger = getLogger(__package__)
+from .Sprinkler.log import SprinklerLogger
+
+LOGGER: SprinklerLogger = SprinklerLogger(getLogger(__package__))
 
 NAME = "Integration blueprint"
 DOMAIN = "netsprinkler_component"
@@ -12,6 +15,33 @@ ATTRIBUTION = "Data provided by http://jsonplaceholder.typicode.com/"
 
 DEFAULT_NAME = "NETSprinkler"
 DEFAULT_SCAN_INTERVAL = 5
+CONF_MAX_SCAN_INTERVAL = "max_scan_interval"
+# ceiling of the idle backoff, in seconds
+DEFAULT_MAX_SCAN_INTERVAL = 300
+# mA the power supply can deliver to the valves of a sequence
+CONF_CURRENT_LIMIT = "current_limit"
+DEFAULT_CURRENT_LIMIT = 1000
+# safety net poll while the controller pushes its changes
+PUSH_SCAN_INTERVAL = 300
+STORAGE_VERSION = 1
+# hass.data key of the hub shared by every controller
+DATA_HUB = f"{DOMAIN}_hub"
+# requests in flight across all controllers, and the shared connection pool
+HUB_MAX_IN_FLIGHT = 4
+HUB_POOL_LIMIT = 16
+HUB_POOL_LIMIT_PER_HOST = 6
+# the last known state is written at most this often, in seconds
+SNAPSHOT_SAVE_DELAY = 30
+# refreshes requested within this many seconds after a command share one poll
+CONFIRM_REFRESH_DELAY = 3
+# the remaining time sensors count down locally at this pace, without polling
+REMAINING_TIME_INTERVAL = timedelta(seconds=1)
+
+# fired on the bus when a valve opens, closes, gets enabled or disabled
+EVENT_VALVE_OPENED = f"{DOMAIN}_valve_opened"
+EVENT_VALVE_CLOSED = f"{DOMAIN}_valve_closed"
+EVENT_VALVE_ENABLED = f"{DOMAIN}_valve_enabled"
+EVENT_VALVE_DISABLED = f"{DOMAIN}_valve_disabled"
 
 CONF_RUN_SECONDS = "run_seconds"
 CONF_INDEX = "index"
@@ -30,4 +60,33 @@ SCHEMA_SERVICE_RUN = {
     ),
     vol.Optional(CONF_CONTINUE_RUNNING_STATIONS): cv.boolean,
 }
-SERVICE_RUN = "run"
\ No newline at end of file
+SERVICE_RUN = "run"
+SERVICE_STOP = "stop"
+SERVICE_ENABLE_VALVES = "enable_valves"
+SERVICE_DISABLE_VALVES = "disable_valves"
+SERVICE_SET_TRACE = "set_trace"
+CONF_TRACE = "trace"
+SERVICE_PROFILE = "profile"
+CONF_CYCLES = "cycles"
+
+SCHEMA_SERVICE_VALVES = {
+    vol.Optional(CONF_INDEX): vol.All(cv.ensure_list, [cv.positive_int]),
+}
+
+SCHEMA_SERVICE_SET_TRACE = {
+    vol.Required(CONF_TRACE): cv.boolean,
+}
+
+SERVICE_RUN_SEQUENCE = "run_sequence"
+SERVICE_CANCEL_SEQUENCE = "cancel_sequence"
+SCHEMA_SERVICE_RUN_SEQUENCE = {
+    vol.Required(CONF_RUN_SECONDS): vol.Or(
+        cv.ensure_list(cv.positive_int),
+        cv.ensure_list(SCHEMA_SERVICE_RUN_SECONDS),
+    ),
+    vol.Optional(CONF_CURRENT_LIMIT): cv.positive_int,
+}
+
+SCHEMA_SERVICE_PROFILE = {
+    vol.Optional(CONF_CYCLES, default=1): vol.All(vol.Coerce(int), vol.Range(min=1, max=100)),
+}
@@ -2,26 +2,79 @@
 from __future__ import annotations
 
 from datetime import timedelta
+import time
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.update_coordinator import (
     DataUpdateCoordinator,
     UpdateFailed,
 )
 from homeassistant.exceptions import ConfigEntryAuthFailed
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.storage import Store
+from homeassistant.util.dt import utc_from_timestamp
 
+from custom_components.netsprinkler_component.Sprinkler.changes import (
+    VALVE_CLOSED,
+    VALVE_DISABLED,
+    VALVE_ENABLED,
+    VALVE_OPENED,
+    schedule_context,
+    valve_context,
+)
+from custom_components.netsprinkler_component.Sprinkler.errors import NETSprinklerError
+from custom_components.netsprinkler_component.Sprinkler.metrics import (
+    LISTENER_FANOUT,
+    REFRESHES,
+    REFRESHES_UNCHANGED,
+    UPDATE_CYCLE,
+)
 from custom_components.netsprinkler_component.Sprinkler.netsprinkler import NETSprinkler
+from custom_components.netsprinkler_component.Sprinkler.profiler import CycleProfiler
+from custom_components.netsprinkler_component.Sprinkler.push import PushClient
+from custom_components.netsprinkler_component.Sprinkler.scheduler import AdaptivePollScheduler
+from custom_components.netsprinkler_component.Sprinkler.sequencer import Sequencer
+from custom_components.netsprinkler_component.Sprinkler.transport import POLL_BUDGET
 
 from .api import (
     IntegrationBlueprintApiClient,
     IntegrationBlueprintApiClientAuthenticationError,
     IntegrationBlueprintApiClientError,
 )
-from .const import DOMAIN, LOGGER
+from .hub import NETSprinklerHub
+from .const import (
+    CONFIRM_REFRESH_DELAY,
+    DEFAULT_CURRENT_LIMIT,
+    DOMAIN,
+    EVENT_VALVE_CLOSED,
+    EVENT_VALVE_DISABLED,
+    EVENT_VALVE_ENABLED,
+    EVENT_VALVE_OPENED,
+    LOGGER,
+    PUSH_SCAN_INTERVAL,
+    SNAPSHOT_SAVE_DELAY,
+)
 import async_timeout
 
-TIMEOUT = 10
+# the transport keeps a refresh, retries included, within POLL_BUDGET;
+# this only guards against a hang outside of it
+TIMEOUT = POLL_BUDGET + 2
+
+# listener context of the diagnostic metric sensors, woken after every cycle
+METRICS_CONTEXT = 'metrics'
+
+VALVE_EVENTS = {
+    VALVE_OPENED: EVENT_VALVE_OPENED,
+    VALVE_CLOSED: EVENT_VALVE_CLOSED,
+    VALVE_ENABLED: EVENT_VALVE_ENABLED,
+    VALVE_DISABLED: EVENT_VALVE_DISABLED,
+}
+
+
+def _isoformat(timestamp):
+    return None if timestamp is None else utc_from_timestamp(timestamp).isoformat()
 
 # https://developers.home-assistant.io/docs/integration_fetching_data#coordinated-single-api-poll-for-data-for-all-entities
 class NETSprinklerDataUpdateCoordinator(DataUpdateCoordinator):
@@ -33,28 +86,281 @@ class NETSprinklerDataUpdateCoordinator(DataUpdateCoordinator):
         self,
         hass: HomeAssistant,
         controller: NETSprinkler,
-        scan_interval: int
+        scan_interval: int,
+        max_scan_interval: int,
+        store: Store | None = None,
+        hub: NETSprinklerHub | None = None,
+        current_limit: int = DEFAULT_CURRENT_LIMIT
     ) -> None:
         """Initialize."""
         self.controller = controller
+        self._store = store
+        # valves and schedules of the last snapshot handed to the store
+        self._saved_layout = None
+        self._hub = hub
+        self._notified_success = True
+        self._notified_stale = controller.stale
+        self._entity_factories = []
+        self._entities_by_context = {}
+        self._scheduler = AdaptivePollScheduler(scan_interval, max_scan_interval)
+        self._push = PushClient(controller, self._async_handle_push, self._async_handle_push_connection)
+        self._profiler = None
+        # set by the refreshes asked for outside of the poll schedule
+        self._unscheduled = False
+        self.sequencer = Sequencer(controller, current_limit, on_batch=self.async_command_done)
         super().__init__(
             hass=hass,
             logger=LOGGER,
             name='NETSprinkler Resource status',
-            update_interval=timedelta(scan_interval),
-            update_method=self.async_update_data
+            update_interval=timedelta(seconds=scan_interval),
+            update_method=self.async_update_data,
+            # writes patch the state optimistically, so the confirming poll can wait
+            # a bit and serve a whole burst of commands
+            request_refresh_debouncer=Debouncer(
+                hass, LOGGER, cooldown=CONFIRM_REFRESH_DELAY, immediate=False
+            ),
+            # an unchanged poll hands back the same state object, so the
+            # listeners are only woken when the controller reported a change
+            always_update=False
+        )
+
+    @property
+    def push_connected(self) -> bool:
+        """Return True while the controller event stream is up."""
+        return self._push.connected
+
+    @callback
+    def async_start_push(self) -> None:
+        """Start listening to the controller event stream."""
+        self._push.start()
+
+    async def async_shutdown(self) -> None:
+        """Stop the event stream and a running sequence together with the polling."""
+        # the controller ends the runs already started on its own
+        await self.sequencer.cancel(stop_valves=False)
+        await self._push.stop()
+        await super().async_shutdown()
+
+    async def async_command_done(self) -> None:
+        """Show the optimistic state of a command right away and confirm it with one poll."""
+        self.async_set_updated_data(self.controller.state)
+        await self.async_request_refresh()
+
+    async def async_config_entry_first_refresh(self) -> None:
+        """Fetch the first state right away, without waiting for the hub phase."""
+        self._unscheduled = True
+        await super().async_config_entry_first_refresh()
+
+    async def async_refresh(self) -> None:
+        """Refresh right away, without waiting for the hub phase."""
+        self._unscheduled = True
+        await super().async_refresh()
+
+    @callback
+    def async_add_entity_factory(self, async_add_entities, valve_factory=None, schedule_factory=None) -> None:
+        """Let a platform create entities for valves and schedules that show up after setup."""
+        self._entity_factories.append((async_add_entities, valve_factory, schedule_factory))
+
+    @callback
+    def async_track_entity(self, entity, context):
+        """Remember that an entity renders a valve or schedule, returns the callback to forget it."""
+        entities = self._entities_by_context.setdefault(context, [])
+        entities.append(entity)
+
+        @callback
+        def untrack() -> None:
+            entities.remove(entity)
+            if not entities:
+                self._entities_by_context.pop(context, None)
+
+        return untrack
+
+    async def _async_reconcile(self) -> None:
+        """Add and remove entities for the valves and schedules that came or went."""
+        structure = self.controller.pop_structure_changes()
+        if not structure:
+            return
+        LOGGER.info('[coordinator:_async_reconcile] controller layout changed : %s', structure)
+
+        # entities are keyed by id and read their record live, a renumbered
+        # valve or schedule keeps its entities and only shows the new position
+        stale = [valve_context(id) for id in structure.valves_removed]
+        stale += [schedule_context(id) for id in structure.schedules_removed]
+        registry = er.async_get(self.hass)
+        for context in stale:
+            for entity in list(self._entities_by_context.get(context, ())):
+                entity_id = entity.entity_id
+                await entity.async_remove(force_remove=True)
+                if registry.async_get(entity_id):
+                    registry.async_remove(entity_id)
+
+        valves = [self.controller.valves[id] for id in structure.valves_added]
+        schedules = [self.controller.schedules[id] for id in structure.schedules_added]
+        for async_add_entities, valve_factory, schedule_factory in self._entity_factories:
+            entities = []
+            if valve_factory is not None:
+                for valve in valves:
+                    entities.extend(valve_factory(valve))
+            if schedule_factory is not None:
+                for schedule in schedules:
+                    entities.extend(schedule_factory(schedule))
+            if entities:
+                async_add_entities(entities)
+
+    @callback
+    def _async_handle_push(self) -> None:
+        if self.controller.has_structure_changes:
+            self.hass.async_create_task(self._async_apply_push())
+        else:
+            self.async_set_updated_data(self.controller.state)
+
+    async def _async_apply_push(self) -> None:
+        await self._async_reconcile()
+        self.async_set_updated_data(self.controller.state)
+
+    @callback
+    def _async_handle_push_connection(self, connected: bool) -> None:
+        """Poll rarely while pushed events arrive, fall back to normal polling without them."""
+        LOGGER.debug('[coordinator:_async_handle_push_connection] event stream connected : %s', connected)
+        if not connected:
+            # catch up on whatever happened while the stream was down
+            self.hass.async_create_task(self.async_request_refresh())
+        if self._listeners:
+            self._schedule_refresh()
+
+    @callback
+    def _schedule_refresh(self) -> None:
+        """Pick the next poll interval before scheduling it."""
+        if self._push.connected:
+            self.update_interval = timedelta(seconds=PUSH_SCAN_INTERVAL)
+        else:
+            self.update_interval = timedelta(seconds=self._scheduler.interval(self.controller))
+        super()._schedule_refresh()
+
+    @callback
+    def async_profile(self, cycles: int) -> None:
+        """Profile the next update cycles, the results are written to the config directory."""
+        if self._profiler is not None:
+            LOGGER.warning('[coordinator:async_profile] a profile is already running')
+            return
+        LOGGER.info('[coordinator:async_profile] profiling the next %s update cycles', cycles)
+        self._profiler = CycleProfiler(cycles)
+
+    async def _async_write_profile(self, profiler: CycleProfiler) -> None:
+        paths = await self.hass.async_add_executor_job(
+            profiler.dump, self.hass.config.path(), f'{DOMAIN}_profile_{self.config_entry.entry_id}'
         )
+        LOGGER.info('[coordinator:_async_write_profile] profile written to %s', ', '.join(paths))
+
+    async def _async_refresh(self, *args, **kwargs) -> None:
+        """Time the whole update cycle and refresh the metric sensors after it."""
+        # the profile covers the refresh, the diff and every state write it triggers,
+        # along with whatever else the event loop runs while the cycle awaits
+        profiler = self._profiler
+        if profiler is not None:
+            profiler.resume()
+        start = time.perf_counter()
+        try:
+            await super()._async_refresh(*args, **kwargs)
+            self.controller.metrics.observe(UPDATE_CYCLE, time.perf_counter() - start)
+            for update_callback, context in list(self._listeners.values()):
+                if context == METRICS_CONTEXT:
+                    update_callback()
+        finally:
+            if profiler is not None:
+                profiler.pause()
+                if profiler.done:
+                    self._profiler = None
+                    self.hass.async_create_task(self._async_write_profile(profiler))
+
+    @callback
+    def _async_fire_transitions(self) -> None:
+        """Fire one bus event per valve transition the controller saw since the last cycle."""
+        for transition in self.controller.pop_transitions():
+            valve = self.controller.valves.get(transition.valve_id)
+            self.hass.bus.async_fire(VALVE_EVENTS[transition.kind], {
+                "entry_id": self.config_entry.entry_id if self.config_entry else None,
+                "valve_id": transition.valve_id,
+                "name": valve.name if valve is not None else None,
+                "index": valve.index if valve is not None else None,
+                "time": _isoformat(transition.time),
+                "device_time": _isoformat(transition.device_time),
+                "start_time": _isoformat(transition.start_time),
+                "duration": transition.duration,
+                "run_seconds": transition.run_seconds,
+            })
+
+    @callback
+    def _async_save_snapshot(self) -> None:
+        """Store the state once its valves or schedules differ from the last stored snapshot.
+
+        Polls, commands and pushed events all end up here, so an optimistic
+        rename or enable survives a restart even before a poll confirmed it.
+        """
+        state = self.controller.state
+        if self._store is None or state is None:
+            return
+        layout = (state.valves, state.schedules)
+        if layout == self._saved_layout:
+            return
+        self._saved_layout = layout
+        self._store.async_delay_save(self.controller.snapshot, SNAPSHOT_SAVE_DELAY)
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Only wake the listeners whose valve, schedule or controller data changed."""
+        self._async_fire_transitions()
+        self._async_save_snapshot()
+        changes = self.controller.changes
+        if (
+            changes is None
+            or self.last_update_success != self._notified_success
+            or self.controller.stale != self._notified_stale
+        ):
+            # first state, availability or staleness flipped, every entity is affected
+            self._notified_success = self.last_update_success
+            self._notified_stale = self.controller.stale
+            woken = 0
+            for update_callback, context in list(self._listeners.values()):
+                if context != METRICS_CONTEXT:
+                    update_callback()
+                    woken += 1
+            self.controller.metrics.observe(LISTENER_FANOUT, woken)
+            return
+
+        # the metric sensors are woken by _async_refresh, once per cycle
+        contexts = changes.contexts
+        woken = 0
+        for update_callback, context in list(self._listeners.values()):
+            if context is None:
+                if changes.controller:
+                    update_callback()
+                    woken += 1
+            elif context in contexts:
+                update_callback()
+                woken += 1
+        self.controller.metrics.observe(LISTENER_FANOUT, woken)
 
     async def async_update_data(self):
-        """Fetch data from NETSprinkler"""
-        LOGGER.info(f'[coordinator:async_update_data] retrieve data from NETSprinkler')
+        """Fetch data from NETSprinkler, returns the current state object unchanged when nothing changed."""
+        LOGGER.trace('[coordinator:async_update_data] retrieve data from NETSprinkler')
+        unscheduled, self._unscheduled = self._unscheduled, False
+        if not unscheduled and self._hub is not None and self.config_entry is not None:
+            # scheduled polls of the controllers sharing the hub go out at
+            # their own fraction of the second instead of all at once
+            await self._hub.async_wait_phase(self.config_entry.entry_id)
         async with async_timeout.timeout(TIMEOUT):
             try:
-                await self.controller.refresh()
-            except Exception as e:
-                LOGGER.exception(e)
-
-            if not self.controller._state:
-                raise UpdateFailed('Error fetching NETSprinkler State')
+                changed = await self.controller.refresh()
+                self.controller.metrics.increment(REFRESHES)
+                if not changed:
+                    self.controller.metrics.increment(REFRESHES_UNCHANGED)
+                # the device clock ticks on every poll, only valve or schedule activity resets the backoff
+                changes = self.controller.changes
+                self._scheduler.observe(changes is None or bool(changes.valves or changes.schedules))
+            except NETSprinklerError as err:
+                raise UpdateFailed(f'Error fetching NETSprinkler State: {err}') from err
 
-            return self.controller._state
\ No newline at end of file
+        # entities of vanished valves must be gone before the listeners run
+        await self._async_reconcile()
+        return self.controller.state
@@ -0,0 +1,42 @@
+"""Diagnostics support for netsprinkler_component."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD, CONF_URL, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+
+from custom_components.netsprinkler_component.Sprinkler import codec
+
+from .const import DOMAIN
+from .hub import async_get_hub
+
+TO_REDACT = {CONF_PASSWORD, CONF_URL, CONF_USERNAME}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    """Return the metrics and health of a config entry."""
+    data = hass.data[DOMAIN][entry.entry_id]
+    coordinator = data["coordinator"]
+    controller = data["controller"]
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "coordinator": {
+            "last_update_success": coordinator.last_update_success,
+            "update_interval": coordinator.update_interval.total_seconds() if coordinator.update_interval else None,
+            "push_connected": coordinator.push_connected,
+        },
+        "controller": {
+            "valves": len(controller.valves),
+            "schedules": len(controller.schedules),
+            "stale": controller.stale,
+            "breaker": controller.transport.breaker.state,
+            "json_backend": codec.JSON_BACKEND,
+            "current_draw": controller.draw_estimator.as_dict(),
+            "sequence_running": coordinator.sequencer.running,
+        },
+        "metrics": controller.metrics.as_dict(),
+        "hub": async_get_hub(hass).health(),
+    }
@@ -0,0 +1,122 @@
+"""Shared polling resources of every NETSprinkler controller in this Home Assistant."""
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING, Any
+
+import aiohttp
+
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+
+from custom_components.netsprinkler_component.Sprinkler.metrics import REQUEST_LATENCY
+from custom_components.netsprinkler_component.Sprinkler.resilience import ConcurrencyLimit
+from custom_components.netsprinkler_component.Sprinkler.transport import create_session
+
+from .const import DATA_HUB, HUB_MAX_IN_FLIGHT, HUB_POOL_LIMIT, HUB_POOL_LIMIT_PER_HOST, LOGGER
+
+if TYPE_CHECKING:
+    from .coordinator import NETSprinklerDataUpdateCoordinator
+
+
+@callback
+def async_get_hub(hass: HomeAssistant) -> NETSprinklerHub:
+    """Return the hub, creating it for the first controller."""
+    if (hub := hass.data.get(DATA_HUB)) is None:
+        hub = hass.data[DATA_HUB] = NETSprinklerHub(hass)
+    return hub
+
+
+class NETSprinklerHub:
+    """Owns the connection pool and the in-flight cap of all controllers.
+
+    Coordinators register here and get a poll phase: the fraction of a
+    second at which their scheduled polls go out. The phases are spread
+    evenly over the second, so controllers polling on the same interval do
+    not hit the network at the same moment.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize."""
+        self.hass = hass
+        self._session: aiohttp.ClientSession | None = None
+        self.limiter = ConcurrencyLimit(HUB_MAX_IN_FLIGHT)
+        self._coordinators: dict[str, NETSprinklerDataUpdateCoordinator] = {}
+        self._phases: dict[str, float] = {}
+        self._unsub_close: CALLBACK_TYPE | None = hass.bus.async_listen_once(
+            EVENT_HOMEASSISTANT_CLOSE, self._async_close
+        )
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Pooled session shared by every controller."""
+        if self._session is None or self._session.closed:
+            LOGGER.debug('[hub:session] open the shared connection pool')
+            self._session = create_session(HUB_POOL_LIMIT, HUB_POOL_LIMIT_PER_HOST)
+        return self._session
+
+    @callback
+    def async_register(self, entry_id: str, coordinator: NETSprinklerDataUpdateCoordinator) -> None:
+        """Add a controller and spread the poll phases again."""
+        self._coordinators[entry_id] = coordinator
+        self._spread_phases()
+
+    async def async_unregister(self, entry_id: str) -> None:
+        """Forget a controller, the last one closes the pool."""
+        self._coordinators.pop(entry_id, None)
+        self._spread_phases()
+        if self._coordinators:
+            return
+        if self._unsub_close is not None:
+            self._unsub_close()
+            self._unsub_close = None
+        await self._async_close_session()
+        self.hass.data.pop(DATA_HUB, None)
+
+    async def _async_close(self, event: Event) -> None:
+        """Close the pool when Home Assistant stops, entries are not unloaded then."""
+        self._unsub_close = None
+        await self._async_close_session()
+
+    async def _async_close_session(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _spread_phases(self) -> None:
+        count = len(self._coordinators)
+        self._phases = {
+            entry_id: index / count
+            for index, entry_id in enumerate(sorted(self._coordinators))
+        }
+
+    def phase(self, entry_id: str) -> float:
+        """Offset within the second at which this controller polls."""
+        return self._phases.get(entry_id, 0.0)
+
+    async def async_wait_phase(self, entry_id: str) -> None:
+        """Sleep until the loop clock reaches the phase of this controller."""
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep((self.phase(entry_id) - loop.time()) % 1)
+
+    def health(self) -> dict[str, Any]:
+        """Aggregate state of every controller, for diagnostics."""
+        controllers = {}
+        for entry_id, coordinator in self._coordinators.items():
+            controller = coordinator.controller
+            latency = controller.metrics.percentile(REQUEST_LATENCY, 95)
+            controllers[entry_id] = {
+                "available": coordinator.last_update_success,
+                "breaker": controller.transport.breaker.state,
+                "phase": round(self.phase(entry_id), 3),
+                "update_interval": coordinator.update_interval.total_seconds() if coordinator.update_interval else None,
+                "latency_p95_ms": None if latency is None else round(latency * 1000, 1),
+            }
+        return {
+            "controllers": len(controllers),
+            "available": sum(1 for health in controllers.values() if health["available"]),
+            "in_flight": self.limiter.in_flight,
+            "in_flight_peak": self.limiter.peak,
+            "in_flight_limit": self.limiter.limit,
+            "per_controller": controllers,
+        }
@@ -1,21 +1,34 @@
 """Sensor platform for netsprinkler_component."""
 from __future__ import annotations
 
-from homeassistant.components.sensor import SensorDeviceClass, SensorEntityDescription
+from homeassistant.components.sensor import SensorDeviceClass, SensorEntity, SensorEntityDescription
 from homeassistant.const import CONF_NAME
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.entity import Entity
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+from homeassistant.helpers.entity import Entity, EntityCategory
 from homeassistant.util import slugify
 from homeassistant.util.dt import utc_from_timestamp
 from typing import Callable
+from functools import partial
 
 
 
 from custom_components.netsprinkler_component import NETSprinklerControllerEntity, NETSprinklerSensor, NETSprinklerStationEntity
+from custom_components.netsprinkler_component.Sprinkler.metrics import (
+    PAYLOAD_SIZE,
+    REFRESHES_UNCHANGED,
+    REQUEST_ERRORS,
+    REQUEST_LATENCY,
+    REQUESTS,
+)
+
+from .coordinator import METRICS_CONTEXT
 
 from .const import (
     DOMAIN,
-    LOGGER
+    LOGGER,
+    REMAINING_TIME_INTERVAL
     )
 
 ENTITY_DESCRIPTIONS = (
@@ -27,16 +40,44 @@ ENTITY_DESCRIPTIONS = (
 )
 
 
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def _percent(ratio):
+    return None if ratio is None else round(ratio * 100, 1)
+
+
+# key, name, unit, icon and how to read the value from the controller metrics
+METRIC_SENSORS = (
+    ("request_latency_p50", "Request Latency p50", "ms", "mdi:timer-outline",
+        lambda metrics: _ms(metrics.percentile(REQUEST_LATENCY, 50))),
+    ("request_latency_p95", "Request Latency p95", "ms", "mdi:timer-alert-outline",
+        lambda metrics: _ms(metrics.percentile(REQUEST_LATENCY, 95))),
+    ("request_error_rate", "Request Error Rate", "%", "mdi:alert-circle-outline",
+        lambda metrics: _percent(metrics.ratio(REQUEST_ERRORS, REQUESTS))),
+    ("last_payload_size", "Last Payload Size", "B", "mdi:file-download-outline",
+        lambda metrics: metrics.gauge(PAYLOAD_SIZE)),
+    ("updates_unchanged", "Updates Skipped Unchanged", None, "mdi:debug-step-over",
+        lambda metrics: metrics.counter(REFRESHES_UNCHANGED)),
+)
+
+
 async def async_setup_entry(hass : HomeAssistant, entry: dict, async_add_entities: Callable):
     """Set up the sensor platform."""
     """Set up the OpenSprinkler sensors."""
     logPrefix = '[sensor:async_setup_entry]'
     entities = _create_entities(hass, entry)
     async_add_entities(entities)
-    LOGGER.debug(f'{logPrefix} Finished async_setup_entry... return ')
+    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    coordinator.async_add_entity_factory(
+        async_add_entities,
+        valve_factory=partial(_create_valve_entities, entry, entry.data[CONF_NAME], coordinator),
+    )
+    LOGGER.debug('%s Finished async_setup_entry... return ', logPrefix)
 
 def _create_entities(hass: HomeAssistant, entry: dict):
-    LOGGER.debug(f'[sensor:_create_entities] start creating entities')
+    LOGGER.debug('[sensor:_create_entities] start creating entities')
     entities = []
 
     controller = hass.data[DOMAIN][entry.entry_id]["controller"]
@@ -47,16 +88,24 @@ def _create_entities(hass: HomeAssistant, entry: dict):
     #entities.append(RainDelayStopTimeSensor(entry, name, controller, coordinator))
     #entities.append(WaterLevelSensor(entry, name, controller, coordinator))
     #entities.append(FlowRateSensor(entry, name, controller, coordinator))
-    LOGGER.debug(f'[sensor:_create_entities] Adding CurrentDrawSensor')
+    LOGGER.debug('[sensor:_create_entities] Adding CurrentDrawSensor')
     entities.append(CurrentDrawSensor(entry, name, controller, coordinator))
     entities.append(ControllerCurrentTimeSensor(entry, name, controller, coordinator))
+    for description in METRIC_SENSORS:
+        entities.append(MetricSensor(entry, name, controller, coordinator, *description))
 
     for _, valve in controller.valves.items():
-        LOGGER.debug(f'[sensor:_create_entities] Adding ValveStatusSensor {name} - {valve.name}')
-        entities.append(ValveStatusSensor(entry, name, valve, coordinator))
+        LOGGER.debug('[sensor:_create_entities] Adding ValveStatusSensor %s - %s', name, valve.name)
+        entities.extend(_create_valve_entities(entry, name, coordinator, valve))
 
     return entities
 
+def _create_valve_entities(entry: dict, name: str, coordinator, valve):
+    return [
+        ValveStatusSensor(entry, name, valve, coordinator),
+        ValveRemainingTimeSensor(entry, name, valve, coordinator),
+    ]
+
 class ValveStatusSensor(NETSprinklerStationEntity, NETSprinklerSensor, Entity):
     def __init__(self, entry, name, valve, coordinator):
         self._valve = valve
@@ -72,7 +121,7 @@ class ValveStatusSensor(NETSprinklerStationEntity, NETSprinklerSensor, Entity):
     def unique_id(self) -> str:
         """Return a unique, Home Assistant friendly identifier for this entity."""
         return slugify(
-            f"{self._entry.unique_id}_{self._entity_type}_station_status_{self._valve.index}"
+            f"{self._entry.unique_id}_{self._entity_type}_station_status_valve_{self._valve.id}"
         )
 
     @property
@@ -91,9 +140,86 @@ class ValveStatusSensor(NETSprinklerStationEntity, NETSprinklerSensor, Entity):
 
     def _get_state(self) -> str:
         """Retrieve latest state."""
-        LOGGER.debug(f'[sensor:_get_state] valve : {self._valve}')
+        LOGGER.trace('[sensor:_get_state] valve : %s', self._valve.id)
         return self._valve.status
 
+class ValveRemainingTimeSensor(NETSprinklerStationEntity, NETSprinklerSensor, Entity):
+    """Seconds left of a run started from Home Assistant, counted down locally."""
+
+    def __init__(self, entry, name, valve, coordinator):
+        """Initialize."""
+        self._valve = valve
+        self._entity_type = 'sensor'
+        self._unsub_timer = None
+        super().__init__(entry, name, coordinator)
+
+    @property
+    def name(self) -> str:
+        """Return the name of this sensor."""
+        return self._valve.name + " Remaining Time"
+
+    @property
+    def unique_id(self) -> str:
+        """Return a unique, Home Assistant friendly identifier for this entity."""
+        return slugify(
+            f"{self._entry.unique_id}_{self._entity_type}_station_remaining_time_valve_{self._valve.id}"
+        )
+
+    @property
+    def icon(self) -> str:
+        """Return icon."""
+        return "mdi:timer-sand" if self._valve.is_running else "mdi:timer-sand-empty"
+
+    @property
+    def unit_of_measurement(self) -> str:
+        """Return the units of measurement."""
+        return "s"
+
+    @property
+    def device_class(self) -> str:
+        """Return the device class."""
+        return SensorDeviceClass.DURATION
+
+    def _get_state(self) -> int | None:
+        if not self._valve.is_running:
+            return 0
+        remaining = self._valve.remaining()
+        # a run started elsewhere, e.g. by a schedule, has no known end
+        return None if remaining is None else round(remaining)
+
+    async def async_added_to_hass(self):
+        """Stop the countdown on removal and start it for a run already going."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self._async_stop_timer)
+        self._async_sync_timer()
+
+    @callback
+    def _handle_coordinator_update(self):
+        self._async_sync_timer()
+        super()._handle_coordinator_update()
+
+    @callback
+    def _async_sync_timer(self) -> None:
+        """Tick every second while a tracked run has time left."""
+        remaining = self._valve.remaining() if self._valve.is_running else None
+        if remaining:
+            if self._unsub_timer is None:
+                self._unsub_timer = async_track_time_interval(self.hass, self._async_tick, REMAINING_TIME_INTERVAL)
+        else:
+            self._async_stop_timer()
+
+    @callback
+    def _async_tick(self, now) -> None:
+        self._async_sync_timer()
+        self.async_write_ha_state()
+
+    @callback
+    def _async_stop_timer(self) -> None:
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+
+
 class CurrentDrawSensor(NETSprinklerControllerEntity, NETSprinklerSensor, Entity):
     def __init__(self, entry, name, controller, coordinator):
         self._name = name
@@ -156,4 +282,64 @@ class ControllerCurrentTimeSensor(NETSprinklerControllerEntity, NETSprinklerSens
         if devt == 0:
             return None
 
-        return utc_from_timestamp(devt).isoformat()
\ No newline at end of file
+        return utc_from_timestamp(devt).isoformat()
+
+class MetricSensor(CoordinatorEntity, SensorEntity):
+    """Diagnostic view on one of the controller metrics, disabled by default.
+
+    Only listens to the metrics context, which the coordinator wakes once
+    after every update cycle, changed or not.
+    """
+
+    def __init__(self, entry, name, controller, coordinator, key, label, unit, icon, value):
+        """Initialize."""
+        super().__init__(coordinator, context=METRICS_CONTEXT)
+        self._controller = controller
+        self._entry = entry
+        self._name = name
+        self._entity_type = 'sensor'
+        self._key = key
+        self._label = label
+        self._unit = unit
+        self._icon = icon
+        self._value = value
+
+    @property
+    def device_info(self):
+        """Belong to the controller device."""
+        return {"identifiers": {(DOMAIN, slugify(self._entry.unique_id))}}
+
+    @property
+    def entity_category(self):
+        """Return the entity category."""
+        return EntityCategory.DIAGNOSTIC
+
+    @property
+    def entity_registry_enabled_default(self) -> bool:
+        """Set entity disabled by default."""
+        return False
+
+    @property
+    def icon(self) -> str:
+        """Return icon."""
+        return self._icon
+
+    @property
+    def name(self) -> str:
+        """Return the name of this sensor including the controller name."""
+        return f"{self._name} {self._label}"
+
+    @property
+    def unique_id(self) -> str:
+        """Return a unique, Home Assistant friendly identifier for this entity."""
+        return slugify(f"{self._entry.unique_id}_{self._entity_type}_metric_{self._key}")
+
+    @property
+    def native_unit_of_measurement(self) -> str | None:
+        """Return the units of measurement."""
+        return self._unit
+
+    @property
+    def native_value(self):
+        """Return the current value of the metric."""
+        return self._value(self._controller.metrics)
@@ -3,6 +3,7 @@ from __future__ import annotations
 
 from homeassistant.core import HomeAssistant
 from typing import Callable
+from functools import partial
 from homeassistant.const import CONF_NAME
 from homeassistant.components.switch import SwitchEntity
 from homeassistant.util import slugify
@@ -21,7 +22,12 @@ async def async_setup_entry(hass: HomeAssistant, entry: dict, async_add_entities
     logPrefix = '[switch:async_setup_entry]'
     entities = _create_entities(hass, entry)
     async_add_entities(entities)
-    LOGGER.debug(f'{logPrefix} Finished async_setup_entry... return ')
+    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    coordinator.async_add_entity_factory(
+        async_add_entities,
+        valve_factory=partial(_create_valve_entities, entry, entry.data[CONF_NAME], coordinator),
+    )
+    LOGGER.debug('%s Finished async_setup_entry... return ', logPrefix)
 
 def _create_entities(hass: HomeAssistant, entry: dict):
     entities = []
@@ -33,10 +39,13 @@ def _create_entities(hass: HomeAssistant, entry: dict):
 
 
     for _, valve in controller.valves.items():
-        entities.append(StationEnabledSwitch(entry, name, valve, coordinator))
+        entities.extend(_create_valve_entities(entry, name, coordinator, valve))
 
     return entities
 
+def _create_valve_entities(entry: dict, name: str, coordinator, valve):
+    return [StationEnabledSwitch(entry, name, valve, coordinator)]
+
 class ControllerOperationSwitch(NETSprinklerControllerEntity, NETSprinklerBinarySensor, SwitchEntity):
     def __init__(self, entry, name, controller, coordinator):
         self._controller = controller
@@ -95,13 +104,15 @@ class ControllerOperationSwitch(NETSprinklerControllerEntity, NETSprinklerBinary
     async def async_turn_on(self, **kwargs):
         """Enable the controller operation."""
         await self._controller.enable()
+        self.async_write_ha_state()
         await self._coordinator.async_request_refresh()
 
     async def async_turn_off(self, **kwargs):
         """Disable the device operation."""
-        LOGGER.debug(f'[switch:_async_turn_off] Turning off switch')
+        LOGGER.debug('[switch:_async_turn_off] Turning off switch')
         await self._controller.disable()
-        LOGGER.debug(f'[switch:_async_turn_off] start request on async refresh')
+        self.async_write_ha_state()
+        LOGGER.debug('[switch:_async_turn_off] start request on async refresh')
         await self._coordinator.async_request_refresh()
 
 class StationEnabledSwitch(NETSprinklerStationEntity, NETSprinklerBinarySensor, SwitchEntity):
@@ -119,7 +130,7 @@ class StationEnabledSwitch(NETSprinklerStationEntity, NETSprinklerBinarySensor,
     def unique_id(self) -> str:
         """Return a unique, Home Assistant friendly identifier for this entity."""
         return slugify(
-            f"{self._entry.unique_id}_{self._entity_type}_valve_enabled_{self._valve.index}"
+            f"{self._entry.unique_id}_{self._entity_type}_valve_enabled_valve_{self._valve.id}"
         )
 
     @property
@@ -138,15 +149,15 @@ class StationEnabledSwitch(NETSprinklerStationEntity, NETSprinklerBinarySensor,
 
     def _get_state(self) -> bool:
         """Retrieve latest state."""
-        #LOGGER.debug(f'[StationEnabledSwitch:_get_state] returning state of valve {self._valve.enabled}')
+        #LOGGER.debug('[StationEnabledSwitch:_get_state] returning state of valve %s', self._valve.enabled)
         return bool(self._valve.enabled)
 
     async def async_turn_on(self, **kwargs):
         """Enable the station."""
         await self._valve.enable()
-        await self._coordinator.async_request_refresh()
+        await self._coordinator.async_command_done()
 
     async def async_turn_off(self, **kwargs):
         """Disable the station."""
         await self._valve.disable()
-        await self._coordinator.async_request_refresh()
\ No newline at end of file
+        await self._coordinator.async_command_done()
@@ -2,6 +2,7 @@
 from homeassistant.core import HomeAssistant
 from homeassistant.const import CONF_NAME
 from typing import Callable
+from functools import partial
 from homeassistant.components.text import TextEntity
 from homeassistant.util import slugify
 
@@ -23,7 +24,12 @@ async def async_setup_entry(
     """Set up the OpenSprinkler texts."""
     entities = _create_entities(hass, entry)
     async_add_entities(entities)
-    LOGGER.debug(f'{logPrefix} Finished async_setup_entry... return ')
+    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    coordinator.async_add_entity_factory(
+        async_add_entities,
+        schedule_factory=partial(_create_schedule_entities, entry, entry.data[CONF_NAME], coordinator),
+    )
+    LOGGER.debug('%s Finished async_setup_entry... return ', logPrefix)
 
 
 def _create_entities(hass: HomeAssistant, entry: dict):
@@ -34,10 +40,13 @@ def _create_entities(hass: HomeAssistant, entry: dict):
     name = entry.data[CONF_NAME]
 
     for _, schedule in controller.schedules.items():
-        entities.append(ProgramNameText(entry, name, schedule, coordinator))
+        entities.extend(_create_schedule_entities(entry, name, coordinator, schedule))
 
     return entities
 
+def _create_schedule_entities(entry: dict, name: str, coordinator, schedule):
+    return [ProgramNameText(entry, name, schedule, coordinator)]
+
 class ProgramNameText(NETSprinklerProgramEntity, NETSprinklerText, TextEntity):
     def __init__(self, entry, name, schedule, coordinator):
         """Set up a new  schedule text."""
@@ -85,4 +94,4 @@ class ProgramNameText(NETSprinklerProgramEntity, NETSprinklerText, TextEntity):
     async def async_set_value(self, value: str) -> None:
         """Set the text value."""
         await self._schedule.set_name(value)
-        await self._coordinator.async_request_refresh()
\ No newline at end of file
+        await self._coordinator.async_command_done()
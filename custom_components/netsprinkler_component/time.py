@@ -23,7 +23,7 @@ async def async_setup_entry(
     logPrefix = '[time:async_setup_entry]'
     entities = _create_entities(hass, entry)
     async_add_entities(entities)
-    LOGGER.debug(f'{logPrefix} Finished async_setup_entry... return ')
+    LOGGER.debug('%s Finished async_setup_entry... return ', logPrefix)
 
 
 def _create_entities(hass: HomeAssistant, entry: dict):
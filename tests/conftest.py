@@ -0,0 +1,163 @@
+"""Fixtures of the tests: the in-process FakeController, a client on it and a bare Home Assistant.
+
+pytest has no async support of its own. Coroutine tests are run by
+pytest_pyfunc_call in a fresh event loop, and the fixtures registered
+with ``async_fixture`` are set up inside that loop and torn down in
+reverse order after the test. They can depend on each other and on
+``request``, the test item, by naming them as parameters.
+
+``@pytest.mark.fake(...)`` passes options to the FakeController and
+``@pytest.mark.entry(options=...)`` sets the options of the config entry.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import inspect
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from homeassistant import config_entries, loader  # noqa: E402
+from homeassistant.const import CONF_NAME, CONF_URL  # noqa: E402
+from homeassistant.core import CoreState, HomeAssistant  # noqa: E402
+from homeassistant.helpers import (  # noqa: E402
+    area_registry as ar,
+    device_registry as dr,
+    entity,
+    entity_registry as er,
+    issue_registry as ir,
+    restore_state,
+)
+
+from custom_components.netsprinkler_component.const import DOMAIN  # noqa: E402
+from custom_components.netsprinkler_component.Sprinkler import resilience  # noqa: E402
+from custom_components.netsprinkler_component.Sprinkler.fake import FakeController  # noqa: E402
+from custom_components.netsprinkler_component.Sprinkler.netsprinkler import NETSprinkler  # noqa: E402
+
+ASYNC_FIXTURES = {}
+
+
+def async_fixture(func):
+    """Register an async generator as a fixture set up in the event loop of the test."""
+    ASYNC_FIXTURES[func.__name__] = contextlib.asynccontextmanager(func)
+
+    def placeholder():
+        """Stand in for the async fixture, so pytest accepts its name."""
+
+    return pytest.fixture(name=func.__name__)(placeholder)
+
+
+def pytest_configure(config):
+    """Declare the markers of the fixtures."""
+    config.addinivalue_line('markers', 'fake(**options): options of the FakeController')
+    config.addinivalue_line('markers', 'entry(options): options of the config entry')
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    """Run coroutine tests with their async fixtures in one event loop."""
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    asyncio.run(_run_test(pyfuncitem))
+    return True
+
+
+async def _run_test(item):
+    values = {'request': item}
+    async with contextlib.AsyncExitStack() as stack:
+
+        async def resolve(name):
+            if name not in values:
+                if name in ASYNC_FIXTURES:
+                    fixture = ASYNC_FIXTURES[name]
+                    args = [await resolve(arg) for arg in inspect.signature(fixture).parameters]
+                    values[name] = await stack.enter_async_context(fixture(*args))
+                else:
+                    values[name] = item.funcargs[name]
+            return values[name]
+
+        kwargs = {name: await resolve(name) for name in inspect.signature(item.obj).parameters}
+        await item.obj(**kwargs)
+
+
+def _marker_kwargs(request, name):
+    marker = request.get_closest_marker(name)
+    return dict(marker.kwargs) if marker is not None else {}
+
+
+@async_fixture
+async def fake(request):
+    """Serve a FakeController with the options of the ``fake`` marker."""
+    fake = FakeController(**{'seed': 0, **_marker_kwargs(request, 'fake')})
+    await fake.start()
+    yield fake
+    await fake.stop()
+
+
+@async_fixture
+async def controller(fake):
+    """Client on the fake controller."""
+    controller = NETSprinkler(fake.url, {})
+    yield controller
+    await controller.session_close()
+
+
+@async_fixture
+async def hass():
+    """Bare Home Assistant with the registries loaded and custom integrations enabled."""
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        hass.config.skip_pip = True
+        loader.async_setup(hass)
+        hass.data[loader.DATA_CUSTOM_COMPONENTS] = None
+        hass.data[entity.DATA_ENTITY_SOURCE] = {}
+        await ar.async_load(hass)
+        await dr.async_load(hass)
+        await er.async_load(hass)
+        await ir.async_load(hass)
+        await restore_state.async_load(hass)
+        hass.config_entries = config_entries.ConfigEntries(hass, {})
+        await hass.config_entries.async_initialize()
+        hass.state = CoreState.running
+        yield hass
+        await hass.async_stop(force=True)
+        # loader.async_setup put the config directory on sys.path
+        with contextlib.suppress(ValueError):
+            sys.path.remove(config_dir)
+
+
+@async_fixture
+async def entry(hass, fake, request):
+    """Config entry of the fake controller, set up with the options of the ``entry`` marker."""
+    entry = config_entries.ConfigEntry(
+        version=1,
+        domain=DOMAIN,
+        title='Garden',
+        data={CONF_URL: fake.url, CONF_NAME: 'Garden'},
+        source=config_entries.SOURCE_USER,
+        options=_marker_kwargs(request, 'entry').get('options', {}),
+        unique_id='garden',
+    )
+    await hass.config_entries.async_add(entry)
+    await hass.async_block_till_done()
+    yield entry
+    if entry.state is config_entries.ConfigEntryState.LOADED:
+        await hass.config_entries.async_unload(entry.entry_id)
+        await hass.async_block_till_done()
+
+
+@async_fixture
+async def coordinator(hass, entry):
+    """Coordinator of the set up entry."""
+    yield hass.data[DOMAIN][entry.entry_id]['coordinator']
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    """Retry transient failures right away."""
+    monkeypatch.setattr(resilience, 'backoff_delay', lambda attempt: 0)
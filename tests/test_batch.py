@@ -0,0 +1,87 @@
+"""Bulk valve commands: the batch endpoints and the single commands sent without them."""
+import pytest
+
+from custom_components.netsprinkler_component.Sprinkler.errors import NETSprinklerBatchError, NETSprinklerNotFoundError
+from custom_components.netsprinkler_component.Sprinkler.transport import (
+    ENDPOINT_VALVE_ENABLE,
+    ENDPOINT_VALVE_ENABLE_MANY,
+    ENDPOINT_VALVE_RUN,
+    ENDPOINT_VALVE_RUN_MANY,
+)
+
+UNKNOWN_VALVE = 999
+
+
+def _count_calls(monkeypatch, controller, name):
+    calls = []
+    method = getattr(controller, name)
+
+    def counted(*args, **kwargs):
+        calls.append(args)
+        return method(*args, **kwargs)
+
+    monkeypatch.setattr(controller, name, counted)
+    return calls
+
+
+async def test_run_many_uses_batch_endpoint(fake, controller, monkeypatch):
+    """Test that a controller with the batch endpoint gets all runs in one request."""
+    await controller.refresh()
+    ids = list(controller.valves)[:3]
+    patches = _count_calls(monkeypatch, controller, '_patch_valves')
+
+    await controller.run_many([(id, 60) for id in ids])
+    assert fake.hits[ENDPOINT_VALVE_RUN_MANY] == 1
+    assert ENDPOINT_VALVE_RUN not in fake.hits
+    assert len(patches) == 1
+    assert all(controller.valves[id].is_running for id in ids)
+    assert all(controller.valves[id].expected_end is not None for id in ids)
+
+
+@pytest.mark.fake(batch=False)
+async def test_run_many_falls_back_to_single_runs(fake, controller, monkeypatch):
+    """Test that a 404 on the batch endpoint sends single runs, applied to the state once."""
+    await controller.refresh()
+    ids = list(controller.valves)[:3]
+    patches = _count_calls(monkeypatch, controller, '_patch_valves')
+    tracked = _count_calls(monkeypatch, controller, '_track_runs')
+
+    await controller.run_many([(id, 60) for id in ids])
+    assert fake.hits[ENDPOINT_VALVE_RUN_MANY] == 1
+    assert fake.hits[ENDPOINT_VALVE_RUN] == len(ids)
+    assert len(patches) == 1
+    assert len(tracked) == 1
+    assert all(controller.valves[id].is_running for id in ids)
+
+    # the endpoint is not tried again
+    await controller.run_many([(ids[0], 60)])
+    assert fake.hits[ENDPOINT_VALVE_RUN_MANY] == 1
+
+
+@pytest.mark.fake(batch=False)
+async def test_failed_single_runs_raise_one_error(fake, controller):
+    """Test that the single runs all go out when one fails, and the failure is raised once after them."""
+    await controller.refresh()
+    ids = list(controller.valves)[:3]
+
+    with pytest.raises(NETSprinklerBatchError) as info:
+        await controller.run_many([(id, 60) for id in ids] + [(UNKNOWN_VALVE, 60)])
+    assert len(info.value.errors) == 1
+    assert isinstance(info.value.errors[0], NETSprinklerNotFoundError)
+    assert fake.hits[ENDPOINT_VALVE_RUN] == len(ids) + 1
+    # the runs that went through are applied
+    assert all(controller.valves[id].is_running for id in ids)
+    assert all(controller.valves[id].expected_end is not None for id in ids)
+
+
+@pytest.mark.fake(batch=False)
+async def test_disable_many_falls_back_to_single_commands(fake, controller):
+    """Test that disabling without the batch endpoint sends one command per valve and applies them."""
+    await controller.refresh()
+    ids = list(controller.valves)
+
+    await controller.disable_many(ids)
+    assert fake.hits[ENDPOINT_VALVE_ENABLE_MANY] == 1
+    assert fake.hits[ENDPOINT_VALVE_ENABLE] == len(ids)
+    assert not any(controller.valves[id].enabled for id in ids)
+    assert not any(valve['enabled'] for valve in fake.settings['valves'])
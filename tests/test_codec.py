@@ -0,0 +1,67 @@
+"""Decoding of controller payloads: raw bytes, compressed answers and the recorded size and time."""
+import json
+
+from aiohttp import web
+import pytest
+
+from custom_components.netsprinkler_component.Sprinkler import codec
+from custom_components.netsprinkler_component.Sprinkler.errors import NETSprinklerApiError
+from custom_components.netsprinkler_component.Sprinkler.fake import make_settings
+from custom_components.netsprinkler_component.Sprinkler.metrics import DECODE_TIME, PAYLOAD_SIZE
+from custom_components.netsprinkler_component.Sprinkler.transport import ENDPOINT_SETTINGS_ALL, Transport
+
+
+def test_loads_bytes_and_text():
+    """Test that bytes and text decode the same and an empty body is None."""
+    assert codec.loads(b'{"valves": [1, 2]}') == codec.loads('{"valves": [1, 2]}') == {'valves': [1, 2]}
+    assert codec.loads(b'') is None
+    assert codec.loads(b' \n') is None
+
+
+def test_invalid_json_is_an_api_error():
+    """Test that an unreadable body raises NETSprinklerApiError, whatever the decoder."""
+    with pytest.raises(NETSprinklerApiError):
+        codec.loads(b'{"valves": ')
+
+
+async def test_compressed_answer_is_inflated_once():
+    """Test that a gzip answer is asked for, inflated and decoded, with its wire size kept."""
+    settings = make_settings(64, 32)
+    encodings = []
+
+    async def handler(request):
+        encodings.append(request.headers.get('Accept-Encoding'))
+        resp = web.json_response(settings)
+        resp.enable_compression(web.ContentCoding.gzip)
+        return resp
+
+    app = web.Application()
+    app.router.add_get(ENDPOINT_SETTINGS_ALL, handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', 0).start()
+    transport = Transport(f'http://127.0.0.1:{runner.addresses[0][1]}')
+    try:
+        resp = await transport.fetch(ENDPOINT_SETTINGS_ALL)
+        assert 'gzip' in encodings[0]
+        assert resp.size == len(json.dumps(settings))
+        assert resp.wire_size < resp.size
+        assert resp.decode_time is None
+        assert resp.json() == settings
+        assert resp.decode_time is not None
+    finally:
+        await transport.close()
+        await runner.cleanup()
+
+
+async def test_refresh_records_payload_size_and_decode_time(fake, controller):
+    """Test that a parsed poll records its size and decode time and an unchanged one decodes nothing."""
+    await controller.refresh()
+    size = len(json.dumps(fake.settings))
+    assert controller.last_payload_size == size
+    assert controller.metrics.gauge(PAYLOAD_SIZE) == size
+    assert controller.last_decode_time is not None
+    decodes = controller.metrics.as_dict()['histograms'][DECODE_TIME]['count']
+
+    assert not await controller.refresh(full=True)
+    assert controller.metrics.as_dict()['histograms'][DECODE_TIME]['count'] == decodes
@@ -0,0 +1,90 @@
+"""Command queue: priorities, and stops overtaking queued and running commands."""
+import asyncio
+import time
+
+import pytest
+
+from custom_components.netsprinkler_component.Sprinkler.errors import NETSprinklerCommandCancelledError, NETSprinklerUnsupportedError
+from custom_components.netsprinkler_component.Sprinkler.netsprinkler import MAX_CONCURRENT_COMMANDS
+from custom_components.netsprinkler_component.Sprinkler.transport import ENDPOINT_VALVE_RUN, ENDPOINT_VALVE_STOP
+
+LATENCY = 0.2
+
+
+def _open_valves(fake):
+    return {valve['id'] for valve in fake.settings['valves'] if valve['status']['isOpen']}
+
+
+@pytest.mark.fake(valves=8, latency=LATENCY)
+async def test_stop_skips_the_queue(fake, controller):
+    """Test that a stop goes out while the command slots are taken by runs."""
+    await controller.refresh()
+    runs = [asyncio.create_task(controller.start_manual(id, 60)) for id in controller.valves]
+    # queued, the first ones in flight
+    await asyncio.sleep(LATENCY / 4)
+
+    start = time.monotonic()
+    await controller.stop(107)
+    # one round-trip, not one behind every queued run
+    assert time.monotonic() - start < 2 * LATENCY
+    await asyncio.gather(*runs, return_exceptions=True)
+
+
+@pytest.mark.fake(valves=8, latency=LATENCY)
+async def test_stop_drops_queued_run_of_the_valve(fake, controller):
+    """Test that a stop cancels the queued run of its valve before it is sent."""
+    await controller.refresh()
+    ids = list(controller.valves)
+    runs = [asyncio.create_task(controller.start_manual(id, 60)) for id in ids]
+    # queued, the first ones in flight
+    await asyncio.sleep(LATENCY / 4)
+
+    await controller.stop(ids[-1])
+    results = await asyncio.gather(*runs, return_exceptions=True)
+    assert isinstance(results[-1], NETSprinklerCommandCancelledError)
+    assert not any(isinstance(result, Exception) for result in results[:-1])
+    assert fake.hits[ENDPOINT_VALVE_RUN] == len(ids) - 1
+    assert _open_valves(fake) == set(ids[:-1])
+
+
+@pytest.mark.fake(valves=8, latency=LATENCY)
+async def test_stop_all_cancels_queued_and_closes_running(fake, controller):
+    """Test that stop_all drops the queued runs and closes the ones already sent once they land."""
+    await controller.refresh()
+    runs = [asyncio.create_task(controller.start_manual(id, 60)) for id in controller.valves]
+    # queued, the first ones in flight
+    await asyncio.sleep(LATENCY / 4)
+
+    await controller.stop_all()
+    results = await asyncio.gather(*runs, return_exceptions=True)
+    assert all(isinstance(result, NETSprinklerCommandCancelledError) for result in results)
+    assert fake.hits[ENDPOINT_VALVE_RUN] == MAX_CONCURRENT_COMMANDS
+    assert _open_valves(fake) == set()
+    assert not any(valve.is_running for valve in controller.valves.values())
+
+
+@pytest.mark.fake(valves=2, stop=False)
+async def test_missing_stop_endpoint_is_reported(fake, controller):
+    """Test that firmware without the stop endpoint raises a clear error and is not asked again."""
+    await controller.refresh()
+    for _ in range(2):
+        with pytest.raises(NETSprinklerUnsupportedError):
+            await controller.stop(100)
+    assert fake.hits[ENDPOINT_VALVE_STOP] == 1
+
+
+@pytest.mark.fake(valves=8, latency=LATENCY)
+async def test_session_close_cancels_queued_and_running(fake, controller):
+    """Test that closing the session cancels every command, in flight or queued, and leaves no task behind."""
+    await controller.refresh()
+    runs = [asyncio.create_task(controller.start_manual(id, 60)) for id in controller.valves]
+    # queued, the first ones in flight
+    await asyncio.sleep(LATENCY / 4)
+
+    await controller.session_close()
+    results = await asyncio.gather(*runs, return_exceptions=True)
+    assert all(isinstance(result, NETSprinklerCommandCancelledError) for result in results)
+    assert fake.hits[ENDPOINT_VALVE_RUN] <= MAX_CONCURRENT_COMMANDS
+    assert controller._commands.active == 0
+    assert controller._commands.pending == 0
+    assert not controller._commands._tasks
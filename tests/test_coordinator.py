@@ -0,0 +1,45 @@
+"""The update coordinator of a config entry set up against the fake controller."""
+from custom_components.netsprinkler_component.Sprinkler.changes import schedule_context, valve_context
+from custom_components.netsprinkler_component.Sprinkler.transport import ENDPOINT_SETTINGS_ALL
+
+
+async def test_unchanged_poll_wakes_no_listener(hass, fake, coordinator):
+    """Test that a full sync answered with the same document leaves the state and the listeners alone."""
+    calls = []
+    unsubscribe = coordinator.async_add_listener(lambda: calls.append(1))
+    state = coordinator.data
+    hits = fake.hits[ENDPOINT_SETTINGS_ALL]
+
+    coordinator.controller.request_full_sync()
+    await coordinator.async_refresh()
+    assert fake.hits[ENDPOINT_SETTINGS_ALL] == hits + 1
+    assert coordinator.last_update_success
+    assert coordinator.data is state
+    assert calls == []
+    unsubscribe()
+
+
+async def test_listeners_woken_by_their_context(hass, fake, coordinator):
+    """Test that a poll only wakes the listeners of the valves, schedules or controller fields that changed."""
+    calls = []
+    valve, other = coordinator.controller.state.valves[:2]
+    schedule = coordinator.controller.state.schedules[0]
+    for context in (valve_context(valve.id), valve_context(other.id), schedule_context(schedule.id), None):
+        coordinator.async_add_listener(lambda context=context: calls.append(context), context)
+
+    fake.settings['valves'][0]['name'] = 'Hedge'
+    coordinator.controller.request_full_sync()
+    await coordinator.async_refresh()
+    assert calls == [valve_context(valve.id)]
+
+    calls.clear()
+    fake.settings['schedules'][0]['name'] = 'Morning'
+    coordinator.controller.request_full_sync()
+    await coordinator.async_refresh()
+    assert calls == [schedule_context(schedule.id)]
+
+    calls.clear()
+    fake.tick()
+    coordinator.controller.request_full_sync()
+    await coordinator.async_refresh()
+    assert calls == [None]
@@ -0,0 +1,74 @@
+"""The hub shared by the controllers: poll phases and the cap on requests in flight."""
+import asyncio
+
+import pytest
+
+from homeassistant import config_entries
+from homeassistant.const import CONF_NAME, CONF_URL
+
+from custom_components.netsprinkler_component.const import DOMAIN, HUB_MAX_IN_FLIGHT
+from custom_components.netsprinkler_component.hub import async_get_hub
+from custom_components.netsprinkler_component.Sprinkler.fake import FakeController
+from custom_components.netsprinkler_component.Sprinkler.transport import ENDPOINT_VALVE_RUN
+
+LATENCY = 0.1
+
+
+async def _add_second_entry(hass):
+    fake = FakeController(seed=1, latency=LATENCY)
+    await fake.start()
+    entry = config_entries.ConfigEntry(
+        version=1,
+        domain=DOMAIN,
+        title='Orchard',
+        data={CONF_URL: fake.url, CONF_NAME: 'Orchard'},
+        source=config_entries.SOURCE_USER,
+        options={},
+        unique_id='orchard',
+    )
+    await hass.config_entries.async_add(entry)
+    await hass.async_block_till_done()
+    return fake, entry
+
+
+@pytest.mark.fake(latency=LATENCY)
+async def test_entries_poll_at_their_own_phase(hass, fake, entry):
+    """Test that two controllers on the hub get different phases and scheduled polls wait for theirs."""
+    other_fake, other_entry = await _add_second_entry(hass)
+    hub = async_get_hub(hass)
+
+    phases = {hub.phase(entry.entry_id), hub.phase(other_entry.entry_id)}
+    assert phases == {0.0, 0.5}
+
+    loop = asyncio.get_running_loop()
+    for entry_id in (entry.entry_id, other_entry.entry_id):
+        await hub.async_wait_phase(entry_id)
+        assert (loop.time() - hub.phase(entry_id)) % 1 == pytest.approx(0, abs=0.05)
+
+    await hass.config_entries.async_unload(other_entry.entry_id)
+    await other_fake.stop()
+    # the remaining controller gets the whole second
+    assert hub.phase(entry.entry_id) == 0.0
+
+
+@pytest.mark.fake(latency=LATENCY)
+async def test_controllers_share_the_in_flight_cap(hass, fake, entry):
+    """Test that the commands of two controllers together stay within the hub limit."""
+    other_fake, other_entry = await _add_second_entry(hass)
+    hub = async_get_hub(hass)
+    controllers = [
+        hass.data[DOMAIN][entry_id]['controller']
+        for entry_id in (entry.entry_id, other_entry.entry_id)
+    ]
+
+    await asyncio.gather(*(
+        controller.start_manual(id, 60)
+        for controller in controllers
+        for id in controller.valves
+    ))
+    assert fake.hits[ENDPOINT_VALVE_RUN] + other_fake.hits[ENDPOINT_VALVE_RUN] == 16
+    assert hub.limiter.peak == HUB_MAX_IN_FLIGHT
+    assert hub.limiter.in_flight == 0
+
+    await hass.config_entries.async_unload(other_entry.entry_id)
+    await other_fake.stop()
@@ -0,0 +1,91 @@
+"""Lazy, rate limited logging and the trace mode switched at runtime."""
+import logging
+
+import pytest
+
+from custom_components.netsprinkler_component.const import CONF_TRACE, DOMAIN, SERVICE_SET_TRACE
+from custom_components.netsprinkler_component.Sprinkler import log
+from custom_components.netsprinkler_component.Sprinkler.log import SprinklerLogger, set_trace, trace_enabled
+
+INTERVAL = 60
+
+
+class Formatted:
+    """Argument that counts how often it was formatted."""
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self.count = 0
+
+    def __str__(self) -> str:
+        """Count the formatting."""
+        self.count += 1
+        return 'formatted'
+
+
+@pytest.fixture
+def logger(caplog):
+    """SprinklerLogger of a test logger, captured from DEBUG on."""
+    caplog.set_level(logging.DEBUG, logger='netsprinkler_test')
+    yield SprinklerLogger(logging.getLogger('netsprinkler_test'))
+    set_trace(False)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Monotonic clock of the throttle, moved by hand."""
+    now = [1000.0]
+    monkeypatch.setattr(log.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_filtered_message_is_not_formatted(logger, caplog):
+    """Test that the arguments of a message below the level are never formatted."""
+    argument = Formatted()
+    logger._logger.setLevel(logging.INFO)
+    logger.debug('state %s', argument)
+    assert argument.count == 0
+    logger.info('state %s', argument)
+    assert [record.getMessage() for record in caplog.records] == ['state formatted']
+    assert caplog.records[0].funcName == 'test_filtered_message_is_not_formatted'
+
+
+def test_trace_only_logs_in_trace_mode(logger, caplog):
+    """Test that trace messages are dropped unformatted until trace mode is switched on."""
+    argument = Formatted()
+    logger.trace('read %s', argument)
+    assert argument.count == 0
+    assert caplog.records == []
+
+    set_trace(True)
+    assert trace_enabled()
+    logger.trace('read %s', argument)
+    assert [(record.levelno, record.getMessage()) for record in caplog.records] == [(logging.DEBUG, 'read formatted')]
+
+
+def test_throttled_counts_the_suppressed_repeats(logger, caplog, clock):
+    """Test that a throttled message is logged once per interval and tells how many repeats it swallowed."""
+    for _ in range(5):
+        logger.throttled(logging.WARNING, 'down', 'controller %s down', 'garden', interval=INTERVAL)
+    # another key is throttled on its own
+    logger.throttled(logging.WARNING, 'slow', 'controller slow', interval=INTERVAL)
+    clock[0] += INTERVAL
+    logger.throttled(logging.WARNING, 'down', 'controller %s down', 'garden', interval=INTERVAL)
+    logger.throttled(logging.WARNING, 'down', 'controller %s down', 'garden', interval=INTERVAL)
+
+    assert [record.getMessage() for record in caplog.records] == [
+        'controller garden down',
+        'controller slow',
+        'controller garden down (4 similar messages suppressed)',
+    ]
+
+
+async def test_set_trace_service(hass, fake, entry):
+    """Test that the set_trace service switches trace mode on and off."""
+    try:
+        await hass.services.async_call(DOMAIN, SERVICE_SET_TRACE, {CONF_TRACE: True}, blocking=True)
+        assert trace_enabled()
+        await hass.services.async_call(DOMAIN, SERVICE_SET_TRACE, {CONF_TRACE: False}, blocking=True)
+        assert not trace_enabled()
+    finally:
+        set_trace(False)
@@ -0,0 +1,104 @@
+"""Metrics of the client and the diagnostic sensors showing them."""
+import asyncio
+
+from homeassistant.helpers import entity_registry as er
+
+from custom_components.netsprinkler_component.const import DOMAIN
+from custom_components.netsprinkler_component.sensor import MetricSensor
+from custom_components.netsprinkler_component.Sprinkler.metrics import (
+    HISTOGRAM_SAMPLES,
+    PAYLOAD_SIZE,
+    REFRESHES,
+    REFRESHES_UNCHANGED,
+    REQUEST_ERRORS,
+    REQUEST_LATENCY,
+    REQUESTS,
+    UPDATE_CYCLE,
+    Histogram,
+    Metrics,
+)
+
+
+def test_histogram_percentiles_cover_the_recent_samples():
+    """Test nearest-rank percentiles over the last HISTOGRAM_SAMPLES samples, count and max over all."""
+    histogram = Histogram()
+    assert histogram.percentile(50) is None
+    for value in range(1, 101):
+        histogram.observe(value)
+    assert (histogram.percentile(50), histogram.percentile(95), histogram.percentile(100)) == (50, 95, 100)
+    assert histogram.mean == 50.5
+
+    for _ in range(HISTOGRAM_SAMPLES):
+        histogram.observe(0)
+    assert histogram.percentile(100) == 0
+    assert histogram.max == 100
+    assert histogram.count == 100 + HISTOGRAM_SAMPLES
+
+
+def test_ratio_waits_for_the_first_count():
+    """Test that a ratio is None until its whole was counted."""
+    metrics = Metrics()
+    assert metrics.ratio(REQUEST_ERRORS, REQUESTS) is None
+    metrics.increment(REQUESTS, 4)
+    metrics.increment(REQUEST_ERRORS)
+    assert metrics.ratio(REQUEST_ERRORS, REQUESTS) == 0.25
+    assert metrics.as_dict()['counters'] == {REQUESTS: 4, REQUEST_ERRORS: 1}
+
+
+async def test_client_records_requests_and_payloads(fake, controller):
+    """Test that every request is counted and timed and the last document size is kept."""
+    await controller.refresh(full=True)
+    await controller.refresh(full=True)
+    metrics = controller.metrics
+    assert metrics.counter(REQUESTS) == 2
+    assert metrics.counter(REQUEST_ERRORS) == 0
+    assert metrics.percentile(REQUEST_LATENCY, 50) is not None
+    assert metrics.gauge(PAYLOAD_SIZE) > 0
+
+
+async def _enable_metric_sensors(hass, entry):
+    registry = er.async_get(hass)
+    entity_ids = [
+        item.entity_id for item in er.async_entries_for_config_entry(registry, entry.entry_id)
+        if '_metric_' in item.unique_id
+    ]
+    for entity_id in entity_ids:
+        registry.async_update_entity(entity_id, disabled_by=None)
+    await hass.config_entries.async_reload(entry.entry_id)
+    coordinator = hass.data[DOMAIN][entry.entry_id]['coordinator']
+    # the first poll after the reload runs in the background
+    async with asyncio.timeout(2):
+        while coordinator.controller.stale:
+            await asyncio.sleep(0.01)
+    await hass.async_block_till_done()
+    return coordinator, entity_ids
+
+
+async def test_metric_sensors_written_once_per_cycle(hass, fake, entry, monkeypatch, no_backoff):
+    """Test that a metric sensor is written once per update cycle, whether the poll changed, failed or not."""
+    writes = []
+    write = MetricSensor.async_write_ha_state
+
+    def counted(self):
+        writes.append(self.entity_id)
+        write(self)
+
+    monkeypatch.setattr(MetricSensor, 'async_write_ha_state', counted)
+    coordinator, entity_ids = await _enable_metric_sensors(hass, entry)
+    assert entity_ids
+    assert not hasattr(MetricSensor, 'stop')
+
+    for change in ('unchanged', 'changed', 'failed'):
+        if change == 'changed':
+            fake.settings['valves'][0]['name'] = 'Hedge'
+        if change == 'failed':
+            fake.failure_rate = 1.0
+        coordinator.controller.request_full_sync()
+        writes.clear()
+        await coordinator.async_refresh()
+        assert sorted(writes) == sorted(entity_ids), change
+
+    assert coordinator.controller.metrics.counter(REFRESHES) >= 3
+    assert coordinator.controller.metrics.counter(REFRESHES_UNCHANGED) >= 1
+    assert coordinator.controller.metrics.percentile(UPDATE_CYCLE, 50) is not None
+    assert coordinator.controller.metrics.counter(REQUEST_ERRORS) > 0
@@ -0,0 +1,52 @@
+"""Profiling of the next update cycles, started by the profile service."""
+import glob
+import os
+import pstats
+
+from custom_components.netsprinkler_component.const import CONF_CYCLES, DOMAIN, SERVICE_PROFILE
+from custom_components.netsprinkler_component.Sprinkler.profiler import CycleProfiler
+
+
+def _busy():
+    return sum(range(1000))
+
+
+def test_profiler_counts_down_the_cycles(tmp_path):
+    """Test that only the bracketed cycles are profiled and the dump holds the stats, report and snapshot."""
+    profiler = CycleProfiler(2)
+    for _ in range(2):
+        assert not profiler.done
+        profiler.resume()
+        _busy()
+        profiler.pause()
+    assert profiler.done
+
+    paths = profiler.dump(str(tmp_path), 'cycle')
+    assert [os.path.splitext(path)[1] for path in paths] == ['.prof', '.txt', '.tracemalloc']
+    assert pstats.Stats(paths[0]).total_calls > 0
+    with open(paths[1], encoding='utf-8') as file:
+        report = file.read()
+    assert '_busy' in report
+    assert 'Top allocations by line' in report
+
+
+async def test_profile_service_writes_to_the_config_directory(hass, fake, entry, coordinator):
+    """Test that the service profiles the next cycles and writes the results to the config directory once they ran."""
+    await hass.services.async_call(DOMAIN, SERVICE_PROFILE, {CONF_CYCLES: 2}, blocking=True)
+    pattern = hass.config.path(f'{DOMAIN}_profile_{entry.entry_id}_*')
+    # the refresh the service asked for may wait for the cooldown of the debouncer
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+    assert glob.glob(pattern) == []
+
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+    paths = sorted(glob.glob(pattern))
+    assert [os.path.splitext(path)[1] for path in paths] == ['.prof', '.tracemalloc', '.txt']
+    with open(paths[2], encoding='utf-8') as file:
+        assert 'refresh' in file.read()
+
+    # the next cycles are not profiled
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+    assert len(glob.glob(pattern)) == 3
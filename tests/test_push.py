@@ -0,0 +1,154 @@
+"""Event stream: connecting, applying pushed records, and falling back to polling without it."""
+import asyncio
+from datetime import timedelta
+import logging
+
+from aiohttp import web
+import pytest
+
+from custom_components.netsprinkler_component.const import PUSH_SCAN_INTERVAL
+from custom_components.netsprinkler_component.Sprinkler import push
+from custom_components.netsprinkler_component.Sprinkler.fake import FakeController
+from custom_components.netsprinkler_component.Sprinkler.log import set_trace
+from custom_components.netsprinkler_component.Sprinkler.netsprinkler import NETSprinkler
+from custom_components.netsprinkler_component.Sprinkler.push import PushClient
+from custom_components.netsprinkler_component.Sprinkler.transport import ENDPOINT_EVENTS, ENDPOINT_SETTINGS_ALL
+
+
+async def _until(predicate, timeout=2):
+    """Wait for ``predicate()`` to become true while the event loop runs."""
+    async with asyncio.timeout(timeout):
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def fast_reconnect(monkeypatch):
+    """Reconnect within milliseconds, doubling up to 40 ms."""
+    monkeypatch.setattr(push, 'RECONNECT_MIN', 0.01)
+    monkeypatch.setattr(push, 'RECONNECT_MAX', 0.04)
+
+
+async def test_pushed_valve_is_applied(fake, controller):
+    """Test that a valve record on the stream updates the state and calls on_update."""
+    await controller.refresh()
+    updates = []
+    client = PushClient(controller, lambda: updates.append(1))
+    client.start()
+    await _until(lambda: client.connected)
+
+    valve = fake.settings['valves'][2]
+    valve['status']['isOpen'] = True
+    fake.publish('valve', valve)
+    await _until(lambda: updates)
+    assert controller.state.valves_by_id[valve['id']].is_open
+    await client.stop()
+    assert not client.connected
+
+
+async def test_partial_event_keeps_the_other_fields(fake, controller):
+    """Test that a status-only valve event leaves the name and enabled flag alone."""
+    await controller.refresh()
+    before = controller.state.valves[1]
+    await controller.disable_valve(before.id)
+
+    assert controller.apply_event('valve', {'id': before.id, 'status': {'isOpen': True}})
+    after = controller.state.valves_by_id[before.id]
+    assert after.is_open
+    assert after.name == before.name
+    assert not after.enabled
+    assert after.index == before.index
+
+    schedule = controller.state.schedules[0]
+    assert not controller.apply_event('schedule', {'id': schedule.id})
+    assert controller.state.schedules_by_id[schedule.id] == schedule
+
+
+@pytest.mark.fake(events=False)
+async def test_missing_stream_stays_on_polling(fake, controller):
+    """Test that a 404 on the event stream stops the client for good."""
+    await controller.refresh()
+    client = PushClient(controller, lambda: None)
+    client.start()
+    await _until(lambda: not client.supported)
+    assert not client.connected
+    assert fake.hits[ENDPOINT_EVENTS] == 1
+    await client.stop()
+
+
+async def test_non_event_stream_reply_stays_on_polling():
+    """Test that a page answered in place of the stream, e.g. by a web UI, stops the client."""
+
+    async def index_page(request):
+        return web.Response(text='<html></html>', content_type='text/html')
+
+    fake = FakeController(seed=0)
+    fake._events = index_page
+    await fake.start()
+    controller = NETSprinkler(fake.url, {})
+    try:
+        await controller.refresh()
+        client = PushClient(controller, lambda: None)
+        client.start()
+        await _until(lambda: not client.supported)
+        assert not client.connected
+        assert fake.hits[ENDPOINT_EVENTS] == 1
+        await client.stop()
+    finally:
+        await controller.session_close()
+        await fake.stop()
+
+
+async def test_reconnects_with_backoff(fake, controller, fast_reconnect, caplog):
+    """Test that failed connects back off up to the maximum and a working stream resets the delay."""
+    await controller.refresh()
+    connections = []
+    client = PushClient(controller, lambda: None, connections.append)
+    fake.failure_rate = 1.0
+    caplog.set_level(logging.DEBUG, logger=push.LOGGER.name)
+    set_trace(True)
+    try:
+        client.start()
+        await _until(lambda: fake.hits.get(ENDPOINT_EVENTS, 0) >= 5)
+        delays = [record.args[1] for record in caplog.records if 'reconnecting in' in record.msg]
+        assert delays[:5] == [0.01, 0.02, 0.04, 0.04, 0.04]
+        assert not client.connected
+        assert client.supported
+
+        fake.failure_rate = 0.0
+        await _until(lambda: client.connected)
+        caplog.clear()
+        fake.drop_streams()
+        await _until(lambda: connections[-2:] == [False, True])
+        delays = [record.args[1] for record in caplog.records if 'reconnecting in' in record.msg]
+        assert delays == [0.01]
+    finally:
+        set_trace(False)
+        await client.stop()
+
+
+async def test_coordinator_polls_rarely_while_pushed(hass, fake, coordinator, fast_reconnect):
+    """Test that the poll interval backs off while the stream is up and returns once it drops."""
+    await _until(lambda: coordinator.push_connected)
+    assert coordinator.update_interval == timedelta(seconds=PUSH_SCAN_INTERVAL)
+
+    fake.failure_rate = 1.0
+    fake.drop_streams()
+    await _until(lambda: not coordinator.push_connected)
+    assert coordinator.update_interval < timedelta(seconds=PUSH_SCAN_INTERVAL)
+
+    fake.failure_rate = 0.0
+    await _until(lambda: coordinator.push_connected)
+    assert coordinator.update_interval == timedelta(seconds=PUSH_SCAN_INTERVAL)
+
+
+async def test_coordinator_applies_pushed_records(hass, fake, coordinator):
+    """Test that a pushed valve record reaches the state of the coordinator without a poll."""
+    await _until(lambda: coordinator.push_connected)
+    valve = fake.settings['valves'][0]
+    polls = fake.hits.get(ENDPOINT_SETTINGS_ALL, 0)
+
+    valve['status']['isOpen'] = True
+    fake.publish('valve', valve)
+    await _until(lambda: coordinator.data.valves_by_id[valve['id']].is_open)
+    assert fake.hits[ENDPOINT_SETTINGS_ALL] == polls
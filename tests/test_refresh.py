@@ -0,0 +1,118 @@
+"""Conditional and tiered polling of the controller state."""
+import asyncio
+
+import pytest
+
+from custom_components.netsprinkler_component.Sprinkler.transport import ENDPOINT_SETTINGS_ALL, ENDPOINT_VALVE_STATUS
+
+
+@pytest.mark.fake(valves=4)
+async def test_unchanged_document_is_not_parsed_again(fake, controller):
+    """Test that an unchanged document leaves the state alone."""
+    assert await controller.refresh(full=True)
+    state = controller.state
+
+    assert not await controller.refresh(full=True)
+    assert not controller.changes
+    assert controller.state is state
+    assert fake.hits[ENDPOINT_SETTINGS_ALL] == 2
+
+
+@pytest.mark.fake(valves=4)
+async def test_changed_document_is_applied(fake, controller):
+    """Test that a changed document is parsed and diffed."""
+    await controller.refresh(full=True)
+    fake.settings['valves'][1]['name'] = 'Lawn'
+    fake.tick()
+
+    assert await controller.refresh(full=True)
+    assert controller.changes.valves == {101}
+    assert controller.valves[101].name == 'Lawn'
+
+
+@pytest.mark.fake(valves=4)
+async def test_validators_are_dropped_after_a_local_change(fake, controller):
+    """Test that a poll after a command is not answered from the validators of the poll before it."""
+    await controller.refresh(full=True)
+    await controller.start_manual(100, 60)
+    # the device closes the valve before the confirming poll
+    fake.set_open(100, False)
+
+    await controller.refresh(full=True)
+    assert not controller.valves[100].is_running
+
+
+@pytest.mark.fake(valves=4)
+async def test_status_poll_between_full_syncs(fake, controller):
+    """Test that polls after the first full sync only fetch the valve status."""
+    await controller.refresh()
+    fake.set_open(102, True)
+
+    assert await controller.refresh()
+    assert controller.valves[102].is_running
+    assert fake.hits[ENDPOINT_VALVE_STATUS] == 1
+    assert fake.hits[ENDPOINT_SETTINGS_ALL] == 1
+
+
+@pytest.mark.fake(valves=2)
+async def test_status_poll_requests_full_sync_for_unknown_valve(fake, controller):
+    """Test that a valve only the status poll knows makes the next poll a full sync."""
+    await controller.refresh()
+    fake.settings['valves'].append(
+        {'id': 200, 'name': 'Hedge', 'enabled': True, 'status': {'isOpen': False}}
+    )
+
+    await controller.refresh()
+    assert 200 not in controller.valves
+    await controller.refresh()
+    assert controller.valves[200].name == 'Hedge'
+    assert fake.hits[ENDPOINT_SETTINGS_ALL] == 2
+
+
+@pytest.mark.fake(valves=4, status=False)
+async def test_missing_status_endpoint_falls_back_to_full_syncs(fake, controller):
+    """Test that a 404 from the status endpoint switches to full syncs for good."""
+    await controller.refresh()
+    fake.set_open(101, True)
+
+    assert await controller.refresh(full=False)
+    assert controller.valves[101].is_running
+    await controller.refresh()
+    assert fake.hits[ENDPOINT_VALVE_STATUS] == 1
+    assert fake.hits[ENDPOINT_SETTINGS_ALL] == 3
+
+
+@pytest.mark.fake(valves=4)
+@pytest.mark.parametrize('full', [True, False])
+async def test_poll_sent_before_a_command_keeps_its_optimistic_state(fake, controller, monkeypatch, full):
+    """Test that a poll answered before a command landed does not undo it, and the next poll confirms it."""
+    await controller.refresh(full=True)
+    endpoint = ENDPOINT_SETTINGS_ALL if full else ENDPOINT_VALVE_STATUS
+    hits = fake.hits.get(endpoint, 0)
+    released = asyncio.Event()
+    fetch = controller.transport.fetch
+
+    async def held_fetch(*args, **kwargs):
+        resp = await fetch(*args, **kwargs)
+        await released.wait()
+        return resp
+
+    monkeypatch.setattr(controller.transport, 'fetch', held_fetch)
+    # a changed document, not a 304
+    fake.tick()
+    poll = asyncio.create_task(controller.refresh(full=full))
+    while fake.hits.get(endpoint, 0) == hits:
+        await asyncio.sleep(0.01)
+    # the poll holds a document with valve 100 closed
+    await controller.start_manual(100, 60)
+    released.set()
+
+    assert not await poll
+    assert controller.valves[100].is_running
+    assert controller.valves[100].remaining() is not None
+
+    monkeypatch.setattr(controller.transport, 'fetch', fetch)
+    await controller.refresh(full=full)
+    assert controller.valves[100].is_running
+    assert controller.valves[100].remaining() is not None
+    assert not controller.changes.valves
@@ -0,0 +1,93 @@
+"""Recording controller traffic and replaying it through the client without the controller."""
+import gzip
+import time
+
+import pytest
+
+from custom_components.netsprinkler_component.Sprinkler.errors import NETSprinklerApiError
+from custom_components.netsprinkler_component.Sprinkler.metrics import REQUEST_ERRORS
+from custom_components.netsprinkler_component.Sprinkler.netsprinkler import NETSprinkler
+from custom_components.netsprinkler_component.Sprinkler.replay import RecordingTransport, ReplayTransport, load_recording, replay
+from custom_components.netsprinkler_component.Sprinkler.transport import ENDPOINT_SETTINGS_ALL, ENDPOINT_VALVE_RUN, ENDPOINT_VALVE_STATUS
+
+LATENCY = 0.05
+
+
+async def _record(fake, path):
+    """Record a short session: polls, a rename, a run, an unchanged status poll and a failed poll."""
+    controller = NETSprinkler(fake.url, {'transport': RecordingTransport(fake.url, path)})
+    try:
+        await controller.refresh()
+        fake.settings['valves'][0]['name'] = 'Hedge'
+        await controller.refresh(full=True)
+        await controller.start_manual(controller.state.valves[1].id, 60)
+        await controller.refresh(full=False)
+        await controller.refresh(full=False)
+        fake.failure_rate = 1.0
+        with pytest.raises(NETSprinklerApiError):
+            await controller.refresh(full=True)
+        fake.failure_rate = 0.0
+        return controller.state
+    finally:
+        await controller.session_close()
+
+
+async def test_recording_stores_repeated_bodies_once(fake, tmp_path, no_backoff):
+    """Test that the recording keeps every request in order, stores a repeated body once and keeps the errors."""
+    path = str(tmp_path / 'day.jsonl.gz')
+    await _record(fake, path)
+
+    header, entries = load_recording(path)
+    assert header['url'] == fake.url
+    assert [(entry['m'], entry['e']) for entry in entries][:4] == [
+        ('GET', ENDPOINT_SETTINGS_ALL), ('GET', ENDPOINT_SETTINGS_ALL), ('POST', ENDPOINT_VALVE_RUN), ('GET', ENDPOINT_VALVE_STATUS),
+    ]
+    assert entries[2]['d']['seconds'] == 60
+    status = [entry for entry in entries if entry['e'] == ENDPOINT_VALVE_STATUS]
+    assert status[0]['b'] == status[1]['b']
+    assert 'x' in entries[-1]
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        assert sum('"r":1' in line for line in file) == 1
+
+
+async def test_replay_rebuilds_the_recorded_state(fake, tmp_path, no_backoff):
+    """Test that a replay goes through the same client calls and ends in the recorded state, offline."""
+    path = str(tmp_path / 'day.jsonl.gz')
+    recorded = await _record(fake, path)
+    await fake.stop()
+
+    refreshes, changed, metrics = await replay(path, None)
+    assert refreshes == 5
+    assert changed >= 2
+    assert metrics.counter(REQUEST_ERRORS) > 0
+
+    transport = ReplayTransport.load(path, None)
+    replayed = NETSprinkler(transport.url, {'transport': transport})
+    try:
+        await replayed.refresh()
+        await replayed.refresh(full=True)
+        await replayed.start_manual(recorded.valves[1].id, 60)
+        await replayed.refresh(full=False)
+        assert replayed.state.valves == recorded.valves
+        assert replayed.state.valves[0].name == 'Hedge'
+    finally:
+        await replayed.session_close()
+
+
+@pytest.mark.fake(latency=LATENCY)
+async def test_replay_keeps_the_recorded_pace(fake, tmp_path):
+    """Test that a real time replay waits out the recorded latencies and an unpaced one does not."""
+    path = str(tmp_path / 'polls.jsonl.gz')
+    recording = NETSprinkler(fake.url, {'transport': RecordingTransport(fake.url, path)})
+    for _ in range(3):
+        await recording.refresh(full=True)
+    await recording.session_close()
+
+    for speed, check in ((1.0, lambda elapsed: elapsed >= 2 * LATENCY), (None, lambda elapsed: elapsed < LATENCY)):
+        transport = ReplayTransport.load(path, speed)
+        replayed = NETSprinkler(transport.url, {'transport': transport})
+        start = time.monotonic()
+        for _ in range(3):
+            await replayed.refresh(full=True)
+        assert check(time.monotonic() - start), speed
+        await replayed.session_close()
@@ -0,0 +1,67 @@
+"""Retries and the circuit breaker of the transport."""
+import asyncio
+import functools
+
+import pytest
+
+from custom_components.netsprinkler_component.Sprinkler import transport
+from custom_components.netsprinkler_component.Sprinkler.errors import NETSprinklerApiError, NETSprinklerCircuitOpenError, NETSprinklerError
+from custom_components.netsprinkler_component.Sprinkler.resilience import RETRY_ATTEMPTS, STATE_CLOSED, STATE_OPEN, CircuitBreaker
+from custom_components.netsprinkler_component.Sprinkler.transport import ENDPOINT_SETTINGS_ALL
+
+RESET_TIMEOUT = 0.05
+
+
+@pytest.fixture
+def fast_breaker(monkeypatch):
+    """Let an open circuit probe the controller after RESET_TIMEOUT seconds."""
+    monkeypatch.setattr(transport, 'CircuitBreaker', functools.partial(CircuitBreaker, reset_timeout=RESET_TIMEOUT))
+
+
+@pytest.mark.fake(valves=2, failure_rate=1.0)
+async def test_transient_failures_are_retried(fake, controller, no_backoff):
+    """Test that a poll answered with a 500 is tried again."""
+    with pytest.raises(NETSprinklerApiError):
+        await controller.refresh()
+    assert fake.hits[ENDPOINT_SETTINGS_ALL] == RETRY_ATTEMPTS
+
+
+@pytest.mark.fake(valves=2, failure_rate=1.0)
+async def test_breaker_opens_and_fails_fast(fake, controller, no_backoff):
+    """Test that consecutive failures open the circuit and later calls do not reach the controller."""
+    with pytest.raises(NETSprinklerApiError):
+        await controller.refresh()
+    assert controller.transport.breaker.state == STATE_OPEN
+
+    hits = dict(fake.hits)
+    with pytest.raises(NETSprinklerCircuitOpenError):
+        await controller.refresh()
+    assert fake.hits == hits
+
+
+@pytest.mark.fake(valves=2, failure_rate=1.0)
+async def test_breaker_probes_and_closes_on_recovery(fake, controller, no_backoff, fast_breaker):
+    """Test that the first call after the reset timeout probes and closes the circuit."""
+    with pytest.raises(NETSprinklerApiError):
+        await controller.refresh()
+    fake.failure_rate = 0
+    await asyncio.sleep(RESET_TIMEOUT)
+
+    assert await controller.refresh()
+    assert controller.transport.breaker.state == STATE_CLOSED
+    # the probe and the poll
+    assert fake.hits[ENDPOINT_SETTINGS_ALL] == RETRY_ATTEMPTS + 2
+
+
+@pytest.mark.fake(valves=2, failure_rate=1.0)
+async def test_failed_probe_reopens_with_longer_timeout(fake, controller, no_backoff, fast_breaker):
+    """Test that a failure after the probe opens the circuit again for twice as long."""
+    breaker = controller.transport.breaker
+    with pytest.raises(NETSprinklerApiError):
+        await controller.refresh()
+    await asyncio.sleep(RESET_TIMEOUT)
+
+    with pytest.raises(NETSprinklerError):
+        await controller.refresh()
+    assert breaker.state == STATE_OPEN
+    assert breaker.seconds_until_probe() > RESET_TIMEOUT
@@ -0,0 +1,88 @@
+"""Manual runs tracked locally: the remaining time, its end, and the poll that confirms it."""
+import time
+
+from homeassistant.helpers import entity_registry as er
+
+from custom_components.netsprinkler_component.const import DOMAIN
+from custom_components.netsprinkler_component.Sprinkler.scheduler import COMMAND_GRACE, RUN_END_GRACE, AdaptivePollScheduler
+
+BASE_INTERVAL = 5
+MAX_INTERVAL = 600
+
+
+async def test_remaining_time_counts_down(fake, controller):
+    """Test that a run started from here counts down from its length to zero."""
+    await controller.refresh()
+    valve = controller.valves[controller.state.valves[0].id]
+    assert valve.remaining() is None
+
+    await controller.start_manual(valve.id, 60)
+    start = valve.expected_end - 60
+    assert valve.remaining(start) == 60
+    assert valve.remaining(start + 15) == 45
+    assert valve.remaining(start + 90) == 0
+    assert 55 < valve.remaining() <= 60
+
+
+async def test_stop_clears_the_run(fake, controller):
+    """Test that stopping a valve forgets its run."""
+    await controller.refresh()
+    valve = controller.valves[controller.state.valves[0].id]
+    await controller.start_manual(valve.id, 60)
+
+    await controller.stop(valve.id)
+    assert valve.remaining() is None
+    assert valve.expected_end is None
+    assert controller.seconds_until_run_end() is None
+
+
+async def test_observed_close_clears_the_run(fake, controller):
+    """Test that a poll finding the valve closed, e.g. by the controller itself, forgets its run."""
+    await controller.refresh()
+    valve = controller.valves[controller.state.valves[0].id]
+    await controller.start_manual(valve.id, 60)
+
+    fake.settings['valves'][0]['status']['isOpen'] = False
+    await controller.refresh(full=True)
+    assert not valve.is_running
+    assert valve.remaining() is None
+
+
+async def test_scheduler_wakes_at_the_end_of_the_run(fake, controller):
+    """Test that a running valve moves the next poll to its end instead of the idle interval."""
+    await controller.refresh()
+    scheduler = AdaptivePollScheduler(BASE_INTERVAL, MAX_INTERVAL)
+    for _ in range(10):
+        scheduler.observe(False)
+    # past the grace of the last command, before anything ran
+    now = time.monotonic() + COMMAND_GRACE
+    assert scheduler.interval(controller, now) == MAX_INTERVAL
+
+    await controller.start_manual(controller.state.valves[0].id, 120)
+    now = time.monotonic() + COMMAND_GRACE
+    remaining = controller.seconds_until_run_end(now)
+    assert 85 < remaining <= 90
+    assert scheduler.interval(controller, now) == remaining + RUN_END_GRACE
+
+    # a second, shorter run moves the wake up to its own end
+    await controller.start_manual(controller.state.valves[1].id, 40)
+    now = time.monotonic() + COMMAND_GRACE
+    assert scheduler.interval(controller, now) == controller.seconds_until_run_end(now) + RUN_END_GRACE
+    assert controller.seconds_until_run_end(now) <= 10
+
+
+async def test_remaining_time_sensor(hass, fake, entry, coordinator):
+    """Test that the remaining time sensor shows the run length and drops to zero on a stop."""
+    valve = coordinator.controller.state.valves[0]
+    entity_id = er.async_get(hass).async_get_entity_id(
+        'sensor', DOMAIN, f'{entry.unique_id}_sensor_station_remaining_time_valve_{valve.id}'
+    )
+    assert hass.states.get(entity_id).state == '0'
+
+    await coordinator.controller.start_manual(valve.id, 60)
+    await coordinator.async_command_done()
+    assert 58 <= int(hass.states.get(entity_id).state) <= 60
+
+    await coordinator.controller.stop(valve.id)
+    await coordinator.async_command_done()
+    assert hass.states.get(entity_id).state == '0'
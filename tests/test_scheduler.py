@@ -0,0 +1,65 @@
+"""Adaptive poll interval: fast after commands, backing off while idle, waiting for the breaker."""
+import time
+
+from custom_components.netsprinkler_component.Sprinkler.resilience import BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT
+from custom_components.netsprinkler_component.Sprinkler.scheduler import COMMAND_GRACE, FAST_INTERVAL, AdaptivePollScheduler
+
+BASE_INTERVAL = 5
+MAX_INTERVAL = 60
+
+
+async def test_idle_polls_back_off_until_a_change(fake, controller):
+    """Test that every unchanged poll doubles the interval up to the maximum and a change resets it."""
+    await controller.refresh()
+    scheduler = AdaptivePollScheduler(BASE_INTERVAL, MAX_INTERVAL)
+    assert scheduler.interval(controller) == BASE_INTERVAL
+
+    intervals = []
+    for _ in range(6):
+        scheduler.observe(False)
+        intervals.append(scheduler.interval(controller))
+    assert intervals == [10, 20, 40, MAX_INTERVAL, MAX_INTERVAL, MAX_INTERVAL]
+
+    scheduler.observe(True)
+    assert scheduler.interval(controller) == BASE_INTERVAL
+
+
+async def test_command_polls_fast_for_a_grace_period(fake, controller):
+    """Test that a command switches to the fast interval until its grace period is over."""
+    await controller.refresh()
+    scheduler = AdaptivePollScheduler(BASE_INTERVAL, MAX_INTERVAL)
+    for _ in range(10):
+        scheduler.observe(False)
+
+    await controller.disable_valve(controller.state.valves[0].id)
+    now = time.monotonic()
+    assert scheduler.interval(controller, now) == FAST_INTERVAL
+    assert scheduler.interval(controller, now + COMMAND_GRACE) == MAX_INTERVAL
+
+
+async def test_running_valve_without_known_end_polls_at_the_base_interval(fake, controller):
+    """Test that a valve opened elsewhere, e.g. by a schedule, keeps the polls at the base interval."""
+    fake.set_open(fake.settings['valves'][0]['id'], True)
+    await controller.refresh()
+    scheduler = AdaptivePollScheduler(BASE_INTERVAL, MAX_INTERVAL)
+    for _ in range(10):
+        scheduler.observe(False)
+    assert scheduler.interval(controller) == BASE_INTERVAL
+
+
+async def test_open_breaker_waits_for_the_probe(fake, controller):
+    """Test that no poll is planned before an open circuit lets its probe through."""
+    await controller.refresh()
+    scheduler = AdaptivePollScheduler(BASE_INTERVAL, MAX_INTERVAL)
+    now = time.monotonic()
+    for _ in range(BREAKER_FAILURE_THRESHOLD):
+        controller.transport.breaker.record_failure(now)
+    assert scheduler.interval(controller, now) == BREAKER_RESET_TIMEOUT
+    assert scheduler.interval(controller, now + BREAKER_RESET_TIMEOUT - 1) == FAST_INTERVAL
+
+
+async def test_disabled_controller_polls_at_the_maximum(fake, controller):
+    """Test that a disabled controller is polled at the maximum interval."""
+    await controller.refresh()
+    await controller.disable()
+    assert AdaptivePollScheduler(BASE_INTERVAL, MAX_INTERVAL).interval(controller) == MAX_INTERVAL
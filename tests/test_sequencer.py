@@ -0,0 +1,87 @@
+"""Batches of parallel runs under the current limit of the power supply."""
+import asyncio
+
+import pytest
+
+from custom_components.netsprinkler_component.Sprinkler.sequencer import SEQUENCE_GAP, DrawEstimator, Sequencer, plan_batches
+
+
+def _peak_draw(batches, draws, gap=SEQUENCE_GAP):
+    """Highest total draw at any batch start, counting runs until their gap ended."""
+    runs = [(offset, offset + seconds + gap, draws[id]) for offset, batch in batches for id, seconds in batch]
+    return max(sum(draw for start, end, draw in runs if start <= offset < end) for offset, _ in batches)
+
+
+def _jobs(batches):
+    return sorted(job for _, batch in batches for job in batch)
+
+
+def test_batches_stay_under_the_limit():
+    """Test that no moment of the plan draws more than the limit."""
+    jobs = [(100 + i, 60 * (i % 4 + 1)) for i in range(10)]
+    draws = {id: 250 + 10 * (id % 3) for id, _ in jobs}
+
+    batches = plan_batches(jobs, draws, 800)
+    assert _jobs(batches) == sorted(jobs)
+    assert _peak_draw(batches, draws) <= 800
+    assert len(batches[0][1]) == 3
+
+
+def test_freed_budget_goes_to_the_next_jobs():
+    """Test that a valve starts as soon as a run ends and its gap passed."""
+    draws = {100: 300, 101: 300, 102: 300}
+    batches = plan_batches([(100, 60), (101, 30), (102, 30)], draws, 600)
+    assert batches == [(0, [(100, 60), (101, 30)]), (30 + SEQUENCE_GAP, [(102, 30)])]
+
+
+def test_valve_over_the_limit_runs_alone():
+    """Test that a valve drawing more than the limit on its own still runs, but alone."""
+    draws = {100: 900, 101: 200, 102: 200}
+    batches = plan_batches([(100, 60), (101, 60), (102, 60)], draws, 500)
+    assert batches[0] == (0, [(100, 60)])
+    assert _jobs(batches[1:]) == [(101, 60), (102, 60)]
+
+
+def test_jobs_of_one_valve_are_merged():
+    """Test that a valve listed twice runs once for the sum of its seconds."""
+    batches = plan_batches([(100, 30), (100, 45)], {100: 300}, 1000)
+    assert batches == [(0, [(100, 75)])]
+
+
+def test_estimator_learns_the_idle_and_valve_draws():
+    """Test that the estimator separates the idle draw of the controller from the valves."""
+    estimator = DrawEstimator(default=300)
+    estimator.observe(50, [])
+    estimator.observe(450, [100])
+    estimator.observe(650, [100, 101])
+
+    assert estimator.idle == 50
+    assert estimator.estimate(100) == 400
+    assert estimator.estimate(101) == 200
+    assert estimator.estimate(102) == 300
+
+
+@pytest.mark.fake(valves=4)
+async def test_sequencer_plans_under_the_limit_minus_idle(fake, controller):
+    """Test that the idle draw of the controller is taken off the budget of the valves."""
+    sequencer = Sequencer(controller, limit=700)
+    controller.draw_estimator.observe(100, [])
+
+    jobs = [(id, 60) for id in (100, 101, 102)]
+    assert [len(batch) for _, batch in sequencer.plan(jobs)] == [2, 1]
+    assert [len(batch) for _, batch in sequencer.plan(jobs, limit=1000)] == [3]
+
+
+@pytest.mark.fake(valves=4)
+async def test_cancel_stops_the_started_valves(fake, controller):
+    """Test that cancelling a sequence closes its running valves and starts no further batch."""
+    await controller.refresh()
+    sequencer = Sequencer(controller, limit=600)
+    await sequencer.start([(id, 60) for id in (100, 101, 102, 103)])
+    while not controller.valves[100].is_running:
+        await asyncio.sleep(0.01)
+    assert sum(valve['status']['isOpen'] for valve in fake.settings['valves']) == 2
+
+    await sequencer.cancel()
+    assert not sequencer.running
+    assert not any(valve['status']['isOpen'] for valve in fake.settings['valves'])
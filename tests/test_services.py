@@ -0,0 +1,43 @@
+"""Services of the integration, called on the entities of a set up entry."""
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.entity_platform import async_get_platforms
+
+from custom_components.netsprinkler_component import NETSprinklerControllerEntity
+from custom_components.netsprinkler_component.const import DOMAIN, SERVICE_DISABLE_VALVES, SERVICE_ENABLE_VALVES
+from custom_components.netsprinkler_component.Sprinkler.transport import ENDPOINT_VALVE_ENABLE, ENDPOINT_VALVE_ENABLE_MANY
+
+
+async def test_device_target_sends_controller_command_once(hass, fake, entry, coordinator):
+    """Test that a device target, matching every entity of the controller, disables the valves in one request."""
+    device = dr.async_get(hass).async_get_device(identifiers={(DOMAIN, entry.unique_id)})
+    enabled_hits = fake.hits.get(ENDPOINT_VALVE_ENABLE, 0)
+
+    await hass.services.async_call(
+        DOMAIN, SERVICE_DISABLE_VALVES, {'device_id': device.id}, blocking=True
+    )
+    assert fake.hits[ENDPOINT_VALVE_ENABLE_MANY] == 1
+    assert fake.hits.get(ENDPOINT_VALVE_ENABLE, 0) == enabled_hits
+    assert not any(valve['enabled'] for valve in fake.settings['valves'])
+
+
+async def test_controller_entities_send_command_once(hass, fake, entry, coordinator):
+    """Test that targeting several entities of the same controller enables the valves in one request."""
+    entity_ids = [
+        entity.entity_id
+        for platform in async_get_platforms(hass, DOMAIN)
+        for entity in platform.entities.values()
+        if isinstance(entity, NETSprinklerControllerEntity)
+    ]
+    assert len(entity_ids) > 1
+    calls = []
+    enable_many = coordinator.controller.enable_many
+
+    async def counted(valve_ids):
+        calls.append(valve_ids)
+        return await enable_many(valve_ids)
+
+    coordinator.controller.enable_many = counted
+    await hass.services.async_call(
+        DOMAIN, SERVICE_ENABLE_VALVES, {'entity_id': entity_ids, 'index': [0, 1]}, blocking=True
+    )
+    assert len(calls) == 1
@@ -0,0 +1,106 @@
+"""Concurrent identical refreshes and commands share one request."""
+import asyncio
+
+import pytest
+
+from custom_components.netsprinkler_component.Sprinkler.errors import NETSprinklerCommandCancelledError, NETSprinklerError
+from custom_components.netsprinkler_component.Sprinkler.singleflight import SingleFlight
+from custom_components.netsprinkler_component.Sprinkler.transport import ENDPOINT_SETTINGS_ALL, ENDPOINT_VALVE_ENABLE
+
+LATENCY = 0.1
+
+
+@pytest.mark.fake(latency=LATENCY)
+async def test_concurrent_refreshes_share_one_request(fake, controller):
+    """Test that refreshes asked for while one is in flight wait for it instead of sending their own."""
+    await controller.refresh()
+    hits = fake.hits[ENDPOINT_SETTINGS_ALL]
+
+    fake.settings['valves'][0]['name'] = 'Hedge'
+    results = await asyncio.gather(*(controller.refresh(full=True) for _ in range(5)))
+    assert results == [True] * 5
+    assert fake.hits[ENDPOINT_SETTINGS_ALL] == hits + 1
+    assert controller.state.valves[0].name == 'Hedge'
+
+    # the next refresh is a request of its own
+    await controller.refresh(full=True)
+    assert fake.hits[ENDPOINT_SETTINGS_ALL] == hits + 2
+
+
+@pytest.mark.fake(latency=LATENCY)
+async def test_identical_commands_are_sent_once(fake, controller):
+    """Test that the same command asked for twice at once is sent once, a different one is not merged."""
+    await controller.refresh()
+    first, second = controller.state.valves[0].id, controller.state.valves[1].id
+
+    await asyncio.gather(
+        controller.disable_valve(first),
+        controller.disable_valve(first),
+        controller.disable_valve(first),
+        controller.disable_valve(second),
+    )
+    assert fake.hits[ENDPOINT_VALVE_ENABLE] == 2
+    assert not controller.valves[first].enabled
+    assert not controller.valves[second].enabled
+
+
+@pytest.mark.fake(latency=LATENCY)
+async def test_failure_reaches_every_waiter(fake, controller, no_backoff):
+    """Test that a failed shared refresh raises the same error in every caller."""
+    await controller.refresh()
+    fake.failure_rate = 1.0
+
+    results = await asyncio.gather(*(controller.refresh(full=True) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, NETSprinklerError) for result in results)
+    assert results[0] is results[1] is results[2]
+
+
+@pytest.mark.fake(latency=LATENCY)
+async def test_cancelled_command_reaches_every_waiter(fake, controller):
+    """Test that a shared command cancelled by closing the session fails for every caller."""
+    await controller.refresh()
+    id = controller.state.valves[0].id
+
+    waiters = [asyncio.create_task(controller.disable_valve(id)) for _ in range(3)]
+    await asyncio.sleep(LATENCY / 4)
+    await controller.session_close()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert all(isinstance(result, NETSprinklerCommandCancelledError) for result in results)
+    assert fake.hits[ENDPOINT_VALVE_ENABLE] == 1
+
+
+async def test_caller_giving_up_leaves_the_others_waiting():
+    """Test that cancelling one caller neither cancels the shared call nor the other callers."""
+    flights = SingleFlight()
+    release = asyncio.Event()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await release.wait()
+        return 'done'
+
+    quitter = asyncio.create_task(flights.do('key', call))
+    waiter = asyncio.create_task(flights.do('key', call))
+    await asyncio.sleep(0)
+    quitter.cancel()
+    release.set()
+    assert await waiter == 'done'
+    assert quitter.cancelled()
+    assert calls == [1]
+    assert flights.in_flight == 0
+
+
+async def test_cancelled_call_reaches_every_waiter():
+    """Test that every caller of a shared call that got cancelled sees the cancellation."""
+    flights = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0)
+        raise asyncio.CancelledError()
+
+    results = await asyncio.gather(
+        flights.do('key', call), flights.do('key', call), return_exceptions=True
+    )
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert flights.in_flight == 0
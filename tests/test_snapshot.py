@@ -0,0 +1,61 @@
+"""Snapshot of the controller state: saved after every layout change, restored on the next setup."""
+import asyncio
+
+import pytest
+
+from homeassistant.const import EVENT_HOMEASSISTANT_FINAL_WRITE
+from homeassistant.helpers.storage import Store
+
+from custom_components.netsprinkler_component.const import DOMAIN, STORAGE_VERSION
+from custom_components.netsprinkler_component.Sprinkler.transport import ENDPOINT_SETTINGS_ALL
+
+LATENCY = 0.2
+
+
+async def _stored(hass, entry):
+    """Snapshot on disk once the pending saves were written, as they are when Home Assistant stops."""
+    await hass.async_block_till_done()
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_FINAL_WRITE)
+    await hass.async_block_till_done()
+    return await Store(hass, STORAGE_VERSION, f'{DOMAIN}.{entry.entry_id}').async_load()
+
+
+def _valve(snapshot, id):
+    return next(valve for valve in snapshot['valves'] if valve['id'] == id)
+
+
+async def test_local_commits_are_saved(hass, fake, entry, coordinator):
+    """Test that an optimistic disable and rename reach the snapshot without waiting for a poll."""
+    valve = coordinator.controller.state.valves[0]
+    schedule = coordinator.controller.state.schedules[0]
+    assert _valve(await _stored(hass, entry), valve.id)['enabled']
+
+    await coordinator.controller.disable_valve(valve.id)
+    await coordinator.controller.set_schedule_name('Morning', schedule.id)
+    coordinator.async_set_updated_data(coordinator.controller.state)
+    stored = await _stored(hass, entry)
+    assert not _valve(stored, valve.id)['enabled']
+    assert next(item for item in stored['schedules'] if item['id'] == schedule.id)['name'] == 'Morning'
+
+
+@pytest.mark.fake(latency=LATENCY)
+async def test_setup_starts_from_the_snapshot(hass, fake, entry):
+    """Test that a reload builds the state from the snapshot and the first poll replaces it."""
+    await _stored(hass, entry)
+    fake.settings['valves'][0]['name'] = 'Hedge'
+    polls = fake.hits[ENDPOINT_SETTINGS_ALL]
+
+    await hass.config_entries.async_reload(entry.entry_id)
+    coordinator = hass.data[DOMAIN][entry.entry_id]['coordinator']
+    # up before the controller answered
+    assert fake.hits[ENDPOINT_SETTINGS_ALL] == polls
+    assert coordinator.controller.stale
+    assert coordinator.controller.state.valves[0].name != 'Hedge'
+
+    # the first poll runs in the background
+    async with asyncio.timeout(2):
+        while coordinator.controller.stale:
+            await asyncio.sleep(0.01)
+    assert not coordinator.controller.stale
+    assert coordinator.controller.state.valves[0].name == 'Hedge'
+    assert _valve(await _stored(hass, entry), fake.settings['valves'][0]['id'])['name'] == 'Hedge'
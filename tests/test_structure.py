@@ -0,0 +1,65 @@
+"""Valves and schedules that come, go or move between polls."""
+import pytest
+
+
+@pytest.mark.fake(valves=4)
+async def test_removed_valve_renumbers_the_ones_after_it(fake, controller):
+    """Test that removing a valve reports it and keeps the views of the others."""
+    await controller.refresh()
+    controller.pop_structure_changes()
+    views = dict(controller.valves)
+    del fake.settings['valves'][1]
+
+    await controller.refresh(full=True)
+    structure = controller.pop_structure_changes()
+    assert structure.valves_removed == {101}
+    assert structure.valves_renumbered == {102, 103}
+    assert not structure.valves_added
+    assert 101 not in controller.valves
+    assert controller.valves[102] is views[102]
+    assert controller.valves[102].index == 1
+    assert not controller.pop_structure_changes()
+
+
+@pytest.mark.fake(valves=3)
+async def test_reordered_valves_are_renumbered(fake, controller):
+    """Test that valves trading places are reported as renumbered, not as removed and added."""
+    await controller.refresh()
+    controller.pop_structure_changes()
+    valves = fake.settings['valves']
+    valves[0], valves[2] = valves[2], valves[0]
+
+    await controller.refresh(full=True)
+    structure = controller.pop_structure_changes()
+    assert structure.valves_renumbered == {100, 102}
+    assert not (structure.valves_added or structure.valves_removed)
+    assert controller.valve_by_index(0).id == 102
+
+
+@pytest.mark.fake(valves=3)
+async def test_valve_back_before_reconcile_is_a_move(fake, controller):
+    """Test that a valve removed and back at another index before anyone reconciled is only renumbered."""
+    await controller.refresh()
+    controller.pop_structure_changes()
+    valve = fake.settings['valves'].pop(0)
+    await controller.refresh(full=True)
+    fake.settings['valves'].append(valve)
+
+    await controller.refresh(full=True)
+    structure = controller.pop_structure_changes()
+    assert structure.valves_renumbered == {100, 101, 102}
+    assert not (structure.valves_added or structure.valves_removed)
+
+
+@pytest.mark.fake(valves=1, schedules=2)
+async def test_added_and_removed_schedules(fake, controller):
+    """Test that schedules are reconciled like valves."""
+    await controller.refresh()
+    controller.pop_structure_changes()
+    fake.settings['schedules'][0] = {'id': 2000, 'name': 'Night'}
+
+    await controller.refresh(full=True)
+    structure = controller.pop_structure_changes()
+    assert structure.schedules_added == {2000}
+    assert structure.schedules_removed == {1000}
+    assert controller.schedules[2000].name == 'Night'
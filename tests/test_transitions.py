@@ -0,0 +1,103 @@
+"""Valve transitions: opened, closed, enabled and disabled, and their events on the bus."""
+from homeassistant.core import callback
+
+from custom_components.netsprinkler_component.const import EVENT_VALVE_CLOSED, EVENT_VALVE_OPENED
+from custom_components.netsprinkler_component.Sprinkler.changes import VALVE_CLOSED, VALVE_DISABLED, VALVE_ENABLED, VALVE_OPENED
+from custom_components.netsprinkler_component.Sprinkler.netsprinkler import NETSprinkler
+
+
+async def test_run_opens_and_stop_closes_once(fake, controller):
+    """Test that a run and its stop give one transition each, carrying the run, and polls add none."""
+    await controller.refresh()
+    controller.pop_transitions()
+    id = controller.state.valves[0].id
+
+    await controller.start_manual(id, 60)
+    [opened] = controller.pop_transitions()
+    assert (opened.kind, opened.valve_id, opened.duration) == (VALVE_OPENED, id, 60)
+    assert opened.start_time is not None
+    assert opened.run_seconds is None
+
+    # the poll confirms the open valve, it is no new transition
+    await controller.refresh(full=True)
+    assert controller.pop_transitions() == []
+
+    await controller.stop(id)
+    [closed] = controller.pop_transitions()
+    assert (closed.kind, closed.valve_id, closed.duration) == (VALVE_CLOSED, id, 60)
+    assert closed.start_time == opened.start_time
+    assert 0 <= closed.run_seconds < 5
+
+    await controller.refresh(full=True)
+    assert controller.pop_transitions() == []
+
+
+async def test_enabled_flag_flips_from_the_controller(fake, controller):
+    """Test that a valve disabled and enabled on the controller gives one transition per poll that saw it."""
+    await controller.refresh()
+    controller.pop_transitions()
+    valve = fake.settings['valves'][3]
+
+    valve['enabled'] = False
+    await controller.refresh(full=True)
+    assert [(t.kind, t.valve_id) for t in controller.pop_transitions()] == [(VALVE_DISABLED, valve['id'])]
+
+    valve['enabled'] = True
+    await controller.refresh(full=True)
+    assert [(t.kind, t.valve_id) for t in controller.pop_transitions()] == [(VALVE_ENABLED, valve['id'])]
+
+
+async def test_first_poll_after_restore_records_nothing(fake, controller):
+    """Test that the differences between a restored snapshot and the first poll are no transitions."""
+    await controller.refresh()
+    snapshot = controller.snapshot()
+    # what happened while Home Assistant was down
+    fake.settings['valves'][0]['status']['isOpen'] = True
+    fake.settings['valves'][1]['enabled'] = False
+
+    restored = NETSprinkler(fake.url, {})
+    try:
+        restored.restore(snapshot)
+        assert restored.stale
+        assert await restored.refresh()
+        assert not restored.stale
+        assert restored.state.valves[0].is_open
+        assert restored.pop_transitions() == []
+
+        # from then on the polls report transitions again
+        fake.settings['valves'][0]['status']['isOpen'] = False
+        await restored.refresh(full=True)
+        assert [t.kind for t in restored.pop_transitions()] == [VALVE_CLOSED]
+    finally:
+        await restored.session_close()
+
+
+async def test_transition_events_fire_once(hass, fake, coordinator):
+    """Test that a run and its stop fire one bus event each, with the run fields, whatever polls follow."""
+    events = []
+
+    @callback
+    def record(event):
+        events.append(event)
+
+    hass.bus.async_listen(EVENT_VALVE_OPENED, record)
+    hass.bus.async_listen(EVENT_VALVE_CLOSED, record)
+    valve = coordinator.controller.state.valves[0]
+
+    await coordinator.controller.start_manual(valve.id, 60)
+    await coordinator.async_command_done()
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+    assert [event.event_type for event in events] == [EVENT_VALVE_OPENED]
+    assert events[0].data['valve_id'] == valve.id
+    assert events[0].data['name'] == valve.name
+    assert events[0].data['duration'] == 60
+    assert events[0].data['start_time'] is not None
+
+    await coordinator.controller.stop(valve.id)
+    await coordinator.async_command_done()
+    await coordinator.async_refresh()
+    await hass.async_block_till_done()
+    assert [event.event_type for event in events] == [EVENT_VALVE_OPENED, EVENT_VALVE_CLOSED]
+    assert events[1].data['run_seconds'] is not None
+    assert events[1].data['duration'] == 60